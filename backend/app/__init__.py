@@ -1,3 +1,4 @@
+import click
 from flask import Flask
 from flask_cors import CORS
 from config import get_config
@@ -5,6 +6,11 @@ from app.routes.health import health_bp
 from app.routes.auth import auth_bp
 from app.routes.patient import patient_bp
 from app.routes.heart_risk import heart_risk_bp
+from app.inference import engine
+from app.hashing import hasher
+from app.write_behind import journal
+from app.json_provider import FastJSONProvider
+from app import database, metrics
 
 def create_app():
     """Create and configure Flask app"""
@@ -14,15 +20,46 @@ def create_app():
     config = get_config()
     app.config.from_object(config)
     
+    # orjson-backed, compact in production
+    app.json = FastJSONProvider(app)
+    app.json.init_app(config)
+    
     # Enable CORS
     CORS(app, resources={
         r"/api/*": {
             "origins": config.CORS_ORIGINS,
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", "If-None-Match"],
+            "expose_headers": ["ETag"]
         }
     })
     
+    # One-shot schema bootstrap (never at import time)
+    if config.DB_AUTO_MIGRATE:
+        try:
+            database.init_schema()
+        except Exception as e:
+            app.logger.error(f"Schema bootstrap failed, run `flask init-db` once the DB is up: {e}")
+    
+    @app.cli.command('init-db')
+    def init_db():
+        """Create or upgrade the database schema"""
+        applied = database.init_schema()
+        click.echo(f"Applied migrations: {applied or 'none (schema up to date)'}")
+    
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups():
+        """Recompute the daily / monthly prediction rollups from scratch"""
+        counts = database.Database.rebuild_rollups()
+        click.echo(f"Rebuilt rollups: {counts}")
+    
+    # Load the ML model once, before serving any request
+    engine.init_app(app)
+    hasher.init_app(app)
+    metrics.init_app(app)
+    # Write-behind predictions: replays what a previous run left in the journal
+    journal.init_app(app)
+    
     # Register blueprints
     app.register_blueprint(health_bp)
     app.register_blueprint(auth_bp)
@@ -0,0 +1,88 @@
+"""ASGI (asyncio) flavour of the API, served by ``backend/asgi.py``.
+
+Serves a subset of the Flask app from ``app.create_app()`` with the same
+URLs and JSON: auth, patients CRUD and listing, single predictions,
+prediction history, /model, /health, /health/stats and /metrics. Batch
+predict, /stats, /analytics, the exports, /model/reload and
+/health/ready are sync-only, and responses carry no ETag (no 304s).
+
+The handlers await an aiomysql pool, so one process can keep thousands of
+mostly-waiting requests open. Model inference and password hashing still
+run on their threads/processes and are awaited from the event loop.
+"""
+import asyncio
+
+from quart import Quart
+from quart_cors import cors
+
+from config import get_config
+from app import database, metrics
+from app.aio import database as aio_database
+from app.hashing import hasher
+from app.inference import engine
+from app.json_provider import FastJSONProvider
+from app.storage import backend
+from app.utils import revoked_tokens
+
+
+def create_async_app():
+    """Create and configure the Quart (ASGI) app"""
+    if backend.name != 'mysql':
+        raise RuntimeError('The async app talks to MySQL through aiomysql; serve a SQLite DATABASE_URL with run.py')
+    app = Quart(__name__)
+
+    config = get_config()
+    app.config.from_object(config)
+    app.json = FastJSONProvider(app)
+    app.json.init_app(config)
+
+    app = cors(app, allow_origin=config.CORS_ORIGINS,
+               allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+               allow_headers=["Content-Type", "Authorization"])
+
+    if config.DB_AUTO_MIGRATE:
+        try:
+            database.init_schema()
+        except Exception as e:
+            app.logger.error(f"Schema bootstrap failed, run `flask init-db` once the DB is up: {e}")
+
+    engine.init_app(app)
+    hasher.init_app(app)
+    metrics.init_async_app(app)
+
+    @app.before_serving
+    async def startup():
+        await aio_database.get_pool()
+        # Refresh the revocation set in the background instead of inside requests
+        revoked_tokens.lazy = False
+        app.extensions['revocation_sync'] = asyncio.get_running_loop().create_task(_sync_revocations())
+
+    @app.after_serving
+    async def shutdown():
+        app.extensions['revocation_sync'].cancel()
+        await aio_database.close_pool()
+
+    from app.aio.routes.health import health_bp
+    from app.aio.routes.auth import auth_bp
+    from app.aio.routes.patient import patient_bp
+    from app.aio.routes.heart_risk import heart_risk_bp
+    app.register_blueprint(health_bp)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(patient_bp)
+    app.register_blueprint(heart_risk_bp)
+
+    @app.errorhandler(404)
+    async def not_found(error):
+        return {'error': 'Not found'}, 404
+
+    @app.errorhandler(500)
+    async def internal_error(error):
+        return {'error': 'Internal server error'}, 500
+
+    return app
+
+
+async def _sync_revocations():
+    while True:
+        await asyncio.to_thread(revoked_tokens.sync)
+        await asyncio.sleep(revoked_tokens.sync_interval)
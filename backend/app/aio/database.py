@@ -0,0 +1,249 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import aiomysql
+
+from app import rollups
+from app.database import CFG, _patient_filters, _invalidate_patient_counts, _cached_count, _store_count
+from app.storage import backend
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_pool():
+    """Return the event loop's aiomysql pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await aiomysql.create_pool(
+                    # Same server as the sync app: DATABASE_URL, else the DB_* settings
+                    host=backend.host,
+                    port=backend.port,
+                    user=backend.user,
+                    password=backend.password,
+                    db=backend.database,
+                    charset='utf8mb4',
+                    cursorclass=aiomysql.DictCursor,
+                    minsize=CFG.DB_POOL_MIN_SIZE,
+                    maxsize=CFG.DB_ASYNC_POOL_MAX_SIZE,
+                    pool_recycle=CFG.DB_POOL_MAX_LIFETIME,
+                    autocommit=False,
+                )
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+@asynccontextmanager
+async def get_connection():
+    """Async context manager: pooled connection, committed on success and rolled back on error"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        try:
+            yield conn
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
+
+
+async def _rollup_predictions(cur, records):
+    """rollups.apply_predictions on an aiomysql cursor"""
+    patient_ids = sorted({r['patient_id'] for r in records})
+    await cur.execute(rollups.provinces_sql(patient_ids), patient_ids)
+    provinces = {row['patient_id']: row['province'] for row in await cur.fetchall()}
+    for name, rows in rollups.rows_for(records, provinces).items():
+        if rows:
+            await cur.executemany(rollups.UPSERT_SQL[name], rows)
+
+
+async def _rollup_patient(cur, patient_id, sign):
+    """rollups.apply_patient on an aiomysql cursor"""
+    for name in rollups.TABLES:
+        await cur.execute(rollups.PATIENT_SQL[name], (sign,) * rollups.SIGN_PARAMS + (patient_id,))
+        if sign < 0:
+            await cur.execute(rollups.PRUNE_SQL[name])
+
+
+class AsyncDatabase:
+    """asyncio counterparts of the ``Database`` methods used by the ASGI app (same SQL)."""
+
+    @staticmethod
+    async def add_user(email, password_hash, full_name, role, phone):
+        created_at = datetime.now()
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('''INSERT INTO users (email, password_hash, full_name, role, phone, created_at)
+                                 VALUES (%s, %s, %s, %s, %s, %s)''',
+                              (email, password_hash, full_name, role, phone, created_at))
+            return cur.lastrowid
+
+    @staticmethod
+    async def get_user_by_email(email):
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('SELECT * FROM users WHERE email = %s', (email,))
+            return await cur.fetchone()
+
+    @staticmethod
+    async def get_user_by_id(user_id):
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('SELECT * FROM users WHERE user_id = %s', (user_id,))
+            return await cur.fetchone()
+
+    @staticmethod
+    async def update_user_password(user_id, password_hash):
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('UPDATE users SET password_hash = %s WHERE user_id = %s', (password_hash, user_id))
+            return cur.rowcount > 0
+
+    @staticmethod
+    async def add_patient(citizen_id, full_name, gender, date_of_birth, phone, address, province, condition, user_id):
+        created_at = datetime.now()
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('''INSERT INTO patients (citizen_id, full_name, gender, date_of_birth, phone, `address`, province, `condition`, created_by, created_at)
+                                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                              (citizen_id, full_name, gender, date_of_birth, phone, address, province, condition, user_id, created_at))
+            patient_id = cur.lastrowid
+        _invalidate_patient_counts()
+        return patient_id
+
+    @staticmethod
+    async def get_patient_by_id(patient_id):
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('SELECT * FROM patients WHERE patient_id = %s', (patient_id,))
+            return await cur.fetchone()
+
+    @staticmethod
+    async def list_patients(user_id=None, limit=10, offset=0, after_id=None, **filters):
+        """One page of patients ordered by patient_id (keyset paging with ``after_id``)"""
+        where, params = _patient_filters(user_id, **filters)
+        if after_id is not None:
+            where += (' AND ' if where else ' WHERE ') + 'patient_id > %s'
+            params.append(after_id)
+            sql = f'SELECT * FROM patients{where} ORDER BY patient_id LIMIT %s'
+            params.append(limit)
+        else:
+            sql = f'SELECT * FROM patients{where} ORDER BY patient_id LIMIT %s OFFSET %s'
+            params.extend([limit, offset])
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute(sql, params)
+            return list(await cur.fetchall())
+
+    @staticmethod
+    async def count_patients(user_id=None, estimate=False, **filters):
+        """COUNT(*) of matching patients; shares the sync mode's count cache"""
+        where, params = _patient_filters(user_id, **filters)
+        if estimate and not where:
+            async with get_connection() as conn, conn.cursor() as cur:
+                await cur.execute("""SELECT TABLE_ROWS AS total FROM information_schema.TABLES
+                                     WHERE TABLE_SCHEMA = %s AND TABLE_NAME = 'patients'""", (backend.database,))
+                row = await cur.fetchone()
+            if row and row['total'] is not None:
+                return int(row['total'])
+
+        key = (where, tuple(params))
+        total = _cached_count(key)
+        if total is not None:
+            return total
+
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute(f'SELECT COUNT(*) AS total FROM patients{where}', params)
+            total = int((await cur.fetchone())['total'])
+        _store_count(key, total)
+        return total
+
+    @staticmethod
+    async def update_patient(patient_id, **kwargs):
+        allowed = ['citizen_id','full_name','gender','date_of_birth','phone','address', 'province', 'condition', 'created_by']
+        sets = []
+        params = []
+        for k, v in kwargs.items():
+            if k in allowed:
+                sets.append(f"`{k}` = %s")
+                params.append(v)
+
+        if not sets:
+            return False
+
+        params.append(patient_id)
+        sql = f"UPDATE patients SET {', '.join(sets)} WHERE patient_id = %s"
+        moves = CFG.ROLLUPS_ENABLED and 'province' in kwargs
+        async with get_connection() as conn, conn.cursor() as cur:
+            if moves:
+                await _rollup_patient(cur, patient_id, -1)
+            await cur.execute(sql, params)
+            changed = cur.rowcount > 0
+            if moves:
+                await _rollup_patient(cur, patient_id, 1)
+        _invalidate_patient_counts()
+        return changed
+
+    @staticmethod
+    async def delete_patient(patient_id):
+        async with get_connection() as conn, conn.cursor() as cur:
+            if CFG.ROLLUPS_ENABLED:
+                await _rollup_patient(cur, patient_id, -1)
+            await cur.execute('DELETE FROM patients WHERE patient_id = %s', (patient_id,))
+            deleted = cur.rowcount > 0
+        _invalidate_patient_counts()
+        return deleted
+
+    @staticmethod
+    async def add_prediction(patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction):
+        prediction_date = datetime.now()
+        age = rollups.stored_age(age)
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('''INSERT INTO predictions (patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction, prediction_date)
+                                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                              (patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction, prediction_date))
+            prediction_id = cur.lastrowid
+            if CFG.ROLLUPS_ENABLED:
+                await _rollup_predictions(cur, [{
+                    'patient_id': patient_id, 'age': age, 'sex': sex, 'trestbps': trestbps, 'chol': chol,
+                    'thalach': thalach, 'oldpeak': oldpeak, 'prediction': prediction, 'prediction_date': prediction_date,
+                }])
+            return prediction_id
+
+    @staticmethod
+    async def get_predictions_by_patient(patient_id):
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('SELECT * FROM predictions WHERE patient_id = %s ORDER BY prediction_date DESC', (patient_id,))
+            return list(await cur.fetchall())
+
+    @staticmethod
+    async def get_latest_prediction(patient_id):
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('SELECT * FROM predictions WHERE patient_id = %s ORDER BY prediction_date DESC LIMIT 1', (patient_id,))
+            return await cur.fetchone()
+
+    @staticmethod
+    async def get_prediction_by_id(prediction_id):
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('SELECT * FROM predictions WHERE prediction_id = %s', (prediction_id,))
+            return await cur.fetchone()
+
+    @staticmethod
+    async def get_all_predictions():
+        async with get_connection() as conn, conn.cursor() as cur:
+            await cur.execute('SELECT * FROM predictions ORDER BY prediction_date DESC')
+            return list(await cur.fetchall())
+
+    @staticmethod
+    async def pool_stats():
+        """aiomysql pool usage"""
+        pool = await get_pool()
+        return {
+            'size': pool.size,
+            'min_size': pool.minsize,
+            'max_size': pool.maxsize,
+            'idle': pool.freesize,
+            'in_use': pool.size - pool.freesize,
+        }
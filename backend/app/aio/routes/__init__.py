@@ -0,0 +1 @@
+# app/aio/__init__.py
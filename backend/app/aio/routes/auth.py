@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from quart import Blueprint, request, jsonify
+from app import metrics
+from app.aio.database import AsyncDatabase
+from app.aio.utils import get_token_from_request
+from app.batching import Overloaded
+from app.hashing import hasher
+from app.models.user import User
+from app.utils import AuthUtil
+
+logger = logging.getLogger(__name__)
+
+auth_bp = Blueprint('aio_auth', __name__, url_prefix='/api/auth')
+
+@auth_bp.route('/register', methods=['POST'])
+async def register():
+    """Register new user"""
+    try:
+        data = await request.get_json()
+        
+        # Validation
+        if not data.get('email') or not data.get('password') or not data.get('full_name'):
+            return jsonify({'error': 'Missing required fields'}), 400
+        
+        # Check if user exists
+        if await AsyncDatabase.get_user_by_email(data['email']):
+            return jsonify({'error': 'User already exists'}), 409
+        
+        # The hashing pool call blocks, so wait for it off the event loop
+        password_hash = await asyncio.to_thread(hasher.hash, data['password'])
+        await AsyncDatabase.add_user(data['email'], password_hash, data['full_name'],
+                                     data.get('role', 'doctor'), data.get('phone'))
+        return jsonify({'message': 'User created successfully'}), 201
+    
+    except Overloaded as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/login', methods=['POST'])
+async def login():
+    """Login user"""
+    try:
+        data = await request.get_json()
+        
+        if not data.get('email') or not data.get('password'):
+            return jsonify({'error': 'Missing email or password'}), 400
+        
+        user = await AsyncDatabase.get_user_by_email(data['email'])
+        if not user:
+            return jsonify({'error': 'Invalid email or password'}), 401
+        
+        if not await asyncio.to_thread(hasher.verify, data['password'], user['password_hash']):
+            return jsonify({'error': 'Invalid email or password'}), 401
+        
+        # Hash parameters changed since this password was stored
+        if hasher.needs_rehash(user['password_hash']):
+            try:
+                new_hash = await asyncio.to_thread(hasher.hash, data['password'])
+                await AsyncDatabase.update_user_password(user['user_id'], new_hash)
+                User.invalidate(user['user_id'])
+                hasher.record_rehash()
+            except Exception:
+                logger.exception('Error rehashing password of user %s', user['user_id'])
+                metrics.errors.inc('User.rehash_password')
+        
+        token = AuthUtil.generate_token(user['user_id'], user['email'], user['role'])
+        
+        return jsonify({
+            'token': token,
+            'user': {
+                'user_id': user['user_id'],
+                'email': user['email'],
+                'full_name': user['full_name'],
+                'role': user['role']
+            }
+        }), 200
+    
+    except Overloaded as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+async def logout():
+    """Revoke the current token"""
+    try:
+        token = get_token_from_request()
+        if not token:
+            return jsonify({'error': 'Missing token'}), 401
+        
+        payload = AuthUtil.verify_token(token)
+        if not payload:
+            return jsonify({'error': 'Invalid or expired token'}), 401
+        
+        # Writes through the sync pool; logout is rare enough not to need an async path
+        await asyncio.to_thread(AuthUtil.revoke_token, token, payload)
+        return jsonify({'message': 'Logged out'}), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/verify', methods=['GET'])
+async def verify():
+    """Verify token"""
+    try:
+        token = get_token_from_request()
+        if not token:
+            return jsonify({'error': 'Missing token'}), 401
+        
+        payload = AuthUtil.verify_token(token)
+        if not payload:
+            return jsonify({'error': 'Invalid or expired token'}), 401
+        
+        user = User.get_cached(payload['user_id'])
+        if user is None:
+            row = await AsyncDatabase.get_user_by_id(payload['user_id'])
+            user = User.remember(row) if row else None
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        return jsonify({
+            'valid': True,
+            'user': user
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,45 @@
+from quart import Blueprint, jsonify, current_app, request
+from app import metrics
+from app.aio.database import AsyncDatabase
+from app.aio.utils import require_admin
+from app.hashing import hasher
+from app.inference import engine
+from app.models.user import User
+from app.utils import AuthUtil
+
+health_bp = Blueprint('aio_health', __name__, url_prefix='/api')
+
+@health_bp.route('/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint"""
+    return jsonify({'status': 'healthy', 'message': 'API is running', 'mode': 'asgi'}), 200
+
+@health_bp.route('/health/stats', methods=['GET'])
+@require_admin
+async def health_stats():
+    """Runtime stats of the backend subsystems"""
+    try:
+        return jsonify({
+            'db_pool': await AsyncDatabase.pool_stats(),
+            'inference_batcher': engine.batcher_stats(),
+            'auth': dict(AuthUtil.cache_stats(), user_cache=User.cache_stats()),
+            'password_hashing': hasher.stats()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@health_bp.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    """Request, DB, inference and JSON metrics of this process (Prometheus text format)"""
+    if not metrics.scrape_allowed(current_app.config, request.headers.get('Authorization')):
+        return jsonify({'error': 'Not found'}), 404
+    return current_app.response_class(metrics.registry.render(), content_type=metrics.CONTENT_TYPE), 200
+
+@health_bp.route('/', methods=['GET'])
+async def root():
+    """Root endpoint"""
+    return jsonify({
+        'name': 'Heart Care API',
+        'version': '1.0.0',
+        'status': 'running'
+    }), 200
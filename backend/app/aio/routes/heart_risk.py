@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from quart import Blueprint, request, jsonify
+from app import metrics
+from app.aio.database import AsyncDatabase
+from app.aio.utils import require_auth
+from app.batching import Overloaded
+from app.inference import engine
+from app.models.cache import invalidate_predictions
+from app.routes.heart_risk import REQUIRED_FIELDS, _features_from
+
+logger = logging.getLogger(__name__)
+
+heart_risk_bp = Blueprint('aio_heart_risk', __name__, url_prefix='/api/heart-risk')
+
+
+@heart_risk_bp.route('/predict', methods=['POST'])
+@require_auth
+async def predict_heart_risk():
+    """Predict heart risk for patient"""
+    try:
+        data = await request.get_json() or {}
+
+        if not all(field in data for field in REQUIRED_FIELDS):
+            return jsonify({'error': 'Missing required fields'}), 400
+
+        features = _features_from(data)
+
+        # Model call is CPU work (and may wait on the micro-batcher): keep it off the loop
+        try:
+            prediction, probability = await asyncio.to_thread(engine.predict, features)
+        except Overloaded as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+
+        try:
+            await AsyncDatabase.add_prediction(patient_id=data['patient_id'], prediction=prediction, **features)
+            invalidate_predictions(data['patient_id'])
+        except Exception:
+            logger.exception('Error creating heart risk prediction for patient %s', data['patient_id'])
+            metrics.errors.inc('HeartRisk.create')
+            return jsonify({'error': 'Failed to save prediction'}), 500
+
+        return jsonify({
+            'prediction': int(prediction),
+            'probability': round(probability, 4),
+            'risk_level': 'High' if prediction == 1 else 'Low',
+            'message': 'Prediction saved successfully'
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@heart_risk_bp.route('/patient/<int:patient_id>', methods=['GET'])
+@require_auth
+async def get_patient_predictions(patient_id):
+    """Get all predictions for a patient"""
+    try:
+        return jsonify(await AsyncDatabase.get_predictions_by_patient(patient_id)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@heart_risk_bp.route('/patient/<int:patient_id>/latest', methods=['GET'])
+@require_auth
+async def get_latest_prediction(patient_id):
+    """Get latest prediction for a patient"""
+    try:
+        prediction = await AsyncDatabase.get_latest_prediction(patient_id)
+        if not prediction:
+            return jsonify({'error': 'No predictions found'}), 404
+        return jsonify(prediction), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@heart_risk_bp.route('', methods=['GET'])
+@require_auth
+async def get_all_predictions():
+    """Get all predictions"""
+    try:
+        return jsonify(await AsyncDatabase.get_all_predictions()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@heart_risk_bp.route('/model', methods=['GET'])
+@require_auth
+async def get_model_info():
+    """Describe the model currently serving predictions"""
+    return jsonify(engine.info()), 200
@@ -0,0 +1,130 @@
+from quart import Blueprint, request, jsonify
+from app.analytics import store as analytics_store
+from app.aio.database import AsyncDatabase
+from app.aio.utils import require_auth
+from app.models.cache import cache, invalidate_patient
+from app.routes.patient import MAX_PAGE_SIZE
+
+patient_bp = Blueprint('aio_patient', __name__, url_prefix='/api/patients')
+
+@patient_bp.route('', methods=['POST'])
+@require_auth
+async def create_patient():
+    """Create new patient"""
+    try:
+        data = await request.get_json()
+        
+        # Validation
+        required_fields = ['citizen_id','full_name', 'gender', 'date_of_birth', 'phone', 'address', 'province', 'condition']
+        if not all(field in data for field in required_fields):
+            return jsonify({'error': 'Missing required fields'}), 400
+        
+        await AsyncDatabase.add_patient(
+            data['citizen_id'], data['full_name'], data['gender'], data['date_of_birth'],
+            data['phone'], data['address'], data['province'], data['condition'],
+            request.user['user_id']
+        )
+        return jsonify({'message': 'Patient created successfully'}), 201
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@patient_bp.route('/<int:patient_id>', methods=['GET'])
+@require_auth
+async def get_patient(patient_id):
+    """Get patient by ID"""
+    try:
+        patient = await AsyncDatabase.get_patient_by_id(patient_id)
+        if not patient:
+            return jsonify({'error': 'Patient not found'}), 404
+        
+        return jsonify(patient), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@patient_bp.route('', methods=['GET'])
+@require_auth
+async def get_patients():
+    """List patients page by page (same query params as the sync API)"""
+    try:
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            page_size = min(MAX_PAGE_SIZE, max(1, int(request.args.get('pageSize', 10))))
+            cursor = request.args.get('cursor')
+            after_id = int(cursor) if cursor else None
+            created_by = request.args.get('createdBy')
+            created_by = int(created_by) if created_by else None
+        except ValueError:
+            return jsonify({'error': 'Invalid paging parameters'}), 400
+
+        if request.user['role'] != 'admin':
+            created_by = request.user['user_id']
+
+        filters = {
+            'province': request.args.get('province'),
+            'gender': request.args.get('gender'),
+            'dob_from': request.args.get('dobFrom'),
+            'dob_to': request.args.get('dobTo'),
+        }
+
+        patients = await AsyncDatabase.list_patients(
+            created_by,
+            limit=page_size,
+            offset=(page - 1) * page_size,
+            after_id=after_id,
+            **filters
+        )
+
+        count_mode = request.args.get('count', 'exact')
+        if count_mode == 'none':
+            total = None
+        else:
+            total = await AsyncDatabase.count_patients(created_by, estimate=(count_mode == 'estimate'), **filters)
+
+        next_cursor = patients[-1]['patient_id'] if len(patients) == page_size else None
+
+        return jsonify({
+            'data': patients,
+            'total': total,
+            'page': page,
+            'pageSize': page_size,
+            'nextCursor': next_cursor
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@patient_bp.route('/<int:patient_id>', methods=['PUT'])
+@require_auth
+async def update_patient(patient_id):
+    """Update patient"""
+    try:
+        data = await request.get_json()
+        
+        updated = await AsyncDatabase.update_patient(patient_id, **data)
+        # Keep the sync API's cache coherent when both modes share a backend
+        cache.invalidate('patient', patient_id)
+        if updated:
+            return jsonify(await AsyncDatabase.get_patient_by_id(patient_id)), 200
+        else:
+            return jsonify({'error': 'Failed to update patient'}), 500
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@patient_bp.route('/<int:patient_id>', methods=['DELETE'])
+@require_auth
+async def delete_patient(patient_id):
+    """Delete patient"""
+    try:
+        deleted = await AsyncDatabase.delete_patient(patient_id)
+        invalidate_patient(patient_id)
+        analytics_store.mark_stale()
+        if deleted:
+            return jsonify({'message': 'Patient deleted successfully'}), 200
+        else:
+            return jsonify({'error': 'Failed to delete patient'}), 500
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,70 @@
+import json
+from functools import wraps
+
+from quart import request, jsonify
+
+from config import Config
+from app.utils import AuthUtil
+
+DEV_USER = {'user_id': 1, 'email': 'dev@local', 'role': 'admin'}
+
+
+def get_token_from_request():
+    """Extract token from the Authorization header of the current Quart request"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return None
+    parts = auth_header.split(' ')
+    return parts[1] if len(parts) > 1 else None
+
+
+def _authenticate(admin=False):
+    """(payload, None) for a valid token, otherwise (None, error response)"""
+    if getattr(Config, 'DISABLE_AUTH', False):
+        dev_header = request.headers.get('X-Dev-User')
+        if dev_header and not admin:
+            try:
+                return json.loads(dev_header), None
+            except ValueError:
+                pass
+        return dict(DEV_USER), None
+
+    token = get_token_from_request()
+    if not token:
+        return None, (jsonify({'error': 'Missing token'}), 401)
+
+    # Signature checks are cached and the revocation set is refreshed by a background
+    # task (see create_async_app), so this never blocks the event loop for long
+    payload = AuthUtil.verify_token(token)
+    if not payload:
+        return None, (jsonify({'error': 'Invalid or expired token'}), 401)
+
+    if admin and payload.get('role') != 'admin':
+        return None, (jsonify({'error': 'Admin access required'}), 403)
+    return payload, None
+
+
+def require_auth(f):
+    """Async decorator to require authentication"""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        payload, error = _authenticate()
+        if error:
+            return error
+        request.user = payload
+        return await f(*args, **kwargs)
+
+    return decorated_function
+
+
+def require_admin(f):
+    """Async decorator to require admin role"""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        payload, error = _authenticate(admin=True)
+        if error:
+            return error
+        request.user = payload
+        return await f(*args, **kwargs)
+
+    return decorated_function
@@ -0,0 +1,342 @@
+"""Columnar in-memory copy of the ``predictions`` table for analytics.
+
+Rows are held as NumPy columns (int8 categoricals, float32 vitals,
+datetime64 dates): about 40 bytes per prediction instead of a dict of 17
+objects. New rows are pulled incrementally by ``prediction_id`` watermark,
+re-reading the last ANALYTICS_RESCAN_IDS ids so rows that committed late
+(an id below the watermark) are picked up. A full reload runs after a
+patient delete in this process, when the row count below that window no
+longer matches (another process deleted rows), or every
+ANALYTICS_FULL_RELOAD_INTERVAL seconds.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+
+from app.database import CFG, get_pool
+from app.inference import FEATURES
+from app.storage import backend
+
+logger = logging.getLogger(__name__)
+
+CATEGORICAL = ('sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'ca', 'thal', 'prediction')
+VITALS = ('age', 'trestbps', 'chol', 'thalach', 'oldpeak')
+
+COLUMNS = (('prediction_id', np.int64), ('patient_id', np.int32)) \
+    + tuple((name, np.int8) for name in CATEGORICAL) \
+    + tuple((name, np.float32) for name in VITALS) \
+    + (('prediction_date', 'datetime64[s]'),)
+
+# Missing values: -1 for categoricals / ids, NaN for vitals, NaT for dates
+_SELECT = 'SELECT ' + ', '.join(f'`{name}`' for name, _ in COLUMNS) + ' FROM predictions'
+
+PERIODS = ('day', 'week', 'month')
+MAX_BINS = 200
+
+
+def _to_column(values, dtype):
+    if dtype == 'datetime64[s]':
+        return np.array(values, dtype='datetime64[s]')
+    floats = np.array(values, dtype=np.float64)  # None -> nan
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        floats[np.isnan(floats)] = -1
+    return floats.astype(dtype)
+
+
+class PredictionStore:
+    """Append-only NumPy columns mirroring ``predictions``.
+
+    Readers work on a snapshot ``(n, columns)``; a refresh only writes past
+    ``n`` or swaps in new arrays, so queries never take the lock.
+    """
+
+    def __init__(self, refresh_interval=30.0, full_reload_interval=3600.0, batch_size=50000, rescan_ids=1000):
+        self.refresh_interval = refresh_interval
+        self.full_reload_interval = full_reload_interval
+        self.batch_size = batch_size
+        self.rescan_ids = rescan_ids
+        self._lock = threading.Lock()
+        self._snapshot = (0, self._empty(1024))
+        self._watermark = 0
+        self._refreshed_at = None
+        self._loaded_at = None
+        self._stale = True
+        self._refreshes = 0
+        self._last_refresh_rows = 0
+        self._last_refresh_ms = 0.0
+        self._tail_rebuilds = 0
+
+    @staticmethod
+    def _empty(capacity):
+        return {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS}
+
+    # ------------------------------------------------------------------ #
+    # Loading
+    # ------------------------------------------------------------------ #
+
+    def mark_stale(self):
+        """Force a full reload on next use (rows were deleted or changed)"""
+        self._stale = True
+
+    def refresh(self, full=False):
+        """Pull predictions newer than the watermark (everything when ``full``); returns rows added"""
+        with self._lock:
+            return self._refresh_locked(full)
+
+    def _refresh_locked(self, full):
+        now = time.monotonic()
+        full = full or self._stale or self._loaded_at is None \
+            or (self.full_reload_interval and now - self._loaded_at >= self.full_reload_interval)
+        started = time.perf_counter()
+        added = 0
+        if not full:
+            n, columns = self._snapshot
+            watermark = self._watermark
+            low = max(0, watermark - self.rescan_ids)
+            k = int(np.searchsorted(columns['prediction_id'][:n], low, side='right'))
+            # Rows at or below the re-read window changed: deleted elsewhere, or a very late commit
+            full = self._count_upto(low) != k
+        if full:
+            n, columns, watermark = 0, self._empty(max(1024, self._snapshot[0])), 0
+            # Cleared before reading so a delete during the reload is not lost
+            self._stale = False
+        else:
+            window = [row for batch in self._fetch(low, watermark) for row in batch]
+            if [row[0] for row in window] != columns['prediction_id'][k:n].tolist():
+                # Late commits or deletes inside the window: rebuild the tail in new
+                # arrays, readers keep using the old ones
+                fresh = self._empty(len(columns['prediction_id']))
+                for name in fresh:
+                    fresh[name][:k] = columns[name][:k]
+                added = len(window) - (n - k)
+                n, columns = self._append(k, fresh, window)
+                self._snapshot = (n, columns)
+                self._tail_rebuilds += 1
+
+        try:
+            for batch in self._fetch(watermark):
+                n, columns = self._append(n, columns, batch)
+                added += len(batch)
+                watermark = int(columns['prediction_id'][n - 1])
+                # Appended rows can be published batch by batch; a full reload swaps in at the end
+                if not full:
+                    self._snapshot = (n, columns)
+                    self._watermark = watermark
+        except Exception:
+            if full:
+                self._stale = True
+            raise
+
+        self._snapshot = (n, columns)
+        self._watermark = watermark
+        self._refreshed_at = now
+        if full:
+            self._loaded_at = now
+        self._refreshes += 1
+        self._last_refresh_rows = added
+        self._last_refresh_ms = round((time.perf_counter() - started) * 1000, 3)
+        if full:
+            logger.info('Loaded %d predictions into the analytics store in %.0f ms', n, self._last_refresh_ms)
+        return added
+
+    def _fetch(self, after, upto=None):
+        """Batches of row tuples with ``after < prediction_id [<= upto]``, in id order"""
+        sql = _SELECT + ' WHERE prediction_id > %s'
+        params = (after,)
+        if upto is not None:
+            sql += ' AND prediction_id <= %s'
+            params += (upto,)
+        pool = get_pool()
+        conn = pool.acquire()
+        finished = False
+        try:
+            # Tuples through an unbuffered cursor: no per-row dicts
+            cur = backend.server_cursor(conn, dicts=False)
+            cur.execute(sql + ' ORDER BY prediction_id', params)
+            while True:
+                rows = cur.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                yield rows
+            cur.close()
+            conn.commit()
+            finished = True
+        finally:
+            pool.release(conn, discard=not finished)
+
+    def _count_upto(self, upto):
+        pool = get_pool()
+        conn = pool.acquire()
+        finished = False
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT COUNT(*) AS n FROM predictions WHERE prediction_id <= %s', (upto,))
+                count = cur.fetchone()['n']
+            conn.commit()
+            finished = True
+            return count
+        finally:
+            pool.release(conn, discard=not finished)
+
+    def _append(self, n, columns, rows):
+        if not rows:
+            return n, columns
+        needed = n + len(rows)
+        capacity = len(columns['prediction_id'])
+        if needed > capacity:
+            capacity = max(needed, capacity * 2)
+            grown = self._empty(capacity)
+            for name in grown:
+                grown[name][:n] = columns[name][:n]
+            columns = grown
+        for i, (name, dtype) in enumerate(COLUMNS):
+            columns[name][n:needed] = _to_column([row[i] for row in rows], dtype)
+        return needed, columns
+
+    def ensure_fresh(self):
+        """Incremental refresh when the data is older than ``refresh_interval``"""
+        refreshed_at = self._refreshed_at
+        if not (self._stale or refreshed_at is None or time.monotonic() - refreshed_at >= self.refresh_interval):
+            return
+        # Someone else is refreshing: answer from the current snapshot unless there is none yet
+        if not self._lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            self._refresh_locked(False)
+        finally:
+            self._lock.release()
+
+    def columns(self):
+        """Snapshot of the columns as ``{name: array}`` views of equal length"""
+        self.ensure_fresh()
+        n, columns = self._snapshot
+        return {name: array[:n] for name, array in columns.items()}
+
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+
+    def mask(self, cols, start=None, end=None, **equals):
+        """Boolean row filter: ``start <= prediction_date < end`` and column == value"""
+        keep = np.ones(len(cols['prediction_id']), dtype=bool)
+        if start is not None:
+            keep &= cols['prediction_date'] >= np.datetime64(start, 's')
+        if end is not None:
+            keep &= cols['prediction_date'] < np.datetime64(end, 's')
+        for name, value in equals.items():
+            if value is not None:
+                keep &= cols[name] == value
+        return keep
+
+    def summary(self, start=None, end=None, **equals):
+        """Row count, high-risk count / rate and vital means of the filtered rows"""
+        cols = self.columns()
+        keep = self.mask(cols, start, end, **equals)
+        total = int(keep.sum())
+        high = int((cols['prediction'][keep] == 1).sum())
+        return {
+            'count': total,
+            'high_risk': high,
+            'high_risk_rate': round(high / total, 4) if total else None,
+            'means': {name: _round(np.nanmean(cols[name][keep])) if total else None for name in VITALS},
+        }
+
+    def group_by(self, column, start=None, end=None, **equals):
+        """Count and high-risk rate per value of a categorical column"""
+        if column not in CATEGORICAL:
+            raise ValueError(f'Can only group by {", ".join(CATEGORICAL)}')
+        cols = self.columns()
+        keep = self.mask(cols, start, end, **equals)
+        return _grouped(cols[column][keep], cols['prediction'][keep])
+
+    def time_series(self, period='day', start=None, end=None, **equals):
+        """Count and high-risk rate per day, week (starting Monday) or month"""
+        if period not in PERIODS:
+            raise ValueError(f'period must be one of {", ".join(PERIODS)}')
+        cols = self.columns()
+        keep = self.mask(cols, start, end, **equals)
+        dates = cols['prediction_date'][keep]
+        high = cols['prediction'][keep] == 1
+        valid = ~np.isnat(dates)
+        dates, high = dates[valid], high[valid]
+        if period == 'month':
+            buckets = dates.astype('datetime64[M]')
+        else:
+            buckets = dates.astype('datetime64[D]')
+            if period == 'week':
+                # 1970-01-01 was a Thursday: shift so weeks start on Monday
+                days = buckets.astype(np.int64)
+                buckets = (days - (days + 3) % 7).astype('datetime64[D]')
+        keys, inverse = np.unique(buckets, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        highs = np.bincount(inverse, weights=high, minlength=len(keys))
+        return [{
+            'period': str(key),
+            'count': int(count),
+            'high_risk': int(h),
+            'high_risk_rate': round(float(h) / count, 4),
+        } for key, count, h in zip(keys, counts, highs)]
+
+    def histogram(self, column, bins=10, start=None, end=None, **equals):
+        """Value distribution of one feature"""
+        cols = self.columns()
+        keep = self.mask(cols, start, end, **equals)
+        values = cols[column][keep]
+        if column in CATEGORICAL:
+            return _grouped(values, cols['prediction'][keep])
+        if not 1 <= bins <= MAX_BINS:
+            raise ValueError(f'bins must be between 1 and {MAX_BINS}')
+        values = values[~np.isnan(values)]
+        counts, edges = np.histogram(values, bins=bins)
+        return [{'from': _round(lo), 'to': _round(hi), 'count': int(c)}
+                for lo, hi, c in zip(edges[:-1], edges[1:], counts)]
+
+    def feature_matrix(self, start=None, end=None):
+        """(X, y) for retraining: float32 (n, 13) matrix in model feature order and int8 labels"""
+        cols = self.columns()
+        keep = self.mask(cols, start, end)
+        X = np.empty((int(keep.sum()), len(FEATURES)), dtype=np.float32)
+        for j, name in enumerate(FEATURES):
+            X[:, j] = cols[name][keep]
+        return X, cols['prediction'][keep]
+
+    def stats(self):
+        n, columns = self._snapshot
+        return {
+            'rows': n,
+            'watermark': self._watermark,
+            'bytes': int(sum(array[:n].nbytes for array in columns.values())),
+            'capacity': len(columns['prediction_id']),
+            'refreshes': self._refreshes,
+            'last_refresh_rows': self._last_refresh_rows,
+            'last_refresh_ms': self._last_refresh_ms,
+            'stale': self._stale,
+            'tail_rebuilds': self._tail_rebuilds,
+        }
+
+
+def _grouped(values, prediction):
+    keys, inverse = np.unique(values, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(keys))
+    highs = np.bincount(inverse, weights=prediction == 1, minlength=len(keys))
+    return [{
+        'value': None if key < 0 else int(key),
+        'count': int(count),
+        'high_risk': int(h),
+        'high_risk_rate': round(float(h) / count, 4),
+    } for key, count, h in zip(keys, counts, highs)]
+
+
+def _round(value):
+    value = float(value)
+    return None if np.isnan(value) else round(value, 3)
+
+
+store = PredictionStore(
+    refresh_interval=CFG.ANALYTICS_REFRESH_INTERVAL,
+    full_reload_interval=CFG.ANALYTICS_FULL_RELOAD_INTERVAL,
+    batch_size=CFG.ANALYTICS_BATCH_SIZE,
+    rescan_ids=CFG.ANALYTICS_RESCAN_IDS,
+)
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class Overloaded(Exception):
+    """Raised when the batching queue is full and the request must be shed"""
+
+
+# Upper bounds of the histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+LATENCY_MS_BUCKETS = (0.5, 1, 2, 5, 10, 25, 50, 100)
+
+
+def _bucket(buckets, value):
+    for bound in buckets:
+        if value <= bound:
+            return bound
+    return '+Inf'
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row calls into one vectorized call.
+
+    ``submit`` enqueues a feature row and blocks until a background thread has
+    run ``fn`` on a matrix of every row gathered within ``window`` seconds of
+    the first one (or ``max_batch`` rows, whichever comes first). ``fn`` takes
+    an (n, k) array and returns n results.
+    """
+
+    def __init__(self, fn, window=0.002, max_batch=64, max_queue=1024):
+        self.fn = fn
+        self.window = window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+
+        self._cond = threading.Condition(threading.Lock())
+        self._queue = deque()
+        self._thread = None
+        self._pid = None
+
+        self._batches = 0
+        self._rows = 0
+        self._rejected = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._size_hist = dict.fromkeys(BATCH_SIZE_BUCKETS + ('+Inf',), 0)
+        self._latency_hist = dict.fromkeys(LATENCY_MS_BUCKETS + ('+Inf',), 0)
+
+    def submit(self, row, timeout=None):
+        """Run ``fn`` on ``row`` as part of the next batch and return its result"""
+        future = Future()
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                self._rejected += 1
+                raise Overloaded(f'Inference queue is full ({self.max_queue} pending)')
+            self._ensure_worker_locked()
+            self._queue.append((row, future, time.monotonic()))
+            self._cond.notify()
+        return future.result(timeout)
+
+    def stats(self):
+        """Queue depth, batch-size histogram and added queueing latency"""
+        with self._cond:
+            rows = self._rows
+            return {
+                'queue_depth': len(self._queue),
+                'window_ms': self.window * 1000,
+                'max_batch': self.max_batch,
+                'max_queue': self.max_queue,
+                'batches': self._batches,
+                'rows': rows,
+                'rejected': self._rejected,
+                'avg_batch_size': round(rows / self._batches, 2) if self._batches else 0.0,
+                'batch_size_histogram': {str(k): v for k, v in self._size_hist.items()},
+                'added_latency_avg_ms': round(self._latency_total * 1000 / rows, 3) if rows else 0.0,
+                'added_latency_max_ms': round(self._latency_max * 1000, 3),
+                'added_latency_histogram_ms': {str(k): v for k, v in self._latency_hist.items()},
+            }
+
+    def _ensure_worker_locked(self):
+        # A forked child inherits the queue but not the thread - start a new one
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._thread.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0][2] + self.window
+            while len(self._queue) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._queue), self.max_batch)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.monotonic()
+            try:
+                results = self.fn(np.asarray([row for row, _, _ in batch], dtype=np.float64))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            self._record(batch, started)
+
+    def _record(self, batch, started):
+        with self._cond:
+            self._batches += 1
+            self._rows += len(batch)
+            self._size_hist[_bucket(BATCH_SIZE_BUCKETS, len(batch))] += 1
+            for _, _, enqueued in batch:
+                waited = started - enqueued
+                self._latency_total += waited
+                self._latency_max = max(self._latency_max, waited)
+                self._latency_hist[_bucket(LATENCY_MS_BUCKETS, waited * 1000)] += 1
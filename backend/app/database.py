@@ -1,163 +1,353 @@
-import pymysql
-import os
-from datetime import datetime
+import threading
+import time
+from datetime import date, datetime
 from config import get_config
+from app import rollups
+from app.storage import backend
 
 CFG = get_config()
 
-def _get_conn():
-    conn = pymysql.connect(
-        host=CFG.DB_SERVER,
-        port=CFG.DB_PORT,
-        user=CFG.DB_USER,
-        password=CFG.DB_PASSWORD,
-        database=CFG.DB_DATABASE,
-        charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor
-    )
-    return conn
-
-def _ensure_tables():
-    conn = _get_conn()
-    cur = conn.cursor()
-
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INT AUTO_INCREMENT PRIMARY KEY,
-        email VARCHAR(255) UNIQUE NOT NULL,
-        password_hash VARCHAR(255) NOT NULL,
-        full_name VARCHAR(255),
-        role VARCHAR(50),
-        phone VARCHAR(20),
-        created_at DATETIME
-    )
-    ''')
-
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS patients (
-        patient_id INT AUTO_INCREMENT PRIMARY KEY,
-        name VARCHAR(255) NOT NULL,
-        address VARCHAR(255),
-        phone VARCHAR(20),
-        date_of_birth DATE,
-        gender VARCHAR(10),
-        medical_history TEXT,
-        bhytId VARCHAR(50),
-        province VARCHAR(100),
-        created_by INT,
-        created_at DATETIME
-    )
-    ''')
-
-    cur.execute('''
-    CREATE TABLE IF NOT EXISTS predictions (
-        prediction_id INT AUTO_INCREMENT PRIMARY KEY,
-        patient_id INT,
-        age INT,
-        sex INT,
-        cp INT,
-        trestbps FLOAT,
-        chol FLOAT,
-        fbs INT,
-        restecg INT,
-        thalach FLOAT,
-        exang INT,
-        oldpeak FLOAT,
-        slope INT,
-        ca INT,
-        thal INT,
-        prediction INT,
-        prediction_date DATETIME
-    )
-    ''')
-
-    conn.commit()
-    conn.close()
-
-
-_ensure_tables()
+def _get_conn(**overrides):
+    """A new connection outside the pool (scripts, bulk loads)"""
+    return backend.connect(**overrides)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = backend.create_pool()
+    return _pool
+
+
+def reset_pool(close=False):
+    """Drop the process-wide pool.
+
+    Called in a freshly forked worker (``close=False``): the inherited
+    connections share sockets with the parent, so they are forgotten, not
+    closed. The parent calls it with ``close=True`` before forking.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None and close:
+        pool.close_all()
+
+
+def get_connection():
+    """Context manager: pooled connection, committed on success and rolled back on error"""
+    return get_pool().connection()
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def init_schema():
+    """Bring the schema up to date with app/migrations, once per process.
+
+    Nothing here runs at import time: call it from ``flask init-db``,
+    ``python -m app.migrations upgrade`` or at start-up (DB_AUTO_MIGRATE).
+    The migration runner also holds a MySQL named lock, so concurrent
+    workers cannot migrate at the same time.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return []
+    with _schema_lock:
+        if _schema_ready:
+            return []
+        from app import migrations
+        applied = migrations.upgrade()
+        _schema_ready = True
+        return applied
 
 
 def _row_to_dict(row):
     return row
 
 
+def _stream(sql, params=(), batch_size=1000):
+    """Yield rows from an unbuffered cursor (SSDictCursor on MySQL).
+
+    Rows are pulled from the database ``batch_size`` at a time, so memory stays flat
+    however large the result is. If the consumer stops early the connection
+    is discarded rather than draining the rest of the result set.
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    finished = False
+    try:
+        cur = backend.server_cursor(conn)
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield _row_to_dict(row)
+        cur.close()
+        conn.commit()
+        finished = True
+    finally:
+        pool.release(conn, discard=not finished)
+
+
+# Cached patient counts: key -> (expires_at, count). Cleared on every patient write.
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+
+def _invalidate_patient_counts():
+    with _count_cache_lock:
+        _count_cache.clear()
+
+
+def _cached_count(key):
+    with _count_cache_lock:
+        hit = _count_cache.get(key)
+    if hit and hit[0] > time.monotonic():
+        return hit[1]
+    return None
+
+
+def _store_count(key, total):
+    if CFG.DB_COUNT_CACHE_TTL > 0:
+        with _count_cache_lock:
+            _count_cache[key] = (time.monotonic() + CFG.DB_COUNT_CACHE_TTL, total)
+
+
+def _patient_filters(user_id=None, province=None, gender=None, dob_from=None, dob_to=None):
+    """Build the WHERE clause shared by patient listing and counting"""
+    clauses = []
+    params = []
+    if user_id:
+        clauses.append('created_by = %s')
+        params.append(user_id)
+    if province:
+        clauses.append('province = %s')
+        params.append(province)
+    if gender:
+        clauses.append('gender = %s')
+        params.append(gender)
+    if dob_from:
+        clauses.append('date_of_birth >= %s')
+        params.append(dob_from)
+    if dob_to:
+        clauses.append('date_of_birth <= %s')
+        params.append(dob_to)
+    where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+    return where, params
+
+
+# GROUP BY expressions of the prediction stats; ``pr`` is predictions, ``p`` patients
+STATS_GROUPS = {
+    # As the rollups store it: '' and NULL are one bucket
+    'province': "NULLIF(p.province, '')",
+    'day': backend.truncate('day', 'pr.prediction_date'),
+    'week': backend.truncate('week', 'pr.prediction_date'),
+    'month': backend.truncate('month', 'pr.prediction_date'),
+}
+STATS_CATEGORICAL = ('sex', 'cp', 'fbs', 'restecg', 'exang', 'slope', 'ca', 'thal', 'prediction')
+# Continuous columns are bucketed as FLOOR(value / width) * width
+STATS_BUCKET_WIDTHS = {'age': 10, 'trestbps': 10, 'chol': 25, 'thalach': 10, 'oldpeak': 0.5}
+STATS_MEANS = rollups.VITALS
+
+
+def _prediction_filters(start=None, end=None, province=None, sex=None):
+    """WHERE clause of the prediction stats: ``start <= prediction_date < end``"""
+    clauses = []
+    params = []
+    if start:
+        clauses.append('pr.prediction_date >= %s')
+        params.append(start)
+    if end:
+        clauses.append('pr.prediction_date < %s')
+        params.append(end)
+    if province:
+        clauses.append('p.province = %s')
+        params.append(province)
+    if sex is not None:
+        clauses.append('pr.sex = %s')
+        params.append(sex)
+    where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+    return where, params
+
+
+def _stats_row(row):
+    count = int(row['count'] or 0)
+    high = int(row['high_risk'] or 0)
+    means = {}
+    for name in STATS_MEANS:
+        value = row[f'avg_{name}']
+        means[name] = round(float(value), 3) if value is not None else None
+    return {
+        'count': count,
+        'high_risk': high,
+        'high_risk_rate': round(high / count, 4) if count else None,
+        'means': means,
+    }
+
+
+def _stats_result(group, rows):
+    if group is None:
+        return _stats_row(rows[0])
+    result = []
+    for row in rows:
+        bucket = row['bucket']
+        if group in STATS_BUCKET_WIDTHS and bucket is not None:
+            bucket = float(bucket)
+            bucket = int(bucket) if bucket.is_integer() else bucket
+        elif group in ('day', 'week', 'month') and isinstance(bucket, str):
+            # SQLite's date functions return text; its DATE columns come back as dates
+            bucket = date.fromisoformat(bucket)
+        entry = {'value': bucket}
+        entry.update(_stats_row(row))
+        result.append(entry)
+    return result
+
+
 class Database:
-    """SQLite-backed Database operations with same API as previous in-memory class."""
+    """Database operations on the configured backend (app/storage.py); every call borrows a pooled connection."""
 
     @staticmethod
     def add_user(email, password_hash, full_name, role, phone):
-        conn = _get_conn()
-        cur = conn.cursor()
         created_at = datetime.now()
-        cur.execute('''INSERT INTO users (email, password_hash, full_name, role, phone, created_at)
-                       VALUES (%s, %s, %s, %s, %s, %s)''',
-                    (email, password_hash, full_name, role, phone, created_at))
-        conn.commit()
-        user_id = cur.lastrowid
-        conn.close()
-        return user_id
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('''INSERT INTO users (email, password_hash, full_name, role, phone, created_at)
+                           VALUES (%s, %s, %s, %s, %s, %s)''',
+                        (email, password_hash, full_name, role, phone, created_at))
+            return cur.lastrowid
 
     @staticmethod
     def get_user_by_email(email):
-        conn = _get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM users WHERE email = %s', (email,))
-        row = cur.fetchone()
-        conn.close()
-        return _row_to_dict(row)
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT * FROM users WHERE email = %s', (email,))
+            return _row_to_dict(cur.fetchone())
 
     @staticmethod
     def get_user_by_id(user_id):
-        conn = _get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM users WHERE user_id = %s', (user_id,))
-        row = cur.fetchone()
-        conn.close()
-        return _row_to_dict(row)
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT * FROM users WHERE user_id = %s', (user_id,))
+            return _row_to_dict(cur.fetchone())
 
     @staticmethod
     def get_all_users():
-        conn = _get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM users')
-        rows = cur.fetchall()
-        conn.close()
-        return [ _row_to_dict(r) for r in rows ]
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT * FROM users')
+            return [ _row_to_dict(r) for r in cur.fetchall() ]
+
+    @staticmethod
+    def update_user_password(user_id, password_hash):
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('UPDATE users SET password_hash = %s WHERE user_id = %s', (password_hash, user_id))
+            return cur.rowcount > 0
+
+    @staticmethod
+    def revoke_token(token_hash, user_id, expires_at):
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(f'''{backend.insert_ignore} INTO revoked_tokens (token_hash, user_id, expires_at, revoked_at)
+                           VALUES (%s, %s, %s, %s)''',
+                        (token_hash, user_id, expires_at, datetime.now()))
+            # Expired rows are dead weight: the JWT's own exp already rejects them
+            cur.execute('DELETE FROM revoked_tokens WHERE expires_at < %s', (datetime.now(),))
+
+    @staticmethod
+    def get_revoked_tokens():
+        """Hashes of revoked tokens that have not expired yet"""
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT token_hash FROM revoked_tokens WHERE expires_at >= %s', (datetime.now(),))
+            return [r['token_hash'] for r in cur.fetchall()]
 
     @staticmethod
     def add_patient(citizen_id, full_name, gender , date_of_birth, phone, address, province, condition, user_id):
-        conn = _get_conn()
-        cur = conn.cursor()
         created_at = datetime.now()
-        cur.execute('''INSERT INTO patients (citizen_id, full_name, gender, date_of_birth, phone, `address`, province, `condition`, created_by, created_at)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
-                    (citizen_id, full_name, gender, date_of_birth, phone, address, province, condition, user_id, created_at))
-        conn.commit()
-        patient_id = cur.lastrowid
-        conn.close()
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('''INSERT INTO patients (citizen_id, full_name, gender, date_of_birth, phone, `address`, province, `condition`, created_by, created_at)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                        (citizen_id, full_name, gender, date_of_birth, phone, address, province, condition, user_id, created_at))
+            patient_id = cur.lastrowid
+        _invalidate_patient_counts()
         return patient_id
 
     @staticmethod
     def get_patient_by_id(patient_id):
-        conn = _get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM patients WHERE patient_id = %s', (patient_id,))
-        row = cur.fetchone()
-        conn.close()
-        return _row_to_dict(row)
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT * FROM patients WHERE patient_id = %s', (patient_id,))
+            return _row_to_dict(cur.fetchone())
+
+    @staticmethod
+    def existing_patient_ids(patient_ids):
+        """The subset of ``patient_ids`` that exist, with one IN query per 500 ids"""
+        ids = list(dict.fromkeys(patient_ids))
+        found = set()
+        with get_connection() as conn, conn.cursor() as cur:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                cur.execute(f'SELECT patient_id FROM patients WHERE patient_id IN ({", ".join(["%s"] * len(chunk))})',
+                            chunk)
+                found.update(row['patient_id'] for row in cur.fetchall())
+        return found
 
     @staticmethod
     def get_all_patients(user_id=None):
-        conn = _get_conn()
-        cur = conn.cursor()
-        if user_id:
-            cur.execute('SELECT * FROM patients WHERE created_by = %s', (user_id,))
+        with get_connection() as conn, conn.cursor() as cur:
+            if user_id:
+                cur.execute('SELECT * FROM patients WHERE created_by = %s', (user_id,))
+            else:
+                cur.execute('SELECT * FROM patients')
+            return [ _row_to_dict(r) for r in cur.fetchall() ]
+
+    @staticmethod
+    def list_patients(user_id=None, limit=10, offset=0, after_id=None, **filters):
+        """One page of patients ordered by patient_id.
+
+        With ``after_id`` the page is read by keyset (``patient_id > after_id``)
+        and ``offset`` is ignored, so deep pages cost the same as the first one.
+        """
+        where, params = _patient_filters(user_id, **filters)
+        if after_id is not None:
+            where += (' AND ' if where else ' WHERE ') + 'patient_id > %s'
+            params.append(after_id)
+            sql = f'SELECT * FROM patients{where} ORDER BY patient_id LIMIT %s'
+            params.append(limit)
         else:
-            cur.execute('SELECT * FROM patients')
-        rows = cur.fetchall()
-        conn.close()
-        return [ _row_to_dict(r) for r in rows ]
+            sql = f'SELECT * FROM patients{where} ORDER BY patient_id LIMIT %s OFFSET %s'
+            params.extend([limit, offset])
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(sql, params)
+            return [ _row_to_dict(r) for r in cur.fetchall() ]
+
+    @staticmethod
+    def count_patients(user_id=None, estimate=False, **filters):
+        """COUNT(*) of matching patients, cached for DB_COUNT_CACHE_TTL seconds.
+
+        ``estimate`` returns the InnoDB row estimate for the unfiltered table,
+        which avoids scanning it at all (SQLite has none: exact count).
+        """
+        where, params = _patient_filters(user_id, **filters)
+        if estimate and not where:
+            with get_connection() as conn, conn.cursor() as cur:
+                total = backend.estimated_rows(cur, 'patients')
+            if total is not None:
+                return total
+
+        key = (where, tuple(params))
+        total = _cached_count(key)
+        if total is not None:
+            return total
+
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(f'SELECT COUNT(*) AS total FROM patients{where}', params)
+            total = int(cur.fetchone()['total'])
+        _store_count(key, total)
+        return total
 
     @staticmethod
     def update_patient(patient_id, **kwargs):
@@ -176,57 +366,175 @@ class Database:
 
         params.append(patient_id)
         sql = f"UPDATE patients SET {', '.join(sets)} WHERE patient_id = %s"
-        conn = _get_conn()
-        cur = conn.cursor()
-        cur.execute(sql, params)
-        conn.commit()
-        changed = cur.rowcount > 0
-        conn.close()
+        moves = CFG.ROLLUPS_ENABLED and 'province' in kwargs
+        with get_connection() as conn, conn.cursor() as cur:
+            if moves:
+                # Re-file the patient's predictions under the new province, same transaction
+                rollups.apply_patient(cur, patient_id, -1)
+            cur.execute(sql, params)
+            changed = cur.rowcount > 0
+            if moves:
+                rollups.apply_patient(cur, patient_id, 1)
+        _invalidate_patient_counts()
         return changed
 
     @staticmethod
     def delete_patient(patient_id):
-        conn = _get_conn()
-        cur = conn.cursor()
-        cur.execute('DELETE FROM patients WHERE patient_id = %s', (patient_id,))
-        conn.commit()
-        deleted = cur.rowcount > 0
-        conn.close()
+        with get_connection() as conn, conn.cursor() as cur:
+            if CFG.ROLLUPS_ENABLED:
+                # Its predictions go with it (ON DELETE CASCADE)
+                rollups.apply_patient(cur, patient_id, -1)
+            cur.execute('DELETE FROM patients WHERE patient_id = %s', (patient_id,))
+            deleted = cur.rowcount > 0
+        _invalidate_patient_counts()
         return deleted
 
     @staticmethod
     def add_prediction(patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction):
-        conn = _get_conn()
-        cur = conn.cursor()
         prediction_date = datetime.now()
-        cur.execute('''INSERT INTO predictions (patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction, prediction_date)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
-                    (patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction, prediction_date))
-        conn.commit()
-        prediction_id = cur.lastrowid
-        conn.close()
-        return prediction_id
+        age = rollups.stored_age(age)
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('''INSERT INTO predictions (patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction, prediction_date)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                        (patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction, prediction_date))
+            prediction_id = cur.lastrowid
+            if CFG.ROLLUPS_ENABLED:
+                rollups.apply_predictions(cur, [{
+                    'patient_id': patient_id, 'age': age, 'sex': sex, 'trestbps': trestbps, 'chol': chol,
+                    'thalach': thalach, 'oldpeak': oldpeak, 'prediction': prediction, 'prediction_date': prediction_date,
+                }])
+            return prediction_id
+
+    @staticmethod
+    def add_predictions_bulk(records, skip_existing=False):
+        """Insert prediction dicts with one executemany in a single transaction.
+
+        Records may carry an ``import_key``; with ``skip_existing`` those whose
+        key is already stored are left out (replaying the write-behind journal
+        after a crash). Returns the number of rows inserted.
+        """
+        if not records:
+            return 0
+        prediction_date = datetime.now()
+        with get_connection() as conn, conn.cursor() as cur:
+            if skip_existing:
+                keys = [r['import_key'] for r in records if r.get('import_key')]
+                stored = set()
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    cur.execute(f'SELECT import_key FROM predictions WHERE import_key IN ({", ".join(["%s"] * len(chunk))})',
+                                chunk)
+                    stored.update(row['import_key'] for row in cur.fetchall())
+                records = [r for r in records if r.get('import_key') not in stored]
+                if not records:
+                    return 0
+            params = [
+                (r['patient_id'], rollups.stored_age(r['age']), r['sex'], r['cp'], r['trestbps'], r['chol'], r['fbs'], r['restecg'],
+                 r['thalach'], r['exang'], r['oldpeak'], r['slope'], r['ca'], r['thal'], r['prediction'],
+                 r.get('prediction_date') or prediction_date, r.get('import_key'))
+                for r in records
+            ]
+            # pymysql rewrites this into multi-row INSERT statements
+            cur.executemany('''INSERT INTO predictions (patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction, prediction_date, import_key)
+                               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''', params)
+            inserted = cur.rowcount
+            if CFG.ROLLUPS_ENABLED:
+                rollups.apply_predictions(cur, [dict(r, age=p[1], prediction_date=p[-2]) for r, p in zip(records, params)])
+            return inserted
 
     @staticmethod
     def get_predictions_by_patient(patient_id):
-        conn = _get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM predictions WHERE patient_id = %s ORDER BY prediction_date DESC', (patient_id,))
-        rows = cur.fetchall()
-        conn.close()
-        return [ _row_to_dict(r) for r in rows ]
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT * FROM predictions WHERE patient_id = %s ORDER BY prediction_date DESC', (patient_id,))
+            return [ _row_to_dict(r) for r in cur.fetchall() ]
 
     @staticmethod
     def get_latest_prediction(patient_id):
-        preds = Database.get_predictions_by_patient(patient_id)
-        return preds[0] if preds else None
+        # Single dive into idx_predictions_patient_date, independent of history length
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT * FROM predictions WHERE patient_id = %s ORDER BY prediction_date DESC LIMIT 1', (patient_id,))
+            return _row_to_dict(cur.fetchone())
+
+    @staticmethod
+    def get_prediction_by_id(prediction_id):
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT * FROM predictions WHERE prediction_id = %s', (prediction_id,))
+            return _row_to_dict(cur.fetchone())
 
     @staticmethod
     def get_all_predictions():
-        conn = _get_conn()
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM predictions ORDER BY prediction_date DESC')
-        rows = cur.fetchall()
-        conn.close()
-        return [ _row_to_dict(r) for r in rows ]
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT * FROM predictions ORDER BY prediction_date DESC')
+            return [ _row_to_dict(r) for r in cur.fetchall() ]
 
+    @staticmethod
+    def iter_predictions(batch_size=1000):
+        """Stream every prediction (newest first) without loading them all"""
+        return _stream('SELECT * FROM predictions ORDER BY prediction_date DESC', batch_size=batch_size)
+
+    @staticmethod
+    def iter_patients(user_id=None, batch_size=1000, **filters):
+        """Stream matching patients ordered by patient_id"""
+        where, params = _patient_filters(user_id, **filters)
+        return _stream(f'SELECT * FROM patients{where} ORDER BY patient_id', params, batch_size=batch_size)
+
+    @staticmethod
+    def prediction_stats(group=None, width=None, **filters):
+        """Counts, high-risk rate and vital means of predictions, computed by the database.
+
+        ``group`` is one of STATS_GROUPS, a categorical column or a bucketed
+        continuous column (``width`` overrides its bucket size); without it a
+        single summary row is returned. Filters: start, end, province, sex.
+        Queries the rollups answer exactly (day-aligned ranges, 10-year age
+        bands, ...) read them instead of scanning ``predictions``.
+        """
+        query = rollups.stats_query(group, width, **filters) if CFG.ROLLUPS_ENABLED else None
+        if query is not None:
+            with get_connection() as conn, conn.cursor() as cur:
+                cur.execute(*query)
+                rows = cur.fetchall()
+            return _stats_result(group, rows)
+
+        where, params = _prediction_filters(**filters)
+        select = ['COUNT(*) AS count', 'SUM(pr.prediction = 1) AS high_risk']
+        select += [f'AVG(pr.{name}) AS avg_{name}' for name in STATS_MEANS]
+        group_params = []
+        if group is None:
+            expr = None
+        elif group in STATS_GROUPS:
+            expr = STATS_GROUPS[group]
+        elif group in STATS_CATEGORICAL:
+            expr = f'pr.{group}'
+        elif group in STATS_BUCKET_WIDTHS:
+            width = width or STATS_BUCKET_WIDTHS[group]
+            if width <= 0:
+                raise ValueError('width must be positive')
+            expr = f'FLOOR(pr.{group} / %s) * %s'
+            group_params = [width, width]
+        else:
+            raise ValueError(f'Cannot group predictions by {group}')
+
+        join = ''
+        if group == 'province' or filters.get('province'):
+            # LEFT: predictions without a patient count (province NULL), as in the rollups
+            join = ' LEFT JOIN patients p ON p.patient_id = pr.patient_id'
+        if expr is None:
+            sql = f'SELECT {", ".join(select)} FROM predictions pr{join}{where}'
+        else:
+            sql = (f'SELECT {expr} AS bucket, {", ".join(select)} FROM predictions pr{join}{where}'
+                   ' GROUP BY bucket ORDER BY bucket')
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(sql, tuple(group_params + params))
+            rows = cur.fetchall()
+        return _stats_result(group, rows)
+
+    @staticmethod
+    def rebuild_rollups():
+        """Recompute the prediction rollups from scratch in one transaction"""
+        with get_connection() as conn, conn.cursor() as cur:
+            return rollups.rebuild(cur)
+
+    @staticmethod
+    def pool_stats():
+        """Connection pool usage counters"""
+        return get_pool().stats()
@@ -0,0 +1,150 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from app.batching import Overloaded, _bucket
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the hash latency histogram
+HASH_LATENCY_MS_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Parameters werkzeug fills in when a method is given without them
+_METHOD_DEFAULTS = {
+    'scrypt': 'scrypt:32768:8:1',
+    'pbkdf2': f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}',
+}
+
+
+def normalize_method(method):
+    """Full ``name:params`` form of a werkzeug hash method ("scrypt" -> "scrypt:32768:8:1")"""
+    if method in _METHOD_DEFAULTS:
+        return _METHOD_DEFAULTS[method]
+    if method.startswith('pbkdf2:') and method.count(':') == 1:
+        return f'{method}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+
+class PasswordHasher:
+    """Runs password KDFs on a small dedicated process pool.
+
+    Hashing is CPU-bound by design, so it is kept off the request threads
+    (and off the GIL). At most ``workers + max_queue`` calls may be pending;
+    beyond that ``hash``/``verify`` raise ``Overloaded`` immediately instead
+    of queueing logins behind each other. ``workers=0`` hashes inline in the
+    calling thread (tests, tiny deployments), still with admission control.
+    """
+
+    def __init__(self):
+        self.method = normalize_method('scrypt')
+        self.workers = 2
+        self.max_queue = 32
+        self.timeout = 10.0
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._in_flight = 0
+
+        self._calls = 0
+        self._rejected = 0
+        self._rehashed = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latency_hist = dict.fromkeys(HASH_LATENCY_MS_BUCKETS + ('+Inf',), 0)
+
+    def init_app(self, app):
+        self.method = normalize_method(app.config.get('PASSWORD_HASH_METHOD', 'scrypt'))
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.max_queue = app.config.get('PASSWORD_HASH_QUEUE_MAX', 32)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10.0)
+        app.extensions['password_hasher'] = self
+
+    def hash(self, password):
+        """Hash ``password`` with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password, password_hash):
+        """Check ``password`` against a stored werkzeug hash"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when ``password_hash`` was made with other parameters than the configured ones"""
+        return password_hash.split('$', 1)[0] != self.method
+
+    def record_rehash(self):
+        with self._lock:
+            self._rehashed += 1
+
+    def stats(self):
+        """Pending hash calls, rejections and KDF latency"""
+        with self._lock:
+            calls = self._calls
+            return {
+                'method': self.method.split(':', 1)[0],
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'queue_depth': max(0, self._in_flight - self.workers),
+                'calls': calls,
+                'rejected': self._rejected,
+                'rehashed': self._rehashed,
+                'latency_avg_ms': round(self._latency_total * 1000 / calls, 3) if calls else 0.0,
+                'latency_max_ms': round(self._latency_max * 1000, 3),
+                'latency_histogram_ms': {str(k): v for k, v in self._latency_hist.items()},
+            }
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._in_flight >= max(self.workers, 1) + self.max_queue:
+                self._rejected += 1
+                raise Overloaded(f'Password hashing queue is full ({self._in_flight} pending)')
+            self._in_flight += 1
+            executor = self._executor_locked() if self.workers > 0 else None
+        started = time.monotonic()
+        future = None
+        try:
+            if executor is None:
+                return fn(*args)
+            future = executor.submit(fn, *args)
+            # A timed-out hash keeps its process busy: the slot is freed when it really ends
+            future.add_done_callback(self._release)
+            return future.result(self.timeout)
+        except BrokenProcessPool:
+            # A hashing process died (OOM kill...); start a fresh pool on the next call
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                if future is None:
+                    self._in_flight -= 1
+                self._calls += 1
+                self._latency_total += elapsed
+                self._latency_max = max(self._latency_max, elapsed)
+                self._latency_hist[_bucket(HASH_LATENCY_MS_BUCKETS, elapsed * 1000)] += 1
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _executor_locked(self):
+        # A forked worker must not reuse its parent's pool processes
+        if self._executor is None or self._pid != os.getpid():
+            # spawn: children start clean and never inherit our threads, locks or DB sockets
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            self._pid = os.getpid()
+            logger.info('Started password hashing pool with %d processes', self.workers)
+        return self._executor
+
+
+hasher = PasswordHasher()
@@ -0,0 +1,218 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+
+from app import metrics
+from app.batching import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+# Feature order used by models/train_model.py
+FEATURES = ('age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg',
+            'thalach', 'exang', 'oldpeak', 'slope', 'ca', 'thal')
+
+
+def _heuristic_proba(X):
+    """Deterministic rule-based score used until a trained model is available"""
+    age, chol, trestbps, thalach = X[:, 0], X[:, 4], X[:, 3], X[:, 7]
+    score = (np.select([age > 55, age > 45, age > 35], [3, 2, 1], 0)
+             + np.select([chol > 240, chol > 200], [2, 1], 0)
+             + np.select([trestbps > 140, trestbps > 120], [2, 1], 0)
+             + ((thalach < 60) | (thalach > 100)))
+    # Max score is 8; 5 points was the old "high risk" cut-off -> 0.5
+    return np.clip(score / 10.0, 0.0, 1.0)
+
+
+class InferenceEngine:
+    """Holds the heart risk model in memory and serves predictions.
+
+    The model is loaded once (``load``) and swapped atomically on reload, so
+    request threads only ever read ``self._model``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._model = None
+        self._positive_idx = 1
+        self._path = None
+        self._stamp = None
+        self._loaded_at = None
+        self._metadata = None
+        self.threshold = 0.5
+        self.mmap = True
+        self._watcher = None
+        self._watch_interval = None
+        self._batcher = None
+
+    def init_app(self, app):
+        """Load the configured model at app start-up"""
+        self.threshold = app.config.get('MODEL_THRESHOLD', 0.5)
+        self.mmap = app.config.get('MODEL_MMAP', True)
+        path = app.config.get('MODEL_PATH')
+        # Set even if the load fails, so /model/reload, the watcher and SIGHUP can retry it
+        self._path = path
+        if path and os.path.exists(path):
+            try:
+                self.load(path)
+            except Exception:
+                logger.exception('Could not load model from %s, using heuristic scoring', path)
+        else:
+            logger.warning('Model file %s not found, using heuristic scoring', path)
+        if app.config.get('INFERENCE_BATCHING', False):
+            self._batcher = MicroBatcher(
+                self.predict_proba,
+                window=app.config.get('INFERENCE_BATCH_WINDOW_MS', 2) / 1000.0,
+                max_batch=app.config.get('INFERENCE_BATCH_MAX_SIZE', 64),
+                max_queue=app.config.get('INFERENCE_QUEUE_MAX', 1024),
+            )
+        interval = app.config.get('MODEL_RELOAD_INTERVAL', 0)
+        if interval and interval > 0:
+            self.start_watcher(interval)
+        app.extensions['inference'] = self
+
+    def load(self, path):
+        """Load, warm up and atomically install the model at ``path``"""
+        stamp = self._file_stamp(path)
+        # Arrays inside an uncompressed joblib pickle are memory-mapped read-only,
+        # so forked workers share the same pages.
+        model = joblib.load(path, mmap_mode='r' if self.mmap else None)
+        n_features = getattr(model, 'n_features_in_', len(FEATURES))
+        if n_features != len(FEATURES):
+            raise ValueError(f'Model expects {n_features} features, API sends {len(FEATURES)}')
+        metadata = self._read_metadata(path)
+        if metadata and tuple(metadata.get('features', FEATURES)) != FEATURES:
+            raise ValueError(f'Model was trained on features {metadata["features"]}, API sends {list(FEATURES)}')
+        classes = list(getattr(model, 'classes_', [0, 1]))
+        positive_idx = classes.index(1) if 1 in classes else None
+        # Warm-up: first call allocates internal buffers and pages the trees in
+        model.predict_proba(np.zeros((1, len(FEATURES)), dtype=np.float64))
+
+        with self._lock:
+            self._model = model
+            self._positive_idx = positive_idx
+            self._path = path
+            self._stamp = stamp
+            self._loaded_at = time.time()
+            self._metadata = metadata
+        logger.info('Loaded heart risk model %s (%s)', path, stamp)
+
+    def reload(self):
+        """Reload the configured model file (MODEL_PATH); the old model keeps serving on failure.
+
+        Only that file is ever loaded: unpickling is code execution, so the
+        path is not taken from callers.
+        """
+        self.load(self._path)
+        return self.info()
+
+    def reload_if_changed(self):
+        """Reload when the model file on disk has changed; returns True if reloaded"""
+        path = self._path
+        if not path or not os.path.exists(path):
+            return False
+        if self._file_stamp(path) == self._stamp:
+            return False
+        self.load(path)
+        return True
+
+    def start_watcher(self, interval):
+        """Poll the model file every ``interval`` seconds in a daemon thread"""
+        if self._watcher and self._watcher.is_alive():
+            return
+        self._watch_interval = interval
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_if_changed()
+                except Exception:
+                    logger.exception('Model hot-reload failed, keeping current model')
+
+        self._watcher = threading.Thread(target=watch, name='model-watcher', daemon=True)
+        self._watcher.start()
+
+    def after_fork(self):
+        """Restart per-process threads in a forked worker; the model itself stays shared"""
+        if self._watch_interval:
+            self._watcher = None
+            self.start_watcher(self._watch_interval)
+
+    def warm_up(self):
+        """Score one dummy row so the first real request doesn't pay for page faults"""
+        self.predict_proba(np.zeros((1, len(FEATURES))))
+
+    def predict_proba(self, X):
+        """High-risk probability for each row of an (n, 13) matrix"""
+        started = time.perf_counter()
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURES))
+        model, positive_idx = self._model, self._positive_idx
+        if model is None:
+            proba = _heuristic_proba(X)
+        elif positive_idx is None:
+            proba = np.zeros(len(X))
+        else:
+            proba = model.predict_proba(X)[:, positive_idx]
+        metrics.inference_duration.observe(time.perf_counter() - started)
+        metrics.inference_rows.inc(amount=len(X))
+        return proba
+
+    def predict(self, features):
+        """Score one record (dict keyed by FEATURES); returns (prediction, probability).
+
+        With micro-batching enabled the row is scored together with other
+        concurrent requests; raises ``Overloaded`` when the queue is full.
+        """
+        row = [float(features[name]) for name in FEATURES]
+        if self._batcher is not None:
+            probability = float(self._batcher.submit(row))
+        else:
+            probability = float(self.predict_proba([row])[0])
+        return int(probability >= self.threshold), probability
+
+    def batcher_stats(self):
+        """Micro-batching queue stats, or None when batching is off"""
+        return self._batcher.stats() if self._batcher is not None else None
+
+    def info(self):
+        """Describe the model currently being served"""
+        metadata = self._metadata
+        return {
+            'path': self._path,
+            'version': self._stamp,
+            'loaded_at': self._loaded_at,
+            'kind': type(self._model).__name__ if self._model is not None else 'heuristic',
+            'threshold': self.threshold,
+            'training': {
+                'version': metadata.get('version'),
+                'created_at': metadata.get('created_at'),
+                'training_rows': metadata.get('data', {}).get('training_rows'),
+                'holdout': metadata.get('metrics', {}).get('holdout'),
+            } if metadata else None,
+        }
+
+    @staticmethod
+    def _read_metadata(path):
+        """The .json written next to the model by models/train_model.py, if any"""
+        metadata_path = os.path.splitext(path)[0] + '.json'
+        if not os.path.exists(metadata_path):
+            return None
+        try:
+            with open(metadata_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            logger.warning('Ignoring unreadable model metadata %s', metadata_path)
+            return None
+
+    @staticmethod
+    def _file_stamp(path):
+        st = os.stat(path)
+        return f'{int(st.st_mtime)}-{st.st_size}'
+
+
+engine = InferenceEngine()
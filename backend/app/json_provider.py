@@ -0,0 +1,102 @@
+"""Fast JSON for API responses: orjson when installed, stdlib json otherwise.
+
+Handles what pymysql rows contain: datetime / date (ISO 8601, or the
+HTTP date format of Flask's default provider with JSON_DATETIME_FORMAT=http)
+and Decimal (as a number). Output is compact unless JSON_COMPACT is false,
+or unset in debug mode.
+"""
+import dataclasses
+import datetime
+import decimal
+import json
+import time
+import uuid
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+from app import metrics
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the stdlib encoder
+    orjson = None
+
+
+def _iso_default(o):
+    if isinstance(o, (datetime.datetime, datetime.date, datetime.time)):
+        return o.isoformat()
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    if hasattr(o, 'tolist'):  # numpy scalars / arrays
+        return o.tolist()
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def _http_default(o):
+    if isinstance(o, (datetime.datetime, datetime.date)):
+        return http_date(o)
+    return _iso_default(o)
+
+
+def encode(obj, pretty=False, sort_keys=False, datetime_format='iso'):
+    """Serialize ``obj`` to UTF-8 JSON bytes"""
+    default = _http_default if datetime_format == 'http' else _iso_default
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if datetime_format == 'http':
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        return orjson.dumps(obj, default=default, option=option)
+    return json.dumps(
+        obj,
+        default=default,
+        ensure_ascii=False,
+        sort_keys=sort_keys,
+        indent=2 if pretty else None,
+        separators=None if pretty else (',', ':'),
+    ).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """``app.json`` provider built on :func:`encode`; works for Flask and Quart apps"""
+
+    sort_keys = False
+    ensure_ascii = False
+    datetime_format = 'iso'
+
+    def init_app(self, config):
+        """Apply JSON_* settings from ``config``"""
+        self.compact = getattr(config, 'JSON_COMPACT', None)
+        self.sort_keys = getattr(config, 'JSON_SORT_KEYS', False)
+        self.datetime_format = getattr(config, 'JSON_DATETIME_FORMAT', 'iso')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Callers asking for json.dumps options get the stdlib encoder
+            kwargs.setdefault('default', _http_default if self.datetime_format == 'http' else _iso_default)
+            return super().dumps(obj, **kwargs)
+        return encode(obj, sort_keys=self.sort_keys, datetime_format=self.datetime_format).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        started = time.perf_counter()
+        body = encode(obj, pretty=pretty, sort_keys=self.sort_keys, datetime_format=self.datetime_format)
+        metrics.json_duration.observe(time.perf_counter() - started)
+        metrics.json_bytes.inc(amount=len(body) + 1)
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,564 @@
+"""Request instrumentation exposed in the Prometheus text format.
+
+Per-route latency, DB calls (every ``Database`` / ``AsyncDatabase`` static
+method), model inference and JSON encoding are recorded into in-process
+histograms and served by ``GET /api/metrics``. Each request also gets a
+``Server-Timing`` header (total, db) for the browser dev tools.
+
+Every process records into its own registry. Under the pre-fork server
+each one also writes a snapshot to METRICS_DIR about once a second, and
+``/api/metrics`` renders the sum over every worker (live or exited), so a
+scrape does not depend on which worker answers it.
+
+With PROFILE_SLOW_REQUEST_MS set, a sampling profiler records the stack of
+each request thread every PROFILE_SAMPLE_INTERVAL_MS and writes requests
+slower than the threshold to PROFILE_DIR as collapsed stacks
+(``flamegraph.pl`` / speedscope input). Sync app only.
+"""
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process, nothing to share
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(n, str(v).replace('\\', r'\\').replace('"', r'\"')) for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels (values passed positionally)"""
+
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [count per bucket..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def reset(self):
+        # New lock too: a fork may have copied it while another thread held it
+        self._lock = threading.Lock()
+        self._series = {}
+
+    @staticmethod
+    def add(total, series):
+        return list(series) if total is None else [a + b for a, b in zip(total, series)]
+
+    def render(self, series=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        items = (self.snapshot() if series is None else series).items()
+        for labels, series in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                le = _labels(self.labelnames + ('le',), labels + (bound,))
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            base = _labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{base} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{base} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    @staticmethod
+    def add(total, value):
+        return value if total is None else total + value
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        items = sorted((self.snapshot() if values is None else values).items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Registry:
+    """The app's metrics; optionally summed with the other processes sharing ``directory``"""
+
+    def __init__(self):
+        self._metrics = []
+        self.directory = None
+        self.flush_interval = 1.0
+        self._pid = None
+        self._owner = None
+        self._thread = None
+        self._exit_hook = False
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        totals = self._collect() if self.directory else {}
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(totals.get(metric.name)) if self.directory else metric.render())
+        return '\n'.join(lines) + '\n'
+
+    # ---------------------------------------------------------------- #
+    # Sharing between the processes of a pre-fork server
+    # ---------------------------------------------------------------- #
+    # Each process keeps <pid>.json up to date and holds an flock on
+    # <pid>.lock while it lives. Snapshots of exited processes are folded
+    # into archive.json, so their counts are kept without piling up files.
+
+    def share(self, directory, flush_interval=1.0):
+        """Publish this process's series in ``directory`` and render the sum of every process there"""
+        if fcntl is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._attach()
+
+    def after_fork(self):
+        """In a forked worker: drop the series copied from the master, publish under the new pid"""
+        if self.directory is None:
+            return
+        for metric in self._metrics:
+            metric.reset()
+        if self._owner is not None:
+            self._owner.close()  # the master's lock, inherited
+            self._owner = None
+        self._attach()
+
+    def flush(self):
+        """Write this process's snapshot (atomically replaced)"""
+        if self.directory is None or self._pid != os.getpid():
+            return
+        data = {metric.name: [[list(labels), value] for labels, value in metric.snapshot().items()]
+                for metric in self._metrics}
+        path = self._path(self._pid, '.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, f'{name}{suffix}')
+
+    def _attach(self):
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        self._pid = pid
+        with self._directory_lock():
+            # Left by an exited process that had the same pid
+            self._archive([pid])
+            self._owner = open(self._path(pid, '.lock'), 'w')
+            fcntl.flock(self._owner.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.flush()
+        self._thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+        self._thread.start()
+        if not self._exit_hook:
+            atexit.register(self._flush_quietly)
+            self._exit_hook = True
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            self._flush_quietly()
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except OSError as e:
+            logger.warning('Could not write metrics snapshot: %s', e)
+
+    def _directory_lock(self):
+        lock = open(self._path('archive', '.lock'), 'w')
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        return lock  # closing it (end of the with block) releases the lock
+
+    def _exited(self):
+        """pids whose lock file is no longer held"""
+        exited = []
+        for name in os.listdir(self.directory):
+            pid, _, suffix = name.partition('.')
+            if suffix != 'lock' or not pid.isdigit() or int(pid) == self._pid:
+                continue
+            with open(os.path.join(self.directory, name), 'a') as f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue
+            exited.append(int(pid))
+        return exited
+
+    def _archive(self, pids):
+        """Fold the snapshots of ``pids`` into archive.json (directory lock held)"""
+        paths = [self._path(pid, '.json') for pid in pids]
+        snapshots = [_read(path) for path in paths if os.path.exists(path)]
+        if snapshots:
+            totals = _read(self._path('archive', '.json')) or {}
+            for snapshot in snapshots:
+                self._merge(totals, snapshot)
+            with open(self._path('archive', '.json.tmp'), 'w', encoding='utf-8') as f:
+                json.dump({name: [[list(labels), value] for labels, value in series.items()]
+                           for name, series in totals.items()}, f, separators=(',', ':'))
+            os.replace(self._path('archive', '.json.tmp'), self._path('archive', '.json'))
+        for pid in pids:
+            for suffix in ('.json', '.lock'):
+                try:
+                    os.remove(self._path(pid, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def _merge(self, totals, snapshot):
+        """Add one snapshot ({name: [[labels, value], ...]} or already merged) into ``totals``"""
+        kinds = {metric.name: metric for metric in self._metrics}
+        for name, items in snapshot.items():
+            metric = kinds.get(name)
+            if metric is None:  # written by another version of the app
+                continue
+            series = totals.setdefault(name, {})
+            for labels, value in (items.items() if isinstance(items, dict) else items):
+                labels = tuple(labels)
+                series[labels] = metric.add(series.get(labels), value)
+
+    def _collect(self):
+        """{metric name: {labels: value}} summed over every process that shared the directory"""
+        try:
+            self.flush()
+            with self._directory_lock():
+                self._archive(self._exited())
+                totals = {}
+                for name in os.listdir(self.directory):
+                    if name.endswith('.json'):
+                        snapshot = _read(os.path.join(self.directory, name))
+                        if snapshot:
+                            self._merge(totals, snapshot)
+            return totals
+        except OSError as e:
+            logger.warning('Could not read shared metrics, serving this process only: %s', e)
+            return {metric.name: metric.snapshot() for metric in self._metrics}
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+registry = Registry()
+
+http_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time to build the response, by route template',
+    LATENCY_BUCKETS, ('method', 'route', 'status'))
+http_db_queries = registry.histogram(
+    'http_request_db_queries', 'Database calls made while serving one request',
+    COUNT_BUCKETS, ('route',))
+http_db_seconds = registry.histogram(
+    'http_request_db_seconds', 'Time spent in database calls per request',
+    LATENCY_BUCKETS, ('route',))
+db_duration = registry.histogram(
+    'db_call_duration_seconds', 'Duration of each Database method call',
+    FAST_BUCKETS + (1.0, 5.0), ('method',))
+db_errors = registry.counter('db_call_errors_total', 'Database method calls that raised', ('method',))
+inference_duration = registry.histogram(
+    'model_inference_seconds', 'predict_proba wall time per call (one row or a micro-batch)', FAST_BUCKETS)
+inference_rows = registry.counter('model_inference_rows_total', 'Rows scored by the model')
+json_duration = registry.histogram('json_encode_seconds', 'Response body JSON encoding time', FAST_BUCKETS)
+json_bytes = registry.counter('json_encoded_bytes_total', 'Bytes of JSON response bodies')
+journal_fsync = registry.histogram(
+    'prediction_journal_fsync_seconds', 'fsync of the write-behind journal (one per group commit)', FAST_BUCKETS)
+journal_flush = registry.histogram(
+    'prediction_journal_flush_seconds', 'Database insert of one batch of journaled predictions', LATENCY_BUCKETS)
+journal_records = registry.counter(
+    'prediction_journal_records_total', 'Write-behind predictions by outcome (appended, flushed, replayed, rejected, shed)',
+    ('outcome',))
+errors = registry.counter('app_errors_total', 'Errors handled (logged) inside the app, by place', ('where',))
+
+
+# -------------------------------------------------------------------- #
+# Per-request accounting
+# -------------------------------------------------------------------- #
+
+class RequestStats:
+    __slots__ = ('started', 'db_queries', 'db_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def _record_db(name, seconds):
+    db_duration.observe(seconds, name)
+    stats = _current.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += seconds
+
+
+def _timed(name, fn):
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def timed_async(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                db_errors.inc(name)
+                raise
+            finally:
+                _record_db(name, time.perf_counter() - started)
+        return timed_async
+
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        # iter_* methods return a generator: only starting it is timed
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            db_errors.inc(name)
+            raise
+        finally:
+            _record_db(name, time.perf_counter() - started)
+    return timed
+
+
+def instrument_database(cls, skip=('pool_stats',)):
+    """Wrap every static method of ``cls`` with call timing (idempotent)"""
+    for name, attr in list(vars(cls).items()):
+        if isinstance(attr, staticmethod) and name not in skip and not hasattr(attr.__func__, '__wrapped__'):
+            setattr(cls, name, staticmethod(_timed(name, attr.__func__)))
+
+
+def begin_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(stats, token, method, route, status, response_headers=None):
+    """Record one finished request; adds Server-Timing when headers are given"""
+    elapsed = time.perf_counter() - stats.started
+    http_duration.observe(elapsed, method, route, status)
+    http_db_queries.observe(stats.db_queries, route)
+    http_db_seconds.observe(stats.db_seconds, route)
+    if response_headers is not None:
+        response_headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.2f}, db;dur={stats.db_seconds * 1000:.2f};desc="{stats.db_queries} calls"')
+    try:
+        _current.reset(token)
+    except ValueError:  # finished in another context than it began
+        _current.set(None)
+    return elapsed
+
+
+# -------------------------------------------------------------------- #
+# Slow-request sampling profiler
+# -------------------------------------------------------------------- #
+
+class SlowRequestProfiler:
+    """Samples the stacks of registered request threads from a daemon thread"""
+
+    def __init__(self, threshold, interval=0.005, directory='profiles'):
+        self.threshold = threshold
+        self.interval = interval
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._active = {}  # thread ident -> Counter of collapsed stacks
+        self._thread = None
+        self._pid = None
+        self.dumped = 0
+
+    def start(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = _Tally()
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self, elapsed, label):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples and elapsed >= self.threshold:
+            self._dump(samples, elapsed, label)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[_collapse(frame)] += 1
+
+    def _dump(self, samples, elapsed, label):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            name = '{}-{}-{}ms-{}.folded'.format(
+                time.strftime('%Y%m%dT%H%M%S'), os.getpid(), int(elapsed * 1000),
+                ''.join(c if c.isalnum() else '_' for c in label).strip('_')[:80])
+            with open(os.path.join(self.directory, name), 'w', encoding='utf-8') as f:
+                for stack, count in samples.most_common():
+                    f.write(f'{stack} {count}\n')
+            self.dumped += 1
+        except OSError as e:
+            logger.warning('Could not write slow request profile: %s', e)
+
+
+def _collapse(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(parts))
+
+
+# -------------------------------------------------------------------- #
+# Wiring
+# -------------------------------------------------------------------- #
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def scrape_allowed(config, authorization):
+    """METRICS_TOKEN, when set, must be sent as ``Authorization: Bearer <token>``"""
+    if not config.get('METRICS_ENABLED', True):
+        return False
+    token = config.get('METRICS_TOKEN')
+    return not token or authorization == f'Bearer {token}'
+
+
+def _install(app, request, profile):
+    config = app.config
+    if not config.get('METRICS_ENABLED', True):
+        return None
+    from app.database import Database
+    instrument_database(Database)
+    profiler = None
+    slow_ms = config.get('PROFILE_SLOW_REQUEST_MS', 0)
+    if profile and slow_ms > 0:
+        profiler = SlowRequestProfiler(slow_ms / 1000.0, config.get('PROFILE_SAMPLE_INTERVAL_MS', 5) / 1000.0,
+                                       config.get('PROFILE_DIR', 'profiles'))
+    if config.get('METRICS_DIR'):
+        registry.share(config['METRICS_DIR'], config.get('METRICS_FLUSH_INTERVAL', 1.0))
+    app.extensions['metrics'] = {'registry': registry, 'profiler': profiler}
+
+    def before():
+        request.metrics = begin_request()
+        if profiler is not None:
+            profiler.start()
+
+    def after(response):
+        entry = getattr(request, 'metrics', None)
+        if entry is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        elapsed = end_request(*entry, request.method, route, response.status_code, response.headers)
+        if profiler is not None:
+            profiler.stop(elapsed, f'{request.method} {request.path}')
+        return response
+
+    return before, after
+
+
+def init_app(app):
+    """Install the request hooks on the Flask app"""
+    from flask import request
+    hooks = _install(app, request, profile=True)
+    if hooks:
+        app.before_request(hooks[0])
+        app.after_request(hooks[1])
+
+
+def init_async_app(app):
+    """Install the request hooks on the Quart app (no profiler: requests share one thread)"""
+    from quart import request
+    hooks = _install(app, request, profile=False)
+    if not hooks:
+        return
+    from app.aio.database import AsyncDatabase
+    instrument_database(AsyncDatabase)
+    before, after = hooks
+
+    # Coroutines, so the hooks run in the request's own context rather than a worker thread
+    async def before_async():
+        before()
+
+    async def after_async(response):
+        return after(response)
+
+    app.before_request(before_async)
+    app.after_request(after_async)
@@ -0,0 +1,155 @@
+"""Versioned schema migrations.
+
+Each ``vNNNN_<name>.py`` module in this package defines ``up(cur)`` and
+``down(cur)``. The applied version is tracked in ``schema_migrations``.
+MySQL commits DDL implicitly, so every migration must be safe to re-run
+(check before create/drop) in case it failed halfway. SQLite databases are
+created at the latest version by ``sqlite_schema`` instead.
+
+Usage:
+    python -m app.migrations status
+    python -m app.migrations upgrade [version]
+    python -m app.migrations downgrade <version>
+"""
+import importlib
+import pkgutil
+import re
+from datetime import datetime
+
+from app.storage import backend
+
+LOCK_NAME = 'heartcare_schema_migrations'
+LOCK_TIMEOUT = 60
+
+_MODULE_RE = re.compile(r'^v(\d{4})_(\w+)$')
+
+
+def discover():
+    """All migration modules as a sorted list of (version, name, module)"""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        m = _MODULE_RE.match(info.name)
+        if m:
+            module = importlib.import_module(f'{__name__}.{info.name}')
+            found.append((int(m.group(1)), m.group(2), module))
+    return sorted(found, key=lambda item: item[0])
+
+
+# -------------------------------------------------------------------- #
+# Helpers for migrations (information_schema checks keep them re-runnable)
+# -------------------------------------------------------------------- #
+
+def column_exists(cur, table, column):
+    cur.execute('''SELECT COUNT(*) AS n FROM information_schema.COLUMNS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s''',
+                (table, column))
+    return cur.fetchone()['n'] > 0
+
+
+def index_exists(cur, table, index):
+    cur.execute('''SELECT COUNT(*) AS n FROM information_schema.STATISTICS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s''',
+                (table, index))
+    return cur.fetchone()['n'] > 0
+
+
+def foreign_key_exists(cur, table, name):
+    cur.execute("""SELECT COUNT(*) AS n FROM information_schema.TABLE_CONSTRAINTS
+                   WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+                     AND CONSTRAINT_NAME = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'""",
+                (table, name))
+    return cur.fetchone()['n'] > 0
+
+
+# -------------------------------------------------------------------- #
+# Runner
+# -------------------------------------------------------------------- #
+
+def _ensure_version_table(cur):
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at DATETIME NOT NULL
+    )
+    ''')
+
+
+def _applied(cur):
+    cur.execute('SELECT version FROM schema_migrations')
+    return {row['version'] for row in cur.fetchall()}
+
+
+def _run(action):
+    # Local import: app.database calls back into this module
+    from app.database import get_connection
+
+    with get_connection() as conn, conn.cursor() as cur:
+        # Serialize runners across processes (e.g. several workers starting at once)
+        if not backend.acquire_lock(cur, LOCK_NAME, LOCK_TIMEOUT):
+            raise RuntimeError('Another process is running migrations')
+        try:
+            _ensure_version_table(cur)
+            conn.commit()
+            return action(conn, cur)
+        finally:
+            backend.release_lock(cur, LOCK_NAME)
+
+
+def current_version():
+    """Highest applied migration version (0 for an empty database)"""
+    def action(conn, cur):
+        applied = _applied(cur)
+        return max(applied) if applied else 0
+    return _run(action)
+
+
+def status():
+    """List of (version, name, applied) for every known migration"""
+    def action(conn, cur):
+        applied = _applied(cur)
+        return [(version, name, version in applied) for version, name, _ in discover()]
+    return _run(action)
+
+
+def upgrade(target=None):
+    """Apply pending migrations up to ``target`` (default: latest); returns applied versions"""
+    def action(conn, cur):
+        if backend.name == 'sqlite':
+            from app.migrations import sqlite_schema
+            return sqlite_schema.upgrade(conn, cur, discover())
+        applied = _applied(cur)
+        done = []
+        for version, name, module in discover():
+            if target is not None and version > target:
+                break
+            if version in applied:
+                continue
+            module.up(cur)
+            cur.execute('INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)',
+                        (version, name, datetime.now()))
+            conn.commit()
+            done.append(version)
+        return done
+    return _run(action)
+
+
+def downgrade(target):
+    """Revert applied migrations newer than ``target``; returns reverted versions"""
+    if backend.name == 'sqlite':
+        raise RuntimeError('Downgrades are MySQL only; a SQLite database is recreated instead')
+
+    def action(conn, cur):
+        applied = _applied(cur)
+        done = []
+        for version, name, module in reversed(discover()):
+            if version <= target:
+                break
+            if version not in applied:
+                continue
+            module.down(cur)
+            cur.execute('DELETE FROM schema_migrations WHERE version = %s', (version,))
+            conn.commit()
+            done.append(version)
+        return done
+    return _run(action)
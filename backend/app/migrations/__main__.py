@@ -0,0 +1,22 @@
+import sys
+from app import migrations
+
+
+def main(argv):
+    command = argv[0] if argv else 'status'
+    if command == 'status':
+        for version, name, applied in migrations.status():
+            print(f"{version:04d} {'[x]' if applied else '[ ]'} {name}")
+    elif command == 'upgrade':
+        target = int(argv[1]) if len(argv) > 1 else None
+        print('Applied:', migrations.upgrade(target) or 'nothing')
+    elif command == 'downgrade' and len(argv) > 1:
+        print('Reverted:', migrations.downgrade(int(argv[1])) or 'nothing')
+    else:
+        print(migrations.__doc__)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
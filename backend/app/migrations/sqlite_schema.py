@@ -0,0 +1,114 @@
+"""Schema of a SQLite database (DATABASE_URL=sqlite:///...).
+
+The vNNNN migrations are written for MySQL (information_schema checks,
+ALTER TABLE ... MODIFY, named locks). A SQLite database is created directly
+at the schema they lead to, and those versions are recorded as applied.
+When adding a migration, mirror it here and bump SCHEMA_VERSION.
+"""
+from datetime import datetime
+
+from app import rollups
+
+SCHEMA_VERSION = 7
+
+TABLES = [
+    '''CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        full_name VARCHAR(255),
+        role VARCHAR(50),
+        phone VARCHAR(20),
+        created_at DATETIME
+    )''',
+    '''CREATE TABLE IF NOT EXISTS patients (
+        patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        citizen_id VARCHAR(50) UNIQUE,
+        full_name VARCHAR(255) NOT NULL,
+        gender VARCHAR(10),
+        date_of_birth DATE,
+        phone VARCHAR(20),
+        address VARCHAR(255),
+        province VARCHAR(100),
+        `condition` TEXT,
+        created_by INTEGER REFERENCES users (user_id) ON DELETE SET NULL,
+        created_at DATETIME
+    )''',
+    # AUTOINCREMENT: ids are never reused, the analytics store follows them as a watermark
+    '''CREATE TABLE IF NOT EXISTS predictions (
+        prediction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_id INTEGER REFERENCES patients (patient_id) ON DELETE CASCADE,
+        age INTEGER,
+        sex INTEGER,
+        cp INTEGER,
+        trestbps FLOAT,
+        chol FLOAT,
+        fbs INTEGER,
+        restecg INTEGER,
+        thalach FLOAT,
+        exang INTEGER,
+        oldpeak FLOAT,
+        slope INTEGER,
+        ca INTEGER,
+        thal INTEGER,
+        prediction INTEGER,
+        prediction_date DATETIME,
+        import_key CHAR(40) UNIQUE
+    )''',
+    '''CREATE TABLE IF NOT EXISTS revoked_tokens (
+        token_hash CHAR(64) NOT NULL PRIMARY KEY,
+        user_id INTEGER,
+        expires_at DATETIME NOT NULL,
+        revoked_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID''',
+]
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_predictions_patient_date ON predictions (patient_id, prediction_date DESC)',
+    'CREATE INDEX IF NOT EXISTS idx_predictions_date ON predictions (prediction_date)',
+    'CREATE INDEX IF NOT EXISTS idx_patients_created_by ON patients (created_by, patient_id)',
+    'CREATE INDEX IF NOT EXISTS idx_patients_province ON patients (province, patient_id)',
+    'CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires ON revoked_tokens (expires_at)',
+]
+
+
+def _rollup_table(table):
+    values = ',\n        '.join(
+        f'{col} DOUBLE NOT NULL DEFAULT 0' if col.startswith('sum_') else f'{col} INTEGER NOT NULL DEFAULT 0'
+        for col in rollups.VALUE_COLUMNS)
+    return [
+        f'''CREATE TABLE IF NOT EXISTS {table} (
+        period DATE NOT NULL,
+        province VARCHAR(100) NOT NULL DEFAULT '',
+        age_band INTEGER NOT NULL,
+        sex INTEGER NOT NULL,
+        prediction INTEGER NOT NULL,
+        {values},
+        PRIMARY KEY (period, province, age_band, sex, prediction)
+    ) WITHOUT ROWID''',
+        f'CREATE INDEX IF NOT EXISTS idx_{table}_province ON {table} (province, period)',
+    ]
+
+
+def upgrade(conn, cur, migrations):
+    """Create the schema and record ``migrations`` (discover() entries) as applied"""
+    pending = [version for version, _, _ in migrations if version > SCHEMA_VERSION]
+    if pending:
+        raise RuntimeError(f'Migration {pending[0]:04d} has no SQLite version yet (app/migrations/sqlite_schema.py)')
+    # Held until commit: a second process starting at the same time waits here
+    cur.execute('BEGIN IMMEDIATE')
+    cur.execute('SELECT version FROM schema_migrations')
+    applied = {row['version'] for row in cur.fetchall()}
+    statements = list(TABLES) + list(INDEXES)
+    for table, _ in rollups.TABLES.values():
+        statements += _rollup_table(table)
+    for sql in statements:
+        cur.execute(sql)
+    done = []
+    for version, name, _ in migrations:
+        if version not in applied:
+            cur.execute('INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)',
+                        (version, name, datetime.now()))
+            done.append(version)
+    conn.commit()
+    return done
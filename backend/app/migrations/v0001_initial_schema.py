@@ -0,0 +1,59 @@
+"""Base tables (users, patients, predictions) with the columns the API uses"""
+
+
+def up(cur):
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INT AUTO_INCREMENT PRIMARY KEY,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        full_name VARCHAR(255),
+        role VARCHAR(50),
+        phone VARCHAR(20),
+        created_at DATETIME
+    )
+    ''')
+
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS patients (
+        patient_id INT AUTO_INCREMENT PRIMARY KEY,
+        citizen_id VARCHAR(50),
+        full_name VARCHAR(255) NOT NULL,
+        gender VARCHAR(10),
+        date_of_birth DATE,
+        phone VARCHAR(20),
+        address VARCHAR(255),
+        province VARCHAR(100),
+        `condition` TEXT,
+        created_by INT,
+        created_at DATETIME
+    )
+    ''')
+
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS predictions (
+        prediction_id INT AUTO_INCREMENT PRIMARY KEY,
+        patient_id INT,
+        age INT,
+        sex INT,
+        cp INT,
+        trestbps FLOAT,
+        chol FLOAT,
+        fbs INT,
+        restecg INT,
+        thalach FLOAT,
+        exang INT,
+        oldpeak FLOAT,
+        slope INT,
+        ca INT,
+        thal INT,
+        prediction INT,
+        prediction_date DATETIME
+    )
+    ''')
+
+
+def down(cur):
+    cur.execute('DROP TABLE IF EXISTS predictions')
+    cur.execute('DROP TABLE IF EXISTS patients')
+    cur.execute('DROP TABLE IF EXISTS users')
@@ -0,0 +1,33 @@
+"""Bring patients tables created by older scripts in line with the API.
+
+The old ``_ensure_tables`` created ``name``/``bhytId``/``medical_history``
+and ``data/create_mysql_db.sql`` created ``name``/``email``, while
+``Database.add_patient`` writes ``citizen_id``, ``full_name``, ``address``,
+``province`` and ``condition``. Missing columns are added, ``name`` is
+copied into ``full_name`` and relaxed to NULL so inserts stop failing.
+Legacy columns are kept (no data is dropped).
+"""
+from app.migrations import column_exists
+
+COLUMNS = [
+    ('citizen_id', 'VARCHAR(50)'),
+    ('full_name', 'VARCHAR(255)'),
+    ('address', 'VARCHAR(255)'),
+    ('province', 'VARCHAR(100)'),
+    ('condition', 'TEXT'),
+]
+
+
+def up(cur):
+    for column, ddl in COLUMNS:
+        if not column_exists(cur, 'patients', column):
+            cur.execute(f'ALTER TABLE patients ADD COLUMN `{column}` {ddl}')
+
+    if column_exists(cur, 'patients', 'name'):
+        cur.execute('UPDATE patients SET full_name = name WHERE full_name IS NULL')
+        cur.execute('ALTER TABLE patients MODIFY COLUMN name VARCHAR(255) NULL')
+
+
+def down(cur):
+    # Columns may hold data written through the API; keep them.
+    pass
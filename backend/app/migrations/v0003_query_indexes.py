@@ -0,0 +1,26 @@
+"""Secondary indexes for the lookups the API runs on every request"""
+from app.migrations import index_exists
+
+INDEXES = [
+    # get_predictions_by_patient / get_latest_prediction
+    ('predictions', 'idx_predictions_patient_date', '(patient_id, prediction_date DESC)'),
+    # get_all_predictions ordering
+    ('predictions', 'idx_predictions_date', '(prediction_date)'),
+    # get_all_patients / list_patients for non-admin users
+    ('patients', 'idx_patients_created_by', '(created_by, patient_id)'),
+    # list_patients province filter
+    ('patients', 'idx_patients_province', '(province, patient_id)'),
+]
+
+
+def up(cur):
+    # users.email already has a UNIQUE index from the table definition
+    for table, name, columns in INDEXES:
+        if not index_exists(cur, table, name):
+            cur.execute(f'CREATE INDEX {name} ON {table} {columns}')
+
+
+def down(cur):
+    for table, name, _ in reversed(INDEXES):
+        if index_exists(cur, table, name):
+            cur.execute(f'DROP INDEX {name} ON {table}')
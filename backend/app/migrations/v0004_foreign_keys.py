@@ -0,0 +1,43 @@
+"""Foreign keys: predictions -> patients, patients -> users.
+
+Deleting a patient deletes its predictions; deleting a user keeps their
+patients with ``created_by`` set to NULL. Patients of already-deleted users
+get the same treatment here, but predictions pointing at missing patients
+must be fixed by hand - the migration will not delete clinical data.
+"""
+from app.migrations import foreign_key_exists
+
+FOREIGN_KEYS = [
+    ('predictions', 'fk_predictions_patient',
+     'FOREIGN KEY (patient_id) REFERENCES patients (patient_id) ON DELETE CASCADE'),
+    ('patients', 'fk_patients_created_by',
+     'FOREIGN KEY (created_by) REFERENCES users (user_id) ON DELETE SET NULL'),
+]
+
+
+def _fix_orphans(cur):
+    cur.execute('''UPDATE patients p
+                   LEFT JOIN users u ON u.user_id = p.created_by
+                   SET p.created_by = NULL
+                   WHERE p.created_by IS NOT NULL AND u.user_id IS NULL''')
+    cur.execute('''SELECT COUNT(*) AS n FROM predictions pr
+                   LEFT JOIN patients p ON p.patient_id = pr.patient_id
+                   WHERE pr.patient_id IS NOT NULL AND p.patient_id IS NULL''')
+    orphans = cur.fetchone()['n']
+    if orphans:
+        raise RuntimeError(
+            f'Cannot add foreign keys: {orphans} predictions reference missing patients'
+        )
+
+
+def up(cur):
+    _fix_orphans(cur)
+    for table, name, ddl in FOREIGN_KEYS:
+        if not foreign_key_exists(cur, table, name):
+            cur.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {ddl}')
+
+
+def down(cur):
+    for table, name, _ in reversed(FOREIGN_KEYS):
+        if foreign_key_exists(cur, table, name):
+            cur.execute(f'ALTER TABLE {table} DROP FOREIGN KEY {name}')
@@ -0,0 +1,33 @@
+"""Natural keys that make re-running scripts/import_data_sql.py idempotent.
+
+- patients.citizen_id becomes UNIQUE (NULLs still allowed)
+- predictions.import_key: digest of the source row, UNIQUE, NULL for
+  predictions made through the API
+"""
+from app.migrations import column_exists, index_exists
+
+
+def up(cur):
+    if not index_exists(cur, 'patients', 'uq_patients_citizen_id'):
+        cur.execute('''SELECT COUNT(*) AS n FROM (
+                           SELECT citizen_id FROM patients WHERE citizen_id IS NOT NULL
+                           GROUP BY citizen_id HAVING COUNT(*) > 1
+                       ) d''')
+        duplicates = cur.fetchone()['n']
+        if duplicates:
+            raise RuntimeError(f'Cannot make citizen_id unique: {duplicates} values are used by several patients')
+        cur.execute('CREATE UNIQUE INDEX uq_patients_citizen_id ON patients (citizen_id)')
+
+    if not column_exists(cur, 'predictions', 'import_key'):
+        cur.execute('ALTER TABLE predictions ADD COLUMN import_key CHAR(40) NULL')
+    if not index_exists(cur, 'predictions', 'uq_predictions_import_key'):
+        cur.execute('CREATE UNIQUE INDEX uq_predictions_import_key ON predictions (import_key)')
+
+
+def down(cur):
+    if index_exists(cur, 'predictions', 'uq_predictions_import_key'):
+        cur.execute('DROP INDEX uq_predictions_import_key ON predictions')
+    if column_exists(cur, 'predictions', 'import_key'):
+        cur.execute('ALTER TABLE predictions DROP COLUMN import_key')
+    if index_exists(cur, 'patients', 'uq_patients_citizen_id'):
+        cur.execute('DROP INDEX uq_patients_citizen_id ON patients')
@@ -0,0 +1,19 @@
+"""Revoked JWTs (logout), keyed by the SHA-256 of the token.
+
+Rows can be deleted once expires_at has passed: the token is rejected by
+its own ``exp`` from then on.
+"""
+
+
+def up(cur):
+    cur.execute('''CREATE TABLE IF NOT EXISTS revoked_tokens (
+        token_hash CHAR(64) NOT NULL PRIMARY KEY,
+        user_id INT NULL,
+        expires_at DATETIME NOT NULL,
+        revoked_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_revoked_tokens_expires (expires_at)
+    )''')
+
+
+def down(cur):
+    cur.execute('DROP TABLE IF EXISTS revoked_tokens')
@@ -0,0 +1,14 @@
+"""Daily and monthly prediction rollups (app/rollups.py), filled from the existing rows."""
+from app import rollups
+
+
+def up(cur):
+    for table, _ in rollups.TABLES.values():
+        cur.execute(rollups.create_table_sql(table))
+    # Re-runnable: rebuild() replaces whatever a failed run left behind
+    rollups.rebuild(cur)
+
+
+def down(cur):
+    for table, _ in rollups.TABLES.values():
+        cur.execute(f'DROP TABLE IF EXISTS {table}')
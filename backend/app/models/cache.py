@@ -0,0 +1,191 @@
+"""Read-through cache for model objects, with per-resource invalidation.
+
+Entries are keyed ``resource:id:version:role``. A write bumps the version
+of the ``resource:id`` it touched, so every role's entry for it is dropped
+at once without enumerating keys. Each cached value carries an ETag
+computed from its content.
+
+Backends (CACHE_BACKEND):
+    local  in-process LRU (per worker process; writes made by another
+           process become visible after CACHE_TTL, so it is off by default)
+    redis  shared by every worker/host (CACHE_REDIS_URL, needs ``redis``)
+"""
+import hashlib
+import json
+import logging
+import itertools
+import pickle
+import threading
+import time
+
+from app.cache import TTLCache
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    """In-process backend; also the stand-in for the shared one in dev and tests"""
+
+    def __init__(self, maxsize=10000, ttl=60.0):
+        self._entries = TTLCache(maxsize, ttl)
+        self._ttl = ttl
+        self._versions = {}  # key -> (version, bumped_at)
+        # Versions come from one counter, so a pruned key never gets an old number back
+        self._counter = itertools.count(1)
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, value, ttl):
+        self._entries.set(key, value, ttl)
+
+    def version(self, key):
+        entry = self._versions.get(key)
+        return entry[0] if entry else 0
+
+    def bump(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._versions[key] = (next(self._counter), now)
+            if now - self._pruned_at >= self._ttl:
+                self._prune(now)
+
+    def _prune(self, now):
+        # A version bumped more than a TTL ago only guards entries that have expired
+        cutoff = now - self._ttl
+        self._versions = {k: v for k, v in self._versions.items() if v[1] > cutoff}
+        self._pruned_at = now
+
+    def stats(self):
+        return dict(self._entries.stats(), backend='local')
+
+
+class RedisBackend:
+    """Shared backend: one cache for every worker process and host"""
+
+    def __init__(self, url, prefix='heartcare:cache:'):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        with self._lock:
+            if raw is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self._prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=max(1, int(ttl)))
+
+    def version(self, key):
+        raw = self._client.get(self._prefix + key)
+        return int(raw) if raw is not None else 0
+
+    def bump(self, key):
+        self._client.incr(self._prefix + key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend': 'redis',
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def _etag(value):
+    body = json.dumps(value, default=str, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+
+class ModelCache:
+    """Read-through cache used by the models; backend chosen from config"""
+
+    def __init__(self, config=None):
+        config = config or get_config()
+        self.ttl = config.CACHE_TTL
+        self.enabled = self.ttl > 0
+        self._errors = 0
+        if config.CACHE_BACKEND == 'redis':
+            try:
+                self.backend = RedisBackend(config.CACHE_REDIS_URL)
+            except ImportError:
+                # A per-process stand-in would serve other workers' stale rows
+                logger.warning('CACHE_BACKEND=redis but the redis package is missing, caching disabled')
+                self.enabled = False
+                self.backend = LocalBackend(config.CACHE_MAX_ENTRIES, self.ttl)
+        else:
+            self.backend = LocalBackend(config.CACHE_MAX_ENTRIES, self.ttl)
+
+    def get_or_load(self, resource, ident, role, loader):
+        """(value, etag) from the cache, or from ``loader()`` on a miss; (None, None) if not found"""
+        if not self.enabled:
+            value = loader()
+            return (value, _etag(value)) if value is not None else (None, None)
+        try:
+            version = self.backend.version(f'v:{resource}:{ident}')
+            key = f'{resource}:{ident}:{version}:{role}'
+            entry = self.backend.get(key)
+        except Exception as e:
+            self._backend_error(e)
+            key, entry = None, None
+        if entry is not None:
+            return entry
+
+        value = loader()
+        if value is None:
+            return None, None
+        entry = (value, _etag(value))
+        if key is not None:
+            try:
+                self.backend.set(key, entry, self.ttl)
+            except Exception as e:
+                self._backend_error(e)
+        return entry
+
+    def invalidate(self, resource, ident):
+        """Drop every cached entry (all roles) of one resource"""
+        if not self.enabled:
+            return
+        try:
+            self.backend.bump(f'v:{resource}:{ident}')
+        except Exception as e:
+            self._backend_error(e)
+
+    def stats(self):
+        try:
+            stats = self.backend.stats()
+        except Exception as e:
+            stats = {'error': str(e)}
+        return dict(stats, ttl=self.ttl, enabled=self.enabled, backend_errors=self._errors)
+
+    def _backend_error(self, e):
+        # The cache is an optimisation: on backend trouble, serve from the DB
+        self._errors += 1
+        logger.warning('Model cache backend error: %s', e)
+
+
+cache = ModelCache()
+
+
+def invalidate_patient(patient_id):
+    """A patient row changed or was deleted (with its predictions)"""
+    cache.invalidate('patient', patient_id)
+    invalidate_predictions(patient_id)
+
+
+def invalidate_predictions(patient_id):
+    """A prediction was added to (or removed from) a patient's history"""
+    cache.invalidate('predictions', patient_id)
+    cache.invalidate('latest_prediction', patient_id)
@@ -1,38 +1,140 @@
+import logging
+
+from app import metrics
+from app.cache import TTLCache
 from app.database import Database
+from app.storage import backend
+from app.write_behind import journal
+from app.models.cache import cache, invalidate_predictions
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Aggregates are shared by every user and tolerate being STATS_CACHE_TTL seconds old
+_stats_cache = TTLCache(Config.STATS_CACHE_SIZE, Config.STATS_CACHE_TTL)
 
 class HeartRisk:
     """Heart Risk Prediction model"""
     
     @staticmethod
     def create(patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction, prediction_date=None):
-        """Create heart risk prediction record"""
+        """Create heart risk prediction record.
+
+        With PREDICTION_WRITE_BEHIND the record goes to the journal and reaches
+        the database in the background; raises Overloaded when the journal's
+        backlog is full.
+        """
+        record = None
+        if journal.enabled:
+            record = {
+                'patient_id': patient_id, 'age': age, 'sex': sex, 'cp': cp, 'trestbps': trestbps, 'chol': chol,
+                'fbs': fbs, 'restecg': restecg, 'thalach': thalach, 'exang': exang, 'oldpeak': oldpeak,
+                'slope': slope, 'ca': ca, 'thal': thal, 'prediction': prediction,
+            }
+            try:
+                journal.append(record)
+                # Drop cached history now; the flush invalidates again once the row is in the DB
+                invalidate_predictions(patient_id)
+                return True
+            except OSError:
+                # Disk full, fsync error...: write through, under the journal's key
+                # in case the record made it to the file anyway
+                logger.exception('Prediction journal unavailable, writing prediction for patient %s directly', patient_id)
+                metrics.errors.inc('HeartRisk.create.journal')
         try:
-            Database.add_prediction(patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction)
+            if record is not None:
+                Database.add_predictions_bulk([record], skip_existing=True)
+            else:
+                Database.add_prediction(patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction)
+            invalidate_predictions(patient_id)
             return True
-        except Exception as e:
-            print(f"Error creating heart risk prediction: {e}")
+        except Exception:
+            logger.exception('Error creating heart risk prediction for patient %s', patient_id)
+            metrics.errors.inc('HeartRisk.create')
             return False
     
+    @staticmethod
+    def create_many(records):
+        """Create many prediction records (dicts) in one transaction.
+
+        Returns one entry per record: None if saved, else an error message.
+        When the bulk insert is refused because of some rows (e.g. a patient
+        deleted meanwhile), the records are retried one by one so the valid
+        ones are still saved.
+        """
+        try:
+            Database.add_predictions_bulk(records)
+            errors = [None] * len(records)
+        except backend.data_errors:
+            logger.warning('Bulk insert of %d predictions refused, retrying row by row', len(records))
+            errors = []
+            for record in records:
+                try:
+                    Database.add_predictions_bulk([record])
+                    errors.append(None)
+                except backend.data_errors as e:
+                    errors.append(f'Could not save prediction: {e}')
+                except Exception:
+                    logger.exception('Error creating heart risk prediction for patient %s', record['patient_id'])
+                    metrics.errors.inc('HeartRisk.create_many')
+                    errors.append('Failed to save prediction')
+        except Exception:
+            logger.exception('Error creating %d heart risk predictions', len(records))
+            metrics.errors.inc('HeartRisk.create_many')
+            return ['Failed to save prediction'] * len(records)
+        for patient_id in {r['patient_id'] for r, error in zip(records, errors) if error is None}:
+            invalidate_predictions(patient_id)
+        return errors
+    
     @staticmethod
     def get_by_patient(patient_id):
         """Get all predictions for a patient"""
         return Database.get_predictions_by_patient(patient_id)
     
+    @staticmethod
+    def get_by_patient_cached(patient_id, role=''):
+        """(predictions, etag) through the read-through cache"""
+        return cache.get_or_load('predictions', patient_id, role,
+                                 lambda: Database.get_predictions_by_patient(patient_id))
+    
     @staticmethod
     def get_latest_by_patient(patient_id):
         """Get latest prediction for a patient"""
         return Database.get_latest_prediction(patient_id)
     
+    @staticmethod
+    def get_latest_by_patient_cached(patient_id, role=''):
+        """(latest prediction, etag) through the read-through cache; (None, None) if none"""
+        return cache.get_or_load('latest_prediction', patient_id, role,
+                                 lambda: Database.get_latest_prediction(patient_id))
+    
     @staticmethod
     def get_all():
         """Get all predictions"""
         return Database.get_all_predictions()
     
+    @staticmethod
+    def iter_all():
+        """Stream all predictions row by row"""
+        return Database.iter_predictions()
+    
+    @staticmethod
+    def stats(group=None, width=None, **filters):
+        """Aggregated prediction stats (see Database.prediction_stats), cached"""
+        if _stats_cache.default_ttl <= 0:
+            return Database.prediction_stats(group, width, **filters)
+        key = (group, width, tuple(sorted(filters.items())))
+        result = _stats_cache.get(key)
+        if result is None:
+            result = Database.prediction_stats(group, width, **filters)
+            _stats_cache.set(key, result)
+        return result
+    
+    @staticmethod
+    def stats_cache_stats():
+        return _stats_cache.stats()
+    
     @staticmethod
     def get_by_id(prediction_id):
         """Get prediction by ID"""
-        predictions = Database.get_all_predictions()
-        for pred in predictions:
-            if pred['prediction_id'] == prediction_id:
-                return pred
-        return None
+        return Database.get_prediction_by_id(prediction_id)
@@ -1,4 +1,11 @@
+import logging
+
+from app import metrics
+from app.analytics import store as analytics_store
 from app.database import Database
+from app.models.cache import cache, invalidate_patient
+
+logger = logging.getLogger(__name__)
 
 class Patient:
     """Patient model"""
@@ -9,8 +16,9 @@ class Patient:
         try:
             Database.add_patient(citizen_id, full_name, gender, date_of_birth, phone, address, province, condition, user_id)
             return True
-        except Exception as e:
-            print(f"Error creating patient: {e}")
+        except Exception:
+            logger.exception('Error creating patient')
+            metrics.errors.inc('Patient.create')
             return False
     
     @staticmethod
@@ -18,17 +26,47 @@ class Patient:
         """Get patient by ID"""
         return Database.get_patient_by_id(patient_id)
     
+    @staticmethod
+    def get_by_id_cached(patient_id, role=''):
+        """(patient, etag) through the read-through cache; (None, None) if missing"""
+        return cache.get_or_load('patient', patient_id, role, lambda: Database.get_patient_by_id(patient_id))
+    
+    @staticmethod
+    def existing_ids(patient_ids):
+        """The subset of ``patient_ids`` that exist"""
+        return Database.existing_patient_ids(patient_ids)
+    
     @staticmethod
     def get_all(user_id=None):
         """Get all patients or by user"""
         return Database.get_all_patients(user_id)
     
+    @staticmethod
+    def get_page(user_id=None, limit=10, offset=0, after_id=None, **filters):
+        """Get one page of patients (offset or keyset paging)"""
+        return Database.list_patients(user_id, limit=limit, offset=offset, after_id=after_id, **filters)
+    
+    @staticmethod
+    def count(user_id=None, estimate=False, **filters):
+        """Count patients matching the filters"""
+        return Database.count_patients(user_id, estimate=estimate, **filters)
+    
+    @staticmethod
+    def iter_all(user_id=None, **filters):
+        """Stream patients row by row"""
+        return Database.iter_patients(user_id, **filters)
+    
     @staticmethod
     def update(patient_id, **kwargs):
         """Update patient"""
-        return Database.update_patient(patient_id, **kwargs)
+        updated = Database.update_patient(patient_id, **kwargs)
+        cache.invalidate('patient', patient_id)
+        return updated
     
     @staticmethod
     def delete(patient_id):
-        """Delete patient"""
-        return Database.delete_patient(patient_id)
+        """Delete patient (its predictions go with it: ON DELETE CASCADE)"""
+        deleted = Database.delete_patient(patient_id)
+        invalidate_patient(patient_id)
+        analytics_store.mark_stale()
+        return deleted
@@ -1,5 +1,15 @@
+import logging
+
+from app import metrics
+from app.cache import TTLCache
 from app.database import Database
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.hashing import hasher
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# user_id -> user record without password_hash
+_user_cache = TTLCache(Config.AUTH_USER_CACHE_SIZE, Config.AUTH_USER_CACHE_TTL)
 
 class User:
     """User model"""
@@ -7,13 +17,15 @@ class User:
     @staticmethod
     def create(email, password, full_name, role='doctor', phone=None):
         """Create new user"""
-        password_hash = generate_password_hash(password)
+        # Runs on the hashing process pool; raises Overloaded when it is saturated
+        password_hash = hasher.hash(password)
         
         try:
             Database.add_user(email, password_hash, full_name, role, phone)
             return True
-        except Exception as e:
-            print(f"Error creating user: {e}")
+        except Exception:
+            logger.exception('Error creating user')
+            metrics.errors.inc('User.create')
             return False
     
     @staticmethod
@@ -23,19 +35,58 @@ class User:
     
     @staticmethod
     def get_by_id(user_id):
-        """Get user by ID"""
+        """Get user by ID (cached per process for AUTH_USER_CACHE_TTL seconds)"""
+        cached = User.get_cached(user_id)
+        if cached is not None:
+            return cached
         user = Database.get_user_by_id(user_id)
         if user:
-            # Remove password hash from response
-            user_copy = user.copy()
-            user_copy.pop('password_hash', None)
-            return user_copy
+            return User.remember(user)
         return None
+
+    @staticmethod
+    def get_cached(user_id):
+        """Cached user record, or None"""
+        cached = _user_cache.get(user_id)
+        return cached.copy() if cached is not None else None
+
+    @staticmethod
+    def remember(user):
+        """Cache a user row read from the DB; returns it without the password hash"""
+        # Remove password hash from response
+        user_copy = user.copy()
+        user_copy.pop('password_hash', None)
+        _user_cache.set(user_copy['user_id'], user_copy)
+        return user_copy.copy()
+
+    @staticmethod
+    def invalidate(user_id):
+        """Drop the cached record; call after any write to the user row"""
+        _user_cache.pop(user_id)
+
+    @staticmethod
+    def cache_stats():
+        return _user_cache.stats()
     
     @staticmethod
     def verify_password(password, password_hash):
         """Verify password"""
-        return check_password_hash(password_hash, password)
+        return hasher.verify(password, password_hash)
+
+    @staticmethod
+    def rehash_password_if_needed(user, password):
+        """Re-hash with the current PASSWORD_HASH_METHOD after a successful login"""
+        if not hasher.needs_rehash(user['password_hash']):
+            return False
+        try:
+            Database.update_user_password(user['user_id'], hasher.hash(password))
+            User.invalidate(user['user_id'])
+            hasher.record_rehash()
+            return True
+        except Exception:
+            logger.exception('Error rehashing password of user %s', user['user_id'])
+            metrics.errors.inc('User.rehash_password')
+            return False
     
     @staticmethod
     def get_all():
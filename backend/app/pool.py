@@ -0,0 +1,340 @@
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available before the checkout timeout"""
+
+
+@contextmanager
+def _transaction(pool):
+    """Context manager yielding a pooled connection.
+
+    The transaction is committed when the block exits normally and rolled
+    back otherwise, so a connection never goes back to the pool with an
+    open transaction (and a stale REPEATABLE READ snapshot).
+    """
+    conn = pool.acquire()
+    ok = False
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+        ok = True
+    finally:
+        if not ok:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+        pool.release(conn, discard=broken)
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB connections.
+
+    Connections are created lazily by ``factory`` up to ``max_size``. Idle
+    connections are reused LIFO, pinged on checkout when they have been idle
+    longer than ``ping_interval``, evicted after ``idle_timeout`` (never below
+    ``min_size``) and recycled once older than ``max_lifetime``.
+    """
+
+    def __init__(self, factory, min_size=1, max_size=10, timeout=10.0,
+                 idle_timeout=300.0, max_lifetime=3600.0, ping_interval=30.0):
+        if max_size < 1:
+            raise ValueError('max_size must be >= 1')
+        self.factory = factory
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition(threading.Lock())
+        # Idle entries: (conn, created_at, last_used); newest on the right
+        self._idle = deque()
+        # id(conn) -> (created_at, generation) for checked-out connections
+        self._in_use = {}
+        # Bumped by close_all(); connections checked out before it close on release
+        self._generation = 0
+        self._size = 0
+        self._waiting = 0
+        self._prefilled = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._closed = 0
+        self._failed_pings = 0
+
+    # ------------------------------------------------------------------ #
+    # Checkout / checkin
+    # ------------------------------------------------------------------ #
+
+    def acquire(self):
+        """Check out a healthy connection, waiting up to ``timeout`` seconds"""
+        if not self._prefilled:
+            self._prefill()
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        wait_time = 0.0
+
+        while True:
+            entry = None
+            with self._cond:
+                evicted = self._evict_idle_locked()
+                while True:
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        # Reserve a slot; the connect happens outside the lock
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f'Timed out after {self.timeout}s waiting for a DB connection '
+                            f'({self._size}/{self.max_size} in use)'
+                        )
+                    self._waiting += 1
+                    t0 = time.monotonic()
+                    self._cond.wait(remaining)
+                    wait_time += time.monotonic() - t0
+                    self._waiting -= 1
+            for stale in evicted:
+                self._close(stale)
+
+            if entry is None:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+                with self._cond:
+                    self._created += 1
+            else:
+                conn, created_at, last_used = entry
+                now = time.monotonic()
+                if self._expired(created_at, now):
+                    self._discard(conn)
+                    continue
+                if now - last_used >= self.ping_interval and not self._ping(conn):
+                    self._discard(conn)
+                    continue
+
+            elapsed = time.monotonic() - start
+            with self._cond:
+                self._in_use[id(conn)] = (created_at, self._generation)
+                self._checkouts += 1
+                if wait_time:
+                    self._waits += 1
+                    self._wait_time_total += wait_time
+                    self._wait_time_max = max(self._wait_time_max, wait_time)
+                self._checkout_time_total += elapsed
+                self._checkout_time_max = max(self._checkout_time_max, elapsed)
+            return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool (or close it when ``discard``)"""
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+            current = self._generation
+        if entry is None:
+            # Not ours (or already released) - just make sure it is closed
+            self._close(conn)
+            return
+        created_at, generation = entry
+        if discard or generation != current or self._expired(created_at, time.monotonic()):
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    connection = _transaction
+
+    # ------------------------------------------------------------------ #
+    # Maintenance
+    # ------------------------------------------------------------------ #
+
+    def close_all(self):
+        """Close every idle connection; checked-out ones close on release"""
+        with self._cond:
+            self._generation += 1
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._prefilled = False
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'size': self._size,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'closed': self._closed,
+                'failed_pings': self._failed_pings,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'checkout_latency_avg_ms': round(self._checkout_time_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                'checkout_latency_max_ms': round(self._checkout_time_max * 1000, 3),
+            }
+
+    def _prefill(self):
+        with self._cond:
+            if self._prefilled:
+                return
+            self._prefilled = True
+            needed = self.min_size - self._size
+            self._size += max(0, needed)
+        for _ in range(max(0, needed)):
+            try:
+                conn = self.factory()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                continue
+            with self._cond:
+                self._created += 1
+                now = time.monotonic()
+                self._idle.appendleft((conn, now, now))
+                self._cond.notify()
+
+    def _evict_idle_locked(self):
+        # Oldest idle entries sit on the left; the caller closes them unlocked
+        evicted = []
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size:
+            conn, created_at, last_used = self._idle[0]
+            if now - last_used < self.idle_timeout and not self._expired(created_at, now):
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._closed += 1
+            evicted.append(conn)
+        return evicted
+
+    def _expired(self, created_at, now):
+        return self.max_lifetime and now - created_at >= self.max_lifetime
+
+    def _ping(self, conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._cond:
+                self._failed_pings += 1
+            return False
+
+    def _discard(self, conn):
+        self._close(conn)
+        with self._cond:
+            self._size -= 1
+            self._closed += 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class ThreadLocalPool:
+    """Connections kept per thread, for embedded databases (SQLite).
+
+    Opening is cheap but the per-connection page cache and prepared
+    statements are worth keeping, and there is no server-side limit to
+    protect. Each thread reuses its own connection; a query made while that
+    one is checked out (inside a stream) gets a second one, kept as well.
+    Connections of finished threads are closed when garbage collected.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = weakref.WeakSet()
+        self._generation = 0
+        self._checkouts = 0
+        self._created = 0
+        self._closed = 0
+
+    def _idle(self):
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            # First use in this thread, or close_all() ran since
+            local.idle = []
+            local.generation = self._generation
+        return local.idle
+
+    def acquire(self):
+        idle = self._idle()
+        if idle:
+            conn = idle.pop()
+        else:
+            conn = self.factory()
+            with self._lock:
+                self._open.add(conn)
+                self._created += 1
+        with self._lock:
+            self._checkouts += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        if not discard and conn in self._open:
+            self._idle().append(conn)
+            return
+        with self._lock:
+            self._open.discard(conn)
+            self._closed += 1
+        ConnectionPool._close(conn)
+
+    connection = _transaction
+
+    def close_all(self):
+        """Close every thread's connections; threads reconnect on their next checkout"""
+        with self._lock:
+            self._generation += 1
+            conns = list(self._open)
+            self._open = weakref.WeakSet()
+            self._closed += len(conns)
+        for conn in conns:
+            ConnectionPool._close(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._open),
+                'checkouts': self._checkouts,
+                'created': self._created,
+                'closed': self._closed,
+            }
@@ -0,0 +1,224 @@
+"""Daily and monthly rollups of ``predictions``.
+
+One row per (period, province, age band, sex, prediction) holds the
+prediction count plus per-vital sums and non-null counts, so counts, rates
+and means over years of history come from a few hundred rows. The tables
+are kept current in the transaction that writes the predictions (or moves
+or deletes a patient); ``flask rebuild-rollups`` recomputes them, e.g.
+after a bulk import that bypassed the app.
+
+NULLs are stored as sentinels because they are part of the primary key:
+'' for province, -1 for age band, sex and prediction.
+"""
+import math
+from collections import defaultdict
+
+from app.storage import backend
+
+VITALS = ('age', 'trestbps', 'chol', 'thalach', 'oldpeak')
+AGE_BAND = 10
+
+# name -> (table, period expression over predictions ``pr``)
+TABLES = {
+    'daily': ('prediction_rollup_daily', backend.truncate('day', 'pr.prediction_date')),
+    'monthly': ('prediction_rollup_monthly', backend.truncate('month', 'pr.prediction_date')),
+}
+
+KEY_COLUMNS = ('period', 'province', 'age_band', 'sex', 'prediction')
+VALUE_COLUMNS = ('n',) + tuple(col for name in VITALS for col in (f'sum_{name}', f'n_{name}'))
+
+
+def create_table_sql(table):
+    values = ',\n        '.join(
+        f'{col} DOUBLE NOT NULL DEFAULT 0' if col.startswith('sum_') else f'{col} INT NOT NULL DEFAULT 0'
+        for col in VALUE_COLUMNS)
+    return f'''CREATE TABLE IF NOT EXISTS {table} (
+        period DATE NOT NULL,
+        province VARCHAR(100) NOT NULL DEFAULT '',
+        age_band SMALLINT NOT NULL,
+        sex TINYINT NOT NULL,
+        prediction TINYINT NOT NULL,
+        {values},
+        PRIMARY KEY (period, province, age_band, sex, prediction),
+        INDEX idx_{table}_province (province, period)
+    )'''
+
+
+def _accumulate():
+    sets = ', '.join(f'{c} = {c} + {backend.excluded(c)}' for c in VALUE_COLUMNS)
+    return f'{backend.on_conflict_update(KEY_COLUMNS)} {sets}'
+
+
+def _upsert_sql(table):
+    cols = KEY_COLUMNS + VALUE_COLUMNS
+    marks = ', '.join(['%s'] * len(cols))
+    return f'INSERT INTO {table} ({", ".join(cols)}) VALUES ({marks}) {_accumulate()}'
+
+
+def _aggregate_sql(table, period, where):
+    """INSERT ... SELECT adding ``%s`` (the sign: 1 or -1) times the matching predictions"""
+    values = ['%s * COUNT(*)']
+    for name in VITALS:
+        values += [f'%s * COALESCE(SUM(pr.{name}), 0)', f'%s * COUNT(pr.{name})']
+    return f'''INSERT INTO {table} ({", ".join(KEY_COLUMNS + VALUE_COLUMNS)})
+               SELECT {period} AS r_period, COALESCE(p.province, '') AS r_province,
+                      COALESCE(FLOOR(pr.age / {AGE_BAND}) * {AGE_BAND}, -1) AS r_age_band,
+                      COALESCE(pr.sex, -1) AS r_sex, COALESCE(pr.prediction, -1) AS r_prediction,
+                      {", ".join(values)}
+               FROM predictions pr LEFT JOIN patients p ON p.patient_id = pr.patient_id
+               WHERE pr.prediction_date IS NOT NULL{where}
+               GROUP BY r_period, r_province, r_age_band, r_sex, r_prediction
+               {_accumulate()}'''
+
+
+UPSERT_SQL = {name: _upsert_sql(table) for name, (table, _) in TABLES.items()}
+PATIENT_SQL = {name: _aggregate_sql(table, period, ' AND pr.patient_id = %s') for name, (table, period) in TABLES.items()}
+REBUILD_SQL = {name: _aggregate_sql(table, period, '') for name, (table, period) in TABLES.items()}
+PRUNE_SQL = {name: f'DELETE FROM {table} WHERE n <= 0' for name, (table, _) in TABLES.items()}
+SIGN_PARAMS = 1 + 2 * len(VITALS)
+
+
+def rows_for(records, provinces):
+    """Upsert parameters per table for new prediction dicts, in primary key order.
+
+    ``provinces`` maps patient_id -> province. Rows are sorted so concurrent
+    transactions lock rollup rows in the same order.
+    """
+    result = {}
+    for name in TABLES:
+        groups = defaultdict(lambda: [0] * len(VALUE_COLUMNS))
+        for r in records:
+            date = r.get('prediction_date')
+            if date is None:
+                continue
+            day = date.date() if hasattr(date, 'date') else date
+            period = day if name == 'daily' else day.replace(day=1)
+            # Records carry the age as stored (stored_age), so this matches rebuild()
+            age = r.get('age')
+            key = (
+                period,
+                provinces.get(r['patient_id']) or '',
+                int(age) // AGE_BAND * AGE_BAND if age is not None else -1,
+                _sentinel(r.get('sex')),
+                _sentinel(r.get('prediction')),
+            )
+            values = groups[key]
+            values[0] += 1
+            for i, vital in enumerate(VITALS):
+                value = age if vital == 'age' else r.get(vital)
+                if value is not None:
+                    values[1 + 2 * i] += float(value)
+                    values[2 + 2 * i] += 1
+        result[name] = [key + tuple(values) for key, values in sorted(groups.items())]
+    return result
+
+
+def stored_age(age):
+    """``age`` as written to the INT column: rounded half up like MySQL.
+
+    SQLite would keep 54.5 as is, so the writers round it themselves and
+    the incremental rollups, rebuild() and the raw queries all see the
+    same value.
+    """
+    return math.floor(float(age) + 0.5) if age is not None else None
+
+
+def _sentinel(value):
+    return int(value) if value is not None else -1
+
+
+def provinces_sql(patient_ids):
+    return f'SELECT patient_id, province FROM patients WHERE patient_id IN ({", ".join(["%s"] * len(patient_ids))})'
+
+
+def apply_predictions(cur, records):
+    """Add new predictions to the rollups, on the cursor of the inserting transaction"""
+    patient_ids = sorted({r['patient_id'] for r in records})
+    if not patient_ids:
+        return
+    cur.execute(provinces_sql(patient_ids), patient_ids)
+    provinces = {row['patient_id']: row['province'] for row in cur.fetchall()}
+    for name, rows in rows_for(records, provinces).items():
+        if rows:
+            cur.executemany(UPSERT_SQL[name], rows)
+
+
+def apply_patient(cur, patient_id, sign):
+    """Add (1) or remove (-1) every prediction of one patient, e.g. around a delete or province change"""
+    for name in TABLES:
+        cur.execute(PATIENT_SQL[name], (sign,) * SIGN_PARAMS + (patient_id,))
+        if sign < 0:
+            cur.execute(PRUNE_SQL[name])
+
+
+def rebuild(cur):
+    """Recompute both tables from ``predictions``; returns rows per table"""
+    counts = {}
+    for name, (table, _) in TABLES.items():
+        cur.execute(f'DELETE FROM {table}')
+        cur.execute(REBUILD_SQL[name], (1,) * SIGN_PARAMS)
+        cur.execute(f'SELECT COUNT(*) AS n FROM {table}')
+        counts[table] = int(cur.fetchone()['n'])
+    return counts
+
+
+# -------------------------------------------------------------------- #
+# Reading: answer prediction_stats from a rollup when the query allows it
+# -------------------------------------------------------------------- #
+
+_GROUPS = {
+    'province': "NULLIF(r.province, '')",
+    'day': 'r.period',
+    'week': backend.truncate('week', 'r.period'),
+    'month': backend.truncate('month', 'r.period'),
+    'sex': 'NULLIF(r.sex, -1)',
+    'prediction': 'NULLIF(r.prediction, -1)',
+}
+
+
+def _whole_day(value):
+    return value is None or (value.hour, value.minute, value.second, value.microsecond) == (0, 0, 0, 0)
+
+
+def stats_query(group=None, width=None, start=None, end=None, province=None, sex=None):
+    """(sql, params) over the smallest rollup that answers the query exactly, or None"""
+    if not (_whole_day(start) and _whole_day(end)):
+        return None
+    params = []
+    if group is None:
+        expr = None
+    elif group in _GROUPS:
+        expr = _GROUPS[group]
+    elif group == 'age':
+        width = width or AGE_BAND
+        if width % AGE_BAND:
+            return None
+        expr = 'FLOOR(NULLIF(r.age_band, -1) / %s) * %s'
+        params += [width, width]
+    else:
+        return None
+
+    monthly = group not in ('day', 'week') and all(v is None or v.day == 1 for v in (start, end))
+    table = TABLES['monthly' if monthly else 'daily'][0]
+
+    clauses = []
+    if start is not None:
+        clauses.append('r.period >= %s')
+        params.append(start.date())
+    if end is not None:
+        clauses.append('r.period < %s')
+        params.append(end.date())
+    if province:
+        clauses.append('r.province = %s')
+        params.append(province)
+    if sex is not None:
+        clauses.append('r.sex = %s')
+        params.append(sex)
+    where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+
+    select = ['SUM(r.n) AS count', 'SUM(CASE WHEN r.prediction = 1 THEN r.n ELSE 0 END) AS high_risk']
+    select += [f'SUM(r.sum_{name}) / NULLIF(SUM(r.n_{name}), 0) AS avg_{name}' for name in VITALS]
+    if expr is None:
+        return f'SELECT {", ".join(select)} FROM {table} r{where}', params
+    return (f'SELECT {expr} AS bucket, {", ".join(select)} FROM {table} r{where}'
+            ' GROUP BY bucket HAVING SUM(r.n) > 0 ORDER BY bucket'), params
@@ -1,4 +1,5 @@
 from flask import Blueprint, request, jsonify
+from app.batching import Overloaded
 from app.models.user import User
 from app.utils import AuthUtil
 
@@ -33,6 +34,8 @@ def register():
         else:
             return jsonify({'error': 'Failed to create user'}), 500
     
+    except Overloaded as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -54,6 +57,9 @@ def login():
         if not User.verify_password(data['password'], user['password_hash']):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Hash parameters changed since this password was stored
+        User.rehash_password_if_needed(user, data['password'])
+        
         # Generate token
         token = AuthUtil.generate_token(user['user_id'], user['email'], user['role'])
         
@@ -67,6 +73,26 @@ def login():
             }
         }), 200
     
+    except Overloaded as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    """Revoke the current token"""
+    try:
+        token = AuthUtil.get_token_from_request()
+        if not token:
+            return jsonify({'error': 'Missing token'}), 401
+        
+        payload = AuthUtil.verify_token(token)
+        if not payload:
+            return jsonify({'error': 'Invalid or expired token'}), 401
+        
+        AuthUtil.revoke_token(token, payload)
+        return jsonify({'message': 'Logged out'}), 200
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
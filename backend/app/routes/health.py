@@ -1,4 +1,15 @@
-from flask import Blueprint, jsonify
+import os
+from flask import Blueprint, jsonify, current_app, request
+from app import metrics
+from app.analytics import store as analytics_store
+from app.database import Database
+from app.hashing import hasher
+from app.inference import engine
+from app.write_behind import journal
+from app.models.cache import cache
+from app.models.heart_risk import HeartRisk
+from app.models.user import User
+from app.utils import AuthUtil, require_admin
 
 health_bp = Blueprint('health', __name__, url_prefix='/api')
 
@@ -7,6 +18,38 @@ def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'message': 'API is running'}), 200
 
+@health_bp.route('/health/ready', methods=['GET'])
+def readiness():
+    """Readiness of the worker process that served this request (503 while warming up)"""
+    # Set by app/server.py in each pre-forked worker; the dev server is always ready
+    state = current_app.extensions.get('worker', {'pid': os.getpid(), 'ready': True})
+    return jsonify(state), 200 if state['ready'] else 503
+
+@health_bp.route('/health/stats', methods=['GET'])
+@require_admin
+def health_stats():
+    """Runtime stats of the backend subsystems"""
+    try:
+        return jsonify({
+            'db_pool': Database.pool_stats(),
+            'inference_batcher': engine.batcher_stats(),
+            'auth': dict(AuthUtil.cache_stats(), user_cache=User.cache_stats()),
+            'password_hashing': hasher.stats(),
+            'model_cache': cache.stats(),
+            'analytics': analytics_store.stats(),
+            'stats_cache': HeartRisk.stats_cache_stats(),
+            'prediction_journal': journal.stats()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@health_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, DB, inference and JSON metrics of this process (Prometheus text format)"""
+    if not metrics.scrape_allowed(current_app.config, request.headers.get('Authorization')):
+        return jsonify({'error': 'Not found'}), 404
+    return current_app.response_class(metrics.registry.render(), content_type=metrics.CONTENT_TYPE), 200
+
 @health_bp.route('/', methods=['GET'])
 def root():
     """Root endpoint"""
@@ -1,38 +1,61 @@
-from flask import Blueprint, request, jsonify
+import json
+from datetime import datetime
+import numpy as np
+from flask import Blueprint, request, jsonify, current_app
+from app.analytics import store as analytics_store, CATEGORICAL
 from app.models.heart_risk import HeartRisk
-from app.utils import require_auth
-import random
+from app.models.patient import Patient
+from app.utils import require_auth, require_admin, json_with_etag
+from app.inference import engine, FEATURES
+from app.batching import Overloaded
+from app.streaming import stream_rows, wants_gzip, FORMATS
 
 heart_risk_bp = Blueprint('heart_risk', __name__, url_prefix='/api/heart-risk')
 
+REQUIRED_FIELDS = ['patient_id', 'age', 'sex']
 
-def predict_risk(age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal):
-    """Simple heart risk prediction logic"""
-    risk_score = 0
+# Giá trị mặc định cho các feature ML không được gửi lên
+FEATURE_DEFAULTS = {
+    'cp': 0,
+    'trestbps': 120,
+    'chol': 200,
+    'fbs': 0,
+    'restecg': 0,
+    'thalach': 75,
+    'exang': 0,
+    'oldpeak': 0,
+    'slope': 0,
+    'ca': 0,
+    'thal': 0,
+}
 
-    if age > 55:
-        risk_score += 3
-    elif age > 45:
-        risk_score += 2
-    elif age > 35:
-        risk_score += 1
 
-    if chol > 240:
-        risk_score += 2
-    elif chol > 200:
-        risk_score += 1
+def _features_from(data):
+    """The 13 model features of a request record, with defaults filled in"""
+    features = {'age': data['age'], 'sex': data['sex']}
+    for name, default in FEATURE_DEFAULTS.items():
+        features[name] = data.get(name, default)
+    return features
 
-    if trestbps > 140:
-        risk_score += 2
-    elif trestbps > 120:
-        risk_score += 1
 
-    if thalach < 60 or thalach > 100:
-        risk_score += 1
-
-    risk_score += random.randint(0, 2)
-
-    return 1 if risk_score >= 5 else 0
+def _parse_batch_body():
+    """Records of a batch request: a JSON list, {"records": [...]} or NDJSON lines"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonlines'):
+        records = []
+        for line in request.get_data(as_text=True).splitlines():
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except ValueError as e:
+                    records.append(e)
+        return records
+    data = request.get_json()
+    if isinstance(data, dict):
+        data = data.get('records')
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON list of records')
+    return data
 
 
 @heart_risk_bp.route('/predict', methods=['POST'])
@@ -43,62 +66,32 @@ def predict_heart_risk():
         data = request.get_json() or {}
 
         # 🔹 Validation tối thiểu (KHÔNG đổi cấu trúc)
-        required_fields = ['patient_id', 'age', 'sex']
-        if not all(field in data for field in required_fields):
+        if not all(field in data for field in REQUIRED_FIELDS):
             return jsonify({'error': 'Missing required fields'}), 400
 
         # 🔹 BỔ SUNG DEFAULT CHO CÁC FEATURE ML
-        cp = data.get('cp', 0)
-        trestbps = data.get('trestbps', 120)
-        chol = data.get('chol', 200)
-        fbs = data.get('fbs', 0)
-        restecg = data.get('restecg', 0)
-        thalach = data.get('thalach', 75)
-        exang = data.get('exang', 0)
-        oldpeak = data.get('oldpeak', 0)
-        slope = data.get('slope', 0)
-        ca = data.get('ca', 0)
-        thal = data.get('thal', 0)
-
-        # 🔹 Make prediction (KHÔNG đổi hàm)
-        prediction = predict_risk(
-            data['age'],
-            data['sex'],
-            cp,
-            trestbps,
-            chol,
-            fbs,
-            restecg,
-            thalach,
-            exang,
-            oldpeak,
-            slope,
-            ca,
-            thal
-        )
+        features = _features_from(data)
+
+        # 🔹 Make prediction (model đã nạp sẵn khi khởi động app)
+        try:
+            prediction, probability = engine.predict(features)
+        except Overloaded as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
 
         # 🔹 Save prediction to database (KHÔNG đổi model)
-        success = HeartRisk.create(
-            patient_id=data['patient_id'],
-            age=data['age'],
-            sex=data['sex'],
-            cp=cp,
-            trestbps=trestbps,
-            chol=chol,
-            fbs=fbs,
-            restecg=restecg,
-            thalach=thalach,
-            exang=exang,
-            oldpeak=oldpeak,
-            slope=slope,
-            ca=ca,
-            thal=thal,
-            prediction=prediction
-        )
+        try:
+            success = HeartRisk.create(
+                patient_id=data['patient_id'],
+                prediction=prediction,
+                **features
+            )
+        except Overloaded as e:
+            return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
 
         if success:
             return jsonify({
                 'prediction': int(prediction),
+                'probability': round(probability, 4),
                 'risk_level': 'High' if prediction == 1 else 'Low',
                 'message': 'Prediction saved successfully'
             }), 200
@@ -109,13 +102,94 @@ def predict_heart_risk():
         return jsonify({'error': str(e)}), 500
 
 
+@heart_risk_bp.route('/predict/batch', methods=['POST'])
+@require_auth
+def predict_heart_risk_batch():
+    """Score many records in one model pass and save them in one transaction"""
+    try:
+        try:
+            records = _parse_batch_body()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        max_rows = current_app.config.get('BATCH_MAX_ROWS', 10000)
+        if len(records) > max_rows:
+            return jsonify({'error': f'Batch too large (max {max_rows} records)'}), 413
+
+        errors = []
+        valid = []
+        rows = []
+        for index, data in enumerate(records):
+            if isinstance(data, Exception):
+                errors.append({'index': index, 'error': f'Invalid JSON: {data}'})
+                continue
+            if not isinstance(data, dict) or not all(field in data for field in REQUIRED_FIELDS):
+                errors.append({'index': index, 'error': 'Missing required fields'})
+                continue
+            features = _features_from(data)
+            try:
+                row = [float(features[name]) for name in FEATURES]
+            except (TypeError, ValueError):
+                errors.append({'index': index, 'error': 'Non-numeric feature value'})
+                continue
+            try:
+                patient_id = int(data['patient_id'])
+            except (TypeError, ValueError):
+                errors.append({'index': index, 'error': 'Invalid patient_id'})
+                continue
+            valid.append((index, patient_id, features))
+            rows.append(row)
+
+        # Unknown patients are reported per row instead of failing the whole insert
+        if valid:
+            existing = Patient.existing_ids([patient_id for _, patient_id, _ in valid])
+            for index, patient_id, _ in valid:
+                if patient_id not in existing:
+                    errors.append({'index': index, 'error': f'Patient {patient_id} not found'})
+            kept = [i for i, (_, patient_id, _) in enumerate(valid) if patient_id in existing]
+            valid = [valid[i] for i in kept]
+            rows = [rows[i] for i in kept]
+
+        results = []
+        if rows:
+            probabilities = engine.predict_proba(np.array(rows, dtype=np.float64))
+            predictions = (probabilities >= engine.threshold).astype(int)
+
+            save_errors = HeartRisk.create_many([
+                dict(features, patient_id=patient_id, prediction=int(prediction))
+                for (_, patient_id, features), prediction in zip(valid, predictions)
+            ])
+
+            for (index, patient_id, _), prediction, probability, error in zip(valid, predictions, probabilities, save_errors):
+                if error is not None:
+                    errors.append({'index': index, 'error': error})
+                    continue
+                results.append({
+                    'index': index,
+                    'patient_id': patient_id,
+                    'prediction': int(prediction),
+                    'probability': round(float(probability), 4),
+                    'risk_level': 'High' if prediction == 1 else 'Low'
+                })
+
+        errors.sort(key=lambda e: e['index'])
+        return jsonify({
+            'results': results,
+            'errors': errors,
+            'saved': len(results)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @heart_risk_bp.route('/patient/<int:patient_id>', methods=['GET'])
 @require_auth
 def get_patient_predictions(patient_id):
-    """Get all predictions for a patient"""
+    """Get all predictions for a patient (cached; honours If-None-Match)"""
     try:
-        predictions = HeartRisk.get_by_patient(patient_id)
-        return jsonify(predictions), 200
+        predictions, etag = HeartRisk.get_by_patient_cached(patient_id, request.user['role'])
+        return json_with_etag(predictions, etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -123,12 +197,12 @@ def get_patient_predictions(patient_id):
 @heart_risk_bp.route('/patient/<int:patient_id>/latest', methods=['GET'])
 @require_auth
 def get_latest_prediction(patient_id):
-    """Get latest prediction for a patient"""
+    """Get latest prediction for a patient (cached; honours If-None-Match)"""
     try:
-        prediction = HeartRisk.get_latest_by_patient(patient_id)
+        prediction, etag = HeartRisk.get_latest_by_patient_cached(patient_id, request.user['role'])
         if not prediction:
             return jsonify({'error': 'No predictions found'}), 404
-        return jsonify(prediction), 200
+        return json_with_etag(prediction, etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -142,3 +216,112 @@ def get_all_predictions():
         return jsonify(predictions), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+def _stats_filters(args):
+    """from / to (ISO dates), province and sex query parameters of the stats endpoints"""
+    filters = {}
+    for arg, name in (('from', 'start'), ('to', 'end')):
+        if args.get(arg):
+            filters[name] = datetime.fromisoformat(args[arg])
+    if args.get('province'):
+        filters['province'] = args['province']
+    if args.get('sex') not in (None, ''):
+        filters['sex'] = args.get('sex', type=int)
+    return filters
+
+
+@heart_risk_bp.route('/stats', methods=['GET'])
+@require_auth
+def prediction_stats():
+    """Prediction count, high-risk rate and vital means (?from=&to=&province=&sex=)"""
+    try:
+        return jsonify(HeartRisk.stats(**_stats_filters(request.args))), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@heart_risk_bp.route('/stats/<dimension>', methods=['GET'])
+@require_auth
+def prediction_stats_by(dimension):
+    """The same aggregates per group, computed with GROUP BY in MySQL
+
+    dimension: province, day, week, month, a categorical feature (cohorts,
+    e.g. sex or cp) or a continuous one bucketed by ?width= (age buckets,
+    feature distributions).
+    """
+    try:
+        width = request.args.get('width', type=float)
+        groups = HeartRisk.stats(dimension, width, **_stats_filters(request.args))
+        return jsonify({'group_by': dimension, 'groups': groups}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@heart_risk_bp.route('/analytics', methods=['GET'])
+@require_auth
+def prediction_analytics():
+    """Aggregates over all predictions from the in-memory columnar store
+
+    Query: from / to (prediction_date range), any categorical column as an
+    equality filter (e.g. sex=1), groupBy=<categorical>, period=day|week|month,
+    feature=<column> (histogram, bins=1..200).
+    """
+    try:
+        args = request.args
+        start, end = args.get('from'), args.get('to')
+        equals = {name: args.get(name, type=int) for name in CATEGORICAL if name in args}
+        result = {'summary': analytics_store.summary(start, end, **equals)}
+        if args.get('groupBy'):
+            result['groups'] = analytics_store.group_by(args['groupBy'], start, end, **equals)
+        if args.get('period'):
+            result['series'] = analytics_store.time_series(args['period'], start, end, **equals)
+        if args.get('feature'):
+            if args['feature'] not in FEATURES:
+                raise ValueError(f"Unknown feature: {args['feature']}")
+            result['histogram'] = analytics_store.histogram(
+                args['feature'], args.get('bins', 10, type=int), start, end, **equals)
+        result['store'] = analytics_store.stats()
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@heart_risk_bp.route('/export', methods=['GET'])
+@require_auth
+def export_predictions():
+    """Stream all predictions as NDJSON or CSV (?format=ndjson|csv&gzip=1)"""
+    try:
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in FORMATS:
+            return jsonify({'error': 'Unsupported format'}), 400
+        return stream_rows(HeartRisk.iter_all(), fmt, 'predictions', gzip=wants_gzip(request))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@heart_risk_bp.route('/model', methods=['GET'])
+@require_auth
+def get_model_info():
+    """Describe the model currently serving predictions"""
+    return jsonify(engine.info()), 200
+
+
+@heart_risk_bp.route('/model/reload', methods=['POST'])
+@require_admin
+def reload_model():
+    """Hot-reload MODEL_PATH in the worker serving this request"""
+    try:
+        info = engine.reload()
+        # Under gunicorn each worker holds its own copy of the model
+        info['message'] = ('Reloaded in this worker only; other workers pick up the new file '
+                           'through MODEL_RELOAD_INTERVAL or a SIGHUP to the master')
+        return jsonify(info), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,9 +1,12 @@
 from flask import Blueprint, request, jsonify
 from app.models.patient import Patient
-from app.utils import require_auth
+from app.utils import require_auth, json_with_etag
+from app.streaming import stream_rows, wants_gzip, FORMATS
 
 patient_bp = Blueprint('patient', __name__, url_prefix='/api/patients')
 
+MAX_PAGE_SIZE = 100
+
 @patient_bp.route('', methods=['POST'])
 @require_auth
 def create_patient():
@@ -39,13 +42,13 @@ def create_patient():
 @patient_bp.route('/<int:patient_id>', methods=['GET'])
 @require_auth
 def get_patient(patient_id):
-    """Get patient by ID"""
+    """Get patient by ID (cached; honours If-None-Match)"""
     try:
-        patient = Patient.get_by_id(patient_id)
+        patient, etag = Patient.get_by_id_cached(patient_id, request.user['role'])
         if not patient:
             return jsonify({'error': 'Patient not found'}), 404
         
-        return jsonify(patient), 200
+        return json_with_etag(patient, etag)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -53,29 +56,84 @@ def get_patient(patient_id):
 @patient_bp.route('', methods=['GET'])
 @require_auth
 def get_patients():
+    """List patients page by page.
+
+    Query params: page, pageSize, cursor (last patient_id of the previous page,
+    switches to keyset paging), province, gender, dobFrom, dobTo, createdBy
+    (admin only) and count=exact|estimate|none.
+    """
     try:
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('pageSize', 10))
-        if request.user['role'] == 'admin':
-            patients = Patient.get_all()
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            page_size = min(MAX_PAGE_SIZE, max(1, int(request.args.get('pageSize', 10))))
+            cursor = request.args.get('cursor')
+            after_id = int(cursor) if cursor else None
+            created_by = request.args.get('createdBy')
+            created_by = int(created_by) if created_by else None
+        except ValueError:
+            return jsonify({'error': 'Invalid paging parameters'}), 400
+
+        if request.user['role'] != 'admin':
+            created_by = request.user['user_id']
+
+        filters = {
+            'province': request.args.get('province'),
+            'gender': request.args.get('gender'),
+            'dob_from': request.args.get('dobFrom'),
+            'dob_to': request.args.get('dobTo'),
+        }
+
+        patients = Patient.get_page(
+            created_by,
+            limit=page_size,
+            offset=(page - 1) * page_size,
+            after_id=after_id,
+            **filters
+        )
+
+        count_mode = request.args.get('count', 'exact')
+        if count_mode == 'none':
+            total = None
         else:
-            patients = Patient.get_all(request.user['user_id'])
-        
-        # Pagination thủ công (vì DB không có OFFSET/LIMIT)
-        start = (page - 1) * page_size
-        end = start + page_size
-        paginated = patients[start:end]
-        
+            total = Patient.count(created_by, estimate=(count_mode == 'estimate'), **filters)
+
+        next_cursor = patients[-1]['patient_id'] if len(patients) == page_size else None
+
         return jsonify({
-            'data': paginated,
-            'total': len(patients),
+            'data': patients,
+            'total': total,
             'page': page,
-            'pageSize': page_size
+            'pageSize': page_size,
+            'nextCursor': next_cursor
         }), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
+@patient_bp.route('/export', methods=['GET'])
+@require_auth
+def export_patients():
+    """Stream patients as NDJSON or CSV; accepts the same filters as the list endpoint"""
+    try:
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in FORMATS:
+            return jsonify({'error': 'Unsupported format'}), 400
+
+        created_by = request.args.get('createdBy', type=int)
+        if request.user['role'] != 'admin':
+            created_by = request.user['user_id']
+
+        rows = Patient.iter_all(
+            created_by,
+            province=request.args.get('province'),
+            gender=request.args.get('gender'),
+            dob_from=request.args.get('dobFrom'),
+            dob_to=request.args.get('dobTo')
+        )
+        return stream_rows(rows, fmt, 'patients', gzip=wants_gzip(request))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @patient_bp.route('/<int:patient_id>', methods=['PUT'])
 @require_auth
 def update_patient(patient_id):
@@ -0,0 +1,137 @@
+"""Production pre-fork server (gunicorn), configured from ``config.Config``.
+
+The app is built once in the master (``preload_app``), so the model and
+config pages are shared copy-on-write by every worker. Per process state
+(DB pool, watcher, batcher and journal threads) is rebuilt after fork. The
+workers publish their metrics to a shared directory (METRICS_DIR, else a
+temporary one) so ``/api/metrics`` reports all of them. Signals:
+
+    HUP   graceful reload: the master reloads the model if its file changed,
+          then replaces the workers one by one
+    TERM  graceful shutdown
+    TTIN / TTOU  add / remove a worker
+
+Usage: ``FLASK_ENV=production python run.py`` or ``python -m app.server``.
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from gunicorn.app.base import BaseApplication
+
+from config import get_config
+from app import create_app, database, metrics
+from app.inference import engine
+from app.write_behind import journal
+
+logger = logging.getLogger(__name__)
+
+
+def gunicorn_options(config):
+    """gunicorn settings derived from the WEB_* entries of ``config``"""
+    return {
+        'bind': f'{config.API_HOST}:{config.API_PORT}',
+        'workers': config.WEB_WORKERS or multiprocessing.cpu_count(),
+        'worker_class': config.WEB_WORKER_CLASS,
+        'threads': config.WEB_THREADS,
+        'max_requests': config.WEB_MAX_REQUESTS,
+        'max_requests_jitter': config.WEB_MAX_REQUESTS_JITTER,
+        'timeout': config.WEB_TIMEOUT,
+        'graceful_timeout': config.WEB_GRACEFUL_TIMEOUT,
+        'keepalive': config.WEB_KEEPALIVE,
+        'pidfile': config.WEB_PID_FILE,
+        'preload_app': True,
+        'when_ready': when_ready,
+        'on_exit': on_exit,
+        'on_reload': on_reload,
+        'pre_fork': pre_fork,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+    }
+
+
+def when_ready(server):
+    server.log.info('Master %s ready, forking %s workers', os.getpid(), server.num_workers)
+    config = get_config()
+    if config.CACHE_BACKEND != 'redis' and config.CACHE_TTL > 0 and server.num_workers > 1:
+        server.log.warning('CACHE_BACKEND=local with %s workers: a worker serves cached rows up to '
+                           'CACHE_TTL=%ss after another one changed them; use CACHE_BACKEND=redis',
+                           server.num_workers, config.CACHE_TTL)
+    if config.METRICS_ENABLED and metrics.registry.directory is None:
+        metrics.registry.share(tempfile.mkdtemp(prefix='heartcare-metrics-'), config.METRICS_FLUSH_INTERVAL)
+        server.metrics_tmp = metrics.registry.directory
+
+
+def on_exit(server):
+    if getattr(server, 'metrics_tmp', None):
+        metrics.registry.directory = None  # no final flush at exit into the removed dir
+        shutil.rmtree(server.metrics_tmp, ignore_errors=True)
+
+
+def on_reload(server):
+    """SIGHUP, in the master: pick up a new model file before fresh workers fork"""
+    try:
+        if engine.reload_if_changed():
+            server.log.info('Reloaded model %s', engine.info()['version'])
+    except Exception:
+        server.log.exception('Model reload on SIGHUP failed, keeping current model')
+
+
+def pre_fork(server, worker):
+    # Connections opened while preloading (schema bootstrap) must not leak into workers
+    database.reset_pool(close=True)
+    # Unlock the journal files; the workers replay whatever is still unflushed
+    journal.close(timeout=0)
+
+
+def post_fork(server, worker):
+    database.reset_pool()
+    engine.after_fork()
+    journal.after_fork()
+    metrics.registry.after_fork()
+
+
+def post_worker_init(worker):
+    """Warm up, then mark the worker ready; gunicorn only accepts once this returns"""
+    app = worker.wsgi
+    state = {'pid': os.getpid(), 'ready': False, 'started_at': time.time(), 'db': None}
+    app.extensions['worker'] = state
+    try:
+        with database.get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        state['db'] = 'ok'
+    except Exception as e:
+        # Serve anyway: requests that need the DB fail on their own, /health/ready says why
+        state['db'] = str(e)
+        worker.log.warning('Worker %s could not reach the DB during warm-up: %s', os.getpid(), e)
+    engine.warm_up()
+    state['ready'] = True
+    worker.log.info('Worker %s ready', os.getpid())
+
+
+class HeartCareServer(BaseApplication):
+    """gunicorn application serving ``create_app()``"""
+
+    def __init__(self, options=None):
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key.lower(), value)
+
+    def load(self):
+        return create_app()
+
+
+def run(config=None):
+    """Start the pre-fork server with options from ``config`` (default: get_config())"""
+    HeartCareServer(gunicorn_options(config or get_config())).run()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,88 @@
+import csv
+import io
+import itertools
+import zlib
+
+from flask import Response
+
+from app.json_provider import encode
+
+# Bytes buffered before a chunk is sent to the client
+CHUNK_SIZE = 64 * 1024
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+
+def _ndjson_chunks(rows):
+    buf = []
+    size = 0
+    for row in rows:
+        line = encode(row) + b'\n'
+        buf.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield b''.join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield b''.join(buf)
+
+
+def _csv_chunks(rows, columns):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    header_written = False
+    for row in rows:
+        if not header_written:
+            columns = columns or list(row.keys())
+            writer.writerow(columns)
+            header_written = True
+        writer.writerow([row.get(c) for c in columns])
+        if out.tell() >= CHUNK_SIZE:
+            yield out.getvalue().encode('utf-8')
+            out.seek(0)
+            out.truncate()
+    if not header_written and columns:
+        writer.writerow(columns)
+    if out.tell():
+        yield out.getvalue().encode('utf-8')
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def wants_gzip(request):
+    """gzip=1 query flag, or a client that accepts gzip"""
+    flag = request.args.get('gzip')
+    if flag is not None:
+        return flag.lower() in ('1', 'true', 'yes')
+    return 'gzip' in request.headers.get('Accept-Encoding', '')
+
+
+def stream_rows(rows, fmt, filename, columns=None, gzip=False):
+    """Chunked response streaming ``rows`` (an iterator of dicts) as NDJSON or CSV.
+
+    Rows are encoded as they arrive, so memory use does not depend on how
+    many rows the iterator yields.
+    """
+    mimetype, ext = FORMATS[fmt]
+    # Pull the first row now so DB errors still surface as a normal error response
+    rows = iter(rows)
+    first = next(rows, None)
+    rows = itertools.chain([first], rows) if first is not None else iter(())
+    chunks = _ndjson_chunks(rows) if fmt == 'ndjson' else _csv_chunks(rows, columns)
+    body = _gzip(chunks) if gzip else chunks
+    headers = {'Content-Disposition': f'attachment; filename="{filename}.{ext}"'}
+    if gzip:
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return Response(body, content_type=mimetype, headers=headers, direct_passthrough=True)
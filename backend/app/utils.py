@@ -1,8 +1,80 @@
 import jwt
 import datetime
+import hashlib
+import logging
+import threading
+import time
 from functools import wraps
-from flask import request, jsonify
+from flask import request, jsonify, Response
 from config import Config
+from app.cache import TTLCache
+from app.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+def token_digest(token):
+    """SHA-256 of a raw JWT; used as cache and revocation key"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class RevocationList:
+    """Digests of revoked (logged out) tokens, checked in O(1).
+
+    Lookups hit an in-process set. The set is reloaded from the
+    revoked_tokens table at most every ``sync_interval`` seconds, so a
+    logout handled by one worker process reaches the others.
+    """
+
+    def __init__(self, sync_interval=5.0):
+        self.sync_interval = sync_interval
+        # False when something else calls sync() periodically (the ASGI app)
+        self.lazy = True
+        self._lock = threading.Lock()
+        self._revoked = frozenset()
+        self._synced_at = None
+
+    def is_revoked(self, digest):
+        if self.lazy:
+            self._maybe_sync()
+        return digest in self._revoked
+
+    def revoke(self, digest, user_id, expires_at):
+        Database.revoke_token(digest, user_id, expires_at)
+        # Taken after the DB write so a concurrent sync cannot drop the new entry
+        with self._lock:
+            self._revoked = self._revoked | {digest}
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def _maybe_sync(self):
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is already syncing
+        try:
+            self._sync_locked(now)
+        finally:
+            self._lock.release()
+
+    def sync(self):
+        """Reload the revoked set from the DB now"""
+        with self._lock:
+            self._sync_locked(time.monotonic())
+
+    def _sync_locked(self, now):
+        self._synced_at = now
+        try:
+            self._revoked = frozenset(Database.get_revoked_tokens())
+        except Exception as e:
+            logger.warning('Could not sync revoked tokens, keeping %d cached: %s', len(self._revoked), e)
+
+
+# Verified payloads keyed by token digest; entries never outlive the token's exp
+_token_cache = TTLCache(Config.AUTH_TOKEN_CACHE_SIZE, Config.AUTH_TOKEN_CACHE_TTL)
+revoked_tokens = RevocationList(Config.AUTH_REVOCATION_SYNC_INTERVAL)
 
 class AuthUtil:
     """Authentication utilities"""
@@ -26,18 +98,44 @@ class AuthUtil:
     
     @staticmethod
     def verify_token(token):
-        """Verify JWT token"""
-        try:
-            payload = jwt.decode(
-                token,
-                Config.JWT_SECRET_KEY,
-                algorithms=[Config.JWT_ALGORITHM]
-            )
-            return payload
-        except jwt.ExpiredSignatureError:
-            return None
-        except jwt.InvalidTokenError:
+        """Verify JWT token (signature check is cached until the token expires)"""
+        digest = token_digest(token)
+        payload = _token_cache.get(digest)
+        if payload is None:
+            try:
+                payload = jwt.decode(
+                    token,
+                    Config.JWT_SECRET_KEY,
+                    algorithms=[Config.JWT_ALGORITHM]
+                )
+            except jwt.ExpiredSignatureError:
+                return None
+            except jwt.InvalidTokenError:
+                return None
+            ttl = Config.AUTH_TOKEN_CACHE_TTL
+            if 'exp' in payload:
+                ttl = min(ttl, payload['exp'] - time.time())
+            _token_cache.set(digest, payload, ttl)
+        if revoked_tokens.is_revoked(digest):
             return None
+        return dict(payload)
+
+    @staticmethod
+    def revoke_token(token, payload):
+        """Reject ``token`` from now on (until its own expiry)"""
+        digest = token_digest(token)
+        expires_at = datetime.datetime.fromtimestamp(payload['exp']) if 'exp' in payload else \
+            datetime.datetime.now() + datetime.timedelta(hours=Config.JWT_EXPIRATION_HOURS)
+        revoked_tokens.revoke(digest, payload.get('user_id'), expires_at)
+        _token_cache.pop(digest)
+
+    @staticmethod
+    def cache_stats():
+        """Token cache counters and size of the revocation list"""
+        return {
+            'token_cache': _token_cache.stats(),
+            'revoked_tokens': len(revoked_tokens),
+        }
     
     @staticmethod
     def get_token_from_request():
@@ -116,3 +214,14 @@ def require_admin(f):
         return f(*args, **kwargs)
     
     return decorated_function
+
+def json_with_etag(value, etag):
+    """JSON response carrying ``etag``, or an empty 304 when If-None-Match already has it"""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(value)
+    response.set_etag(etag)
+    # The browser may keep it, but must revalidate (cheap 304) before every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,536 @@
+"""Write-behind persistence of predictions (PREDICTION_WRITE_BEHIND).
+
+``append`` writes a prediction to a local append-only journal and returns as
+soon as it is on disk; a background thread then inserts journaled records
+into the database in batches. A request waits for one fsync, shared by every
+append made within PREDICTION_JOURNAL_SYNC_MS (group commit), never for a
+database commit.
+
+The journal (PREDICTION_JOURNAL_DIR) is a set of JSON-lines files, one line
+per prediction, rotated every PREDICTION_JOURNAL_SEGMENT_MB and deleted once
+all their records are in the database. Each record carries a random
+``import_key`` (``wb:<uuid>``, unlike the source-row digests of
+scripts/import_data_sql.py), so replaying a file that was partly inserted
+before a crash adds nothing twice. A process holds an exclusive lock (flock) on its own
+files; files whose process is gone are replayed at start-up and every
+ADOPT_INTERVAL seconds after, by whichever process locks them first, so
+gunicorn workers can share the directory.
+
+Connection errors are retried with exponential backoff (up to
+PREDICTION_FLUSH_RETRY_MAX_S). Records the database refuses for good (e.g.
+the patient was deleted in between) are moved to ``rejected.jsonl`` instead
+of holding up the queue. A prediction shows up in reads once flushed, i.e.
+within PREDICTION_FLUSH_INTERVAL_MS while the database is reachable.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+from app import metrics
+from app.batching import Overloaded
+from app.database import Database
+from app.models.cache import invalidate_predictions
+from app.storage import backend
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process, nothing to lock against
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = '.journal'
+REJECTED = 'rejected.jsonl'
+KEY_PREFIX = 'wb:'
+# Seconds between scans of the directory for files left by dead processes
+ADOPT_INTERVAL = 60
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'item'):  # numpy scalar
+        return value.item()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _encode(record):
+    return (json.dumps(record, default=_json_default, separators=(',', ':')) + '\n').encode()
+
+
+def _lock(file):
+    """Non-blocking exclusive lock on ``file``; False if another process has it"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _fsync_dir(directory):
+    # Makes a created / renamed file survive a power loss, not just its data
+    if os.name == 'posix':
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class Segment:
+    """One journal file, kept open (and locked) while it has unflushed records"""
+
+    def __init__(self, path, file, size=0):
+        self.path = path
+        self.file = file
+        self.size = size
+        self.pending = 0
+        self.dirty = False
+        self.retired = False
+
+
+class PredictionJournal:
+    """Durable local queue of predictions in front of ``Database.add_predictions_bulk``"""
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.sync_window = 0.001
+        self.segment_bytes = 64 << 20
+        self.batch_size = 500
+        self.flush_interval = 0.1
+        self.retry_max = 30.0
+        self.max_pending = 100000
+
+        self._lock = threading.Lock()
+        self._appended = threading.Condition(self._lock)  # sync thread waits for writes
+        self._synced = threading.Condition(self._lock)    # appenders wait for their fsync
+        self._queued = threading.Condition(self._lock)    # flush thread waits for records
+        self._pid = None
+        self._generation = 0
+        self._closing = False
+        self._threads = ()
+        self._reset_locked()
+
+        self._appends = 0
+        self._fsyncs = 0
+        self._flushed = 0
+        self._batches = 0
+        self._retries = 0
+        self._rejected = 0
+        self._replayed = 0
+        self._shed = 0
+        self._last_error = None
+        self._last_flush_at = None
+        atexit.register(self.close)
+
+    def _reset_locked(self):
+        self._queue = deque()  # (segment, record) not in the database yet
+        self._segments = []    # files with unflushed records, oldest first
+        self._segment = None   # file being appended to
+        self._written = 0
+        self._durable = 0
+        self._failed = None
+
+    def init_app(self, app):
+        """Read the PREDICTION_* settings and replay what a previous run left behind"""
+        app.extensions['prediction_journal'] = self
+        self.enabled = app.config.get('PREDICTION_WRITE_BEHIND', False)
+        if not self.enabled:
+            return
+        self.directory = app.config.get('PREDICTION_JOURNAL_DIR')
+        self.sync_window = app.config.get('PREDICTION_JOURNAL_SYNC_MS', 1) / 1000.0
+        self.segment_bytes = int(app.config.get('PREDICTION_JOURNAL_SEGMENT_MB', 64)) << 20
+        self.batch_size = app.config.get('PREDICTION_FLUSH_BATCH', 500)
+        self.flush_interval = app.config.get('PREDICTION_FLUSH_INTERVAL_MS', 100) / 1000.0
+        self.retry_max = app.config.get('PREDICTION_FLUSH_RETRY_MAX_S', 30)
+        self.max_pending = app.config.get('PREDICTION_JOURNAL_MAX_PENDING', 100000)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self.start()
+        except OSError:
+            logger.exception('Prediction journal %s unusable, predictions are written synchronously', self.directory)
+            self.enabled = False
+
+    def start(self):
+        """Open a journal file and start the sync / flush threads (once per process)"""
+        with self._lock:
+            self._ensure_started_locked()
+
+    def after_fork(self):
+        """In a forked worker: leave the parent's files alone and start afresh"""
+        if self.enabled:
+            self.start()
+
+    def append(self, record):
+        """Journal one prediction (dict of the Database.add_predictions_bulk fields).
+
+        Returns once the record is fsynced. ``record`` gets its ``import_key``
+        and ``prediction_date`` set first, so a caller falling back to a
+        direct insert after an error can use the same key. Raises Overloaded
+        when PREDICTION_JOURNAL_MAX_PENDING records are waiting for the
+        database and OSError when the journal cannot be written.
+        """
+        record['import_key'] = KEY_PREFIX + uuid.uuid4().hex
+        record.setdefault('prediction_date', datetime.now())
+        line = _encode(record)
+        with self._lock:
+            if self._closing:
+                raise OSError('Prediction journal is closing')
+            self._ensure_started_locked()
+            if self._failed is not None:
+                raise OSError(f'Prediction journal failed: {self._failed}')
+            if len(self._queue) >= self.max_pending:
+                self._shed += 1
+                metrics.journal_records.inc('shed')
+                raise Overloaded(f'Prediction journal is full ({self.max_pending} waiting for the database)')
+            if self._segment.size + len(line) > self.segment_bytes and self._segment.size:
+                self._rotate_locked()
+            segment = self._segment
+            os.write(segment.file.fileno(), line)
+            segment.size += len(line)
+            segment.pending += 1
+            segment.dirty = True
+            self._written += 1
+            seq = self._written
+            generation = self._generation
+            self._appends += 1
+            self._queue.append((segment, record))
+            self._appended.notify()
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._queued.notify()
+            while self._durable < seq and self._failed is None:
+                if self._generation != generation:
+                    raise OSError('Prediction journal was closed before the record was synced')
+                self._synced.wait()
+            if self._durable < seq:
+                raise OSError(f'Prediction journal failed: {self._failed}')
+        metrics.journal_records.inc('appended')
+        return record['import_key']
+
+    def close(self, timeout=5.0):
+        """Stop the threads, giving the flusher ``timeout`` seconds to drain the queue.
+
+        Unflushed records stay in their files and are replayed by the next
+        process to start.
+        """
+        with self._lock:
+            if self._pid != os.getpid() or self._closing:
+                return
+            self._closing = True
+            threads = self._threads
+            self._appended.notify_all()
+            self._queued.notify_all()
+        deadline = time.monotonic() + (timeout or 0)
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        with self._lock:
+            self._generation += 1
+            for segment in list(self._segments):
+                if segment.pending:
+                    segment.file.close()
+                else:
+                    self._retire_locked(segment)
+            self._reset_locked()
+            self._synced.notify_all()
+            self._pid = None
+            self._threads = ()
+            self._closing = False
+
+    def stats(self):
+        """Backlog, group commit and flush counters of this process"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'directory': self.directory,
+                'backlog': len(self._queue),
+                'max_pending': self.max_pending,
+                'files': len(self._segments),
+                'appended': self._appends,
+                'fsyncs': self._fsyncs,
+                'avg_group_commit': round(self._appends / self._fsyncs, 2) if self._fsyncs else 0.0,
+                'flushed': self._flushed,
+                'flush_batches': self._batches,
+                'avg_flush_batch': round(self._flushed / self._batches, 2) if self._batches else 0.0,
+                'retries': self._retries,
+                'rejected': self._rejected,
+                'replayed': self._replayed,
+                'shed': self._shed,
+                'last_flush_at': self._last_flush_at,
+                'last_error': self._last_error,
+                'failed': str(self._failed) if self._failed is not None else None,
+            }
+
+    # ---------------------------------------------------------------- #
+    # Files
+    # ---------------------------------------------------------------- #
+
+    def _ensure_started_locked(self):
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            # Forked: the queue and files are the parent's. Closing our copies of
+            # the descriptors releases nothing, the parent still holds its locks.
+            for segment in self._segments:
+                segment.file.close()
+            self._reset_locked()
+            self._generation += 1
+        self._segment = self._new_segment()
+        self._segments.append(self._segment)
+        self._pid = os.getpid()
+        generation = self._generation
+        self._threads = (
+            threading.Thread(target=self._sync_loop, args=(generation,), name='journal-sync', daemon=True),
+            threading.Thread(target=self._flush_loop, args=(generation,), name='journal-flush', daemon=True),
+        )
+        for thread in self._threads:
+            thread.start()
+
+    def _new_segment(self):
+        name = f'predictions-{time.time_ns():020d}-{os.getpid()}'
+        tmp = os.path.join(self.directory, name + '.tmp')
+        path = os.path.join(self.directory, name + SUFFIX)
+        # Locked before it gets a name other processes look for
+        file = open(tmp, 'xb', buffering=0)
+        _lock(file)
+        os.replace(tmp, path)
+        _fsync_dir(self.directory)
+        return Segment(path, file)
+
+    def _rotate_locked(self):
+        old = self._segment
+        self._segment = self._new_segment()
+        self._segments.append(self._segment)
+        if not old.pending:
+            self._retire_locked(old)
+
+    def _retire_locked(self, segment):
+        """Delete a file whose records are all in the database"""
+        segment.retired = True
+        if segment in self._segments:
+            self._segments.remove(segment)
+        try:
+            os.unlink(segment.path)
+        except FileNotFoundError:
+            pass
+        # Unlinked before unlocking: nobody can claim it in between
+        segment.file.close()
+
+    def _claim_orphans(self):
+        """Lock and read the files of processes that are gone: [(segment, records)]"""
+        with self._lock:
+            own = {segment.path for segment in self._segments}
+        claimed = []
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(SUFFIX) or path in own:
+                continue
+            try:
+                file = open(path, 'rb', buffering=0)
+            except FileNotFoundError:
+                continue
+            # Taken by a live process, or replayed and deleted since listdir()
+            if not _lock(file) or os.fstat(file.fileno()).st_nlink == 0:
+                file.close()
+                continue
+            data = file.readall()
+            lines = data.split(b'\n')
+            records = []
+            for number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    record['prediction_date'] = datetime.fromisoformat(record['prediction_date'])
+                except (ValueError, KeyError, TypeError):
+                    # A last line torn by a crash mid-write was never acknowledged
+                    if number < len(lines):
+                        logger.warning('Skipping unreadable line %d of %s', number, path)
+                    continue
+                records.append(record)
+            segment = Segment(path, file, len(data))
+            segment.pending = len(records)
+            claimed.append((segment, records))
+        return claimed
+
+    def _adopt(self, generation):
+        try:
+            claimed = self._claim_orphans()
+        except OSError:
+            logger.exception('Could not scan the prediction journal %s', self.directory)
+            return
+        with self._lock:
+            for segment, records in claimed:
+                if self._generation != generation:
+                    segment.file.close()
+                    continue
+                if not records:
+                    self._retire_locked(segment)
+                    continue
+                logger.info('Replaying %d journaled predictions from %s', len(records), segment.path)
+                self._segments.insert(0, segment)
+                self._queue.extend((segment, record) for record in records)
+                self._replayed += len(records)
+                metrics.journal_records.inc('replayed', amount=len(records))
+
+    # ---------------------------------------------------------------- #
+    # Threads
+    # ---------------------------------------------------------------- #
+
+    def _sync_loop(self, generation):
+        """Group commit: one fsync covers every append made since the previous one"""
+        while True:
+            with self._lock:
+                while self._durable == self._written:
+                    if self._closing or self._generation != generation:
+                        return
+                    self._appended.wait()
+            if self.sync_window:
+                time.sleep(self.sync_window)
+            with self._lock:
+                if self._generation != generation:
+                    return
+                target = self._written
+                dirty = [segment for segment in self._segments if segment.dirty]
+                for segment in dirty:
+                    segment.dirty = False
+            error = None
+            started = time.perf_counter()
+            for segment in dirty:
+                try:
+                    os.fsync(segment.file.fileno())
+                except (OSError, ValueError) as e:
+                    # A file retired meanwhile had all its records flushed
+                    if not segment.retired:
+                        error = e
+            metrics.journal_fsync.observe(time.perf_counter() - started)
+            with self._lock:
+                if self._generation != generation:
+                    return
+                if error is not None:
+                    # The data may or may not be on disk: stop journaling, callers write through
+                    logger.error('fsync of the prediction journal failed: %s', error)
+                    self._failed = error
+                else:
+                    self._durable = target
+                self._fsyncs += 1
+                self._synced.notify_all()
+                if error is not None:
+                    return
+
+    def _next_batch(self, generation, next_scan):
+        """Up to batch_size queued records, gathered for at most flush_interval"""
+        with self._lock:
+            while not self._queue:
+                if self._closing or self._generation != generation:
+                    return None
+                remaining = next_scan - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._queued.wait(remaining)
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._queued.wait(remaining)
+            if self._generation != generation:
+                return None
+            return list(islice(self._queue, self.batch_size))
+
+    def _flush_loop(self, generation):
+        backoff = 0
+        next_scan = 0
+        while True:
+            if time.monotonic() >= next_scan:
+                self._adopt(generation)
+                next_scan = time.monotonic() + ADOPT_INTERVAL
+            batch = self._next_batch(generation, next_scan)
+            if batch is None:
+                return
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                rejected = self._write([record for _, record in batch])
+            except Exception as e:
+                backoff = min(self.retry_max, backoff * 2 or 0.5)
+                with self._lock:
+                    self._retries += 1
+                    self._last_error = f'{type(e).__name__}: {e}'
+                    if self._closing or self._generation != generation:
+                        return
+                    logger.warning('Flushing %d journaled predictions failed, retrying in %.1fs: %s',
+                                   len(batch), backoff, e)
+                    deadline = time.monotonic() + backoff
+                    while not self._closing and self._generation == generation:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._queued.wait(remaining)
+                continue
+            backoff = 0
+            metrics.journal_flush.observe(time.perf_counter() - started)
+            metrics.journal_records.inc('flushed', amount=len(batch) - rejected)
+            self._done(batch, rejected, generation)
+            for patient_id in {record['patient_id'] for _, record in batch}:
+                invalidate_predictions(patient_id)
+
+    def _write(self, records):
+        """Insert ``records``; returns how many were rejected"""
+        try:
+            Database.add_predictions_bulk(records, skip_existing=True)
+            return 0
+        except backend.data_errors:
+            pass
+        # Find the offending rows; connection errors still abort the whole batch
+        rejected = 0
+        for record in records:
+            try:
+                Database.add_predictions_bulk([record], skip_existing=True)
+            except backend.data_errors as e:
+                self._reject(record, e)
+                rejected += 1
+        return rejected
+
+    def _reject(self, record, error):
+        logger.error('Database refused journaled prediction %s for patient %s: %s',
+                     record['import_key'], record['patient_id'], error)
+        entry = dict(record, error=f'{type(error).__name__}: {error}', rejected_at=datetime.now())
+        with open(os.path.join(self.directory, REJECTED), 'ab') as f:
+            f.write(_encode(entry))
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self._rejected += 1
+        metrics.journal_records.inc('rejected')
+
+    def _done(self, batch, rejected, generation):
+        with self._lock:
+            if self._generation != generation:
+                return
+            for _ in batch:
+                self._queue.popleft()
+            touched = []
+            for segment, _ in batch:
+                segment.pending -= 1
+                if segment not in touched:
+                    touched.append(segment)
+            for segment in touched:
+                if not segment.pending and segment is not self._segment:
+                    self._retire_locked(segment)
+            self._flushed += len(batch) - rejected
+            self._batches += 1
+            self._last_flush_at = time.time()
+
+
+journal = PredictionJournal()
@@ -0,0 +1,23 @@
+"""ASGI entry point: the same API on asyncio (Quart + aiomysql).
+
+    hypercorn asgi:app --bind 0.0.0.0:5000
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+``python run.py`` keeps serving the synchronous Flask app.
+"""
+from app.aio import create_async_app
+from config import get_config
+
+app = create_async_app()
+
+if __name__ == '__main__':
+    config = get_config()
+    
+    print(f"Starting ASGI server on {config.API_HOST}:{config.API_PORT}")
+    print(f"Environment: {config.FLASK_ENV}")
+    
+    app.run(
+        host=config.API_HOST,
+        port=config.API_PORT,
+        debug=config.DEBUG
+    )
@@ -0,0 +1,163 @@
+"""
+Micro-benchmarks: model inference, JSON encoding, Database methods, in-process routes
+
+Inference and JSON need nothing but the code. --db adds the Database methods
+and the predict / patient list routes (through the Flask test client, no
+network) against the configured database, seeded with benchmarks/seed.py.
+
+Usage:
+    python benchmarks/bench_core.py                                # inference + json
+    python benchmarks/bench_core.py --db --json results/core.json
+    python benchmarks/bench_core.py --db --write                   # also add_prediction (adds rows)
+"""
+import argparse
+import itertools
+import random
+import sys
+import time
+
+from common import BENCH_ADMIN, BENCH_PASSWORD, sample, save_results, summarize
+
+import numpy as np
+
+from app import create_app, database
+from app.database import Database
+from app.inference import engine, FEATURES
+from app.routes.heart_risk import _features_from
+import bench_json
+
+
+def _random_features(rng):
+    return {
+        'age': rng.randint(30, 80), 'sex': rng.randint(0, 1), 'cp': rng.randint(0, 3),
+        'trestbps': rng.randint(100, 160), 'chol': rng.randint(150, 320), 'fbs': rng.randint(0, 1),
+        'restecg': rng.randint(0, 2), 'thalach': rng.randint(90, 190), 'exang': rng.randint(0, 1),
+        'oldpeak': round(rng.uniform(0, 4), 1), 'slope': rng.randint(0, 2), 'ca': rng.randint(0, 3),
+        'thal': rng.randint(0, 3),
+    }
+
+
+def bench_inference(n, rng):
+    results = {'model': engine.info()['kind']}
+    rows = [_random_features(rng) for _ in range(256)]
+    cycle = itertools.cycle(rows)
+    # Request path of /predict minus the DB write: defaults + scoring
+    results['predict_risk'] = summarize(sample(lambda: engine.predict(_features_from(next(cycle))), n))
+    for batch in (1, 64, 1024):
+        X = np.array([[r[name] for name in FEATURES] for r in (rows * (batch // 256 + 1))[:batch]], dtype=np.float64)
+        stats = summarize(sample(lambda: engine.predict_proba(X), max(10, n // batch)))
+        stats['rows_per_s'] = round(batch / (stats['mean_ms'] / 1000)) if stats['mean_ms'] else None
+        results[f'predict_proba_batch_{batch}'] = stats
+    return results
+
+
+def _db_cases(rng, write):
+    patients = Database.list_patients(limit=500)
+    if not patients:
+        raise RuntimeError('No patients in the database, run benchmarks/seed.py first')
+    ids = [p['patient_id'] for p in patients]
+    total = Database.count_patients()
+    pick = lambda: rng.choice(ids)
+    deep = max(0, min(total, 100000) - 50)
+
+    def count_uncached():
+        database._invalidate_patient_counts()
+        return Database.count_patients()
+
+    cases = {
+        'get_user_by_email': lambda: Database.get_user_by_email(BENCH_ADMIN),
+        'get_patient_by_id': lambda: Database.get_patient_by_id(pick()),
+        'list_patients_first_page': lambda: Database.list_patients(limit=50),
+        f'list_patients_offset_{deep}': lambda: Database.list_patients(limit=50, offset=deep),
+        'list_patients_keyset': lambda: Database.list_patients(limit=50, after_id=pick()),
+        'count_patients': count_uncached,
+        'count_patients_province': lambda: Database.count_patients(province='Hà Nội'),
+        'get_predictions_by_patient': lambda: Database.get_predictions_by_patient(pick()),
+        'get_latest_prediction': lambda: Database.get_latest_prediction(pick()),
+        'prediction_stats': lambda: Database.prediction_stats(),
+        'prediction_stats_province': lambda: Database.prediction_stats('province'),
+        'prediction_stats_month': lambda: Database.prediction_stats('month'),
+        'prediction_stats_cp_raw': lambda: Database.prediction_stats('cp'),
+    }
+    if write:
+        def add_prediction():
+            f = _random_features(rng)
+            Database.add_prediction(pick(), prediction=rng.randint(0, 1), **f)
+        cases['add_prediction'] = add_prediction
+    return cases
+
+
+def bench_db(n, rng, write):
+    results = {}
+    for name, fn in _db_cases(rng, write).items():
+        # Aggregates scan a lot more than point lookups: fewer rounds
+        rounds = max(5, n // 20) if name.startswith(('prediction_stats', 'count_', 'list_patients_offset')) else n
+        results[name] = summarize(sample(fn, rounds))
+        print(f'  {name:<32} p50 {results[name]["p50_ms"]:9.3f} ms  p99 {results[name]["p99_ms"]:9.3f} ms', flush=True)
+    return results
+
+
+def bench_routes(app, n, rng, write):
+    """Full Flask stack in-process: auth decorator, handler, DB, JSON"""
+    client = app.test_client()
+    login = client.post('/api/auth/login', json={'email': BENCH_ADMIN, 'password': BENCH_PASSWORD})
+    if login.status_code != 200:
+        raise RuntimeError(f'Login as {BENCH_ADMIN} failed ({login.status_code}), run benchmarks/seed.py first')
+    headers = {'Authorization': 'Bearer ' + login.get_json()['token']}
+    ids = [p['patient_id'] for p in Database.list_patients(limit=500)]
+
+    def predict():
+        body = dict(_random_features(rng), patient_id=rng.choice(ids))
+        assert client.post('/api/heart-risk/predict', json=body, headers=headers).status_code == 200
+
+    def patient_page():
+        assert client.get('/api/patients?pageSize=50&count=none', headers=headers).status_code == 200
+
+    def stats():
+        assert client.get('/api/heart-risk/stats/province', headers=headers).status_code == 200
+
+    results = {
+        'route_patient_page': summarize(sample(patient_page, n)),
+        'route_stats_province': summarize(sample(stats, n)),
+    }
+    if write:
+        results['route_predict'] = summarize(sample(predict, n))
+    return results
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the hot paths')
+    parser.add_argument('-n', type=int, default=1000, help='samples per case')
+    parser.add_argument('--db', action='store_true', help='also benchmark Database methods and routes')
+    parser.add_argument('--write', action='store_true', help='include add_prediction / POST predict (adds rows)')
+    parser.add_argument('--json-rows', type=int, nargs='*', default=[1000, 10000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='json_out', help='write the results to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = _parse_args(argv)
+    rng = random.Random(args.seed)
+    app = create_app()
+    results = {}
+    started = time.perf_counter()
+
+    print('inference')
+    results['inference'] = bench_inference(args.n, rng)
+    print('json')
+    results['json'] = bench_json.run(args.json_rows)
+    if args.db:
+        print('database')
+        results['database'] = bench_db(args.n, rng, args.write)
+        print('routes')
+        results['routes'] = bench_routes(app, max(50, args.n // 10), rng, args.write)
+    print(f'done in {time.perf_counter() - started:.1f}s')
+
+    if args.json_out:
+        save_results(args.json_out, 'core', results, vars(args))
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
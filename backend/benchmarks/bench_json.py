@@ -0,0 +1,117 @@
+"""
+Benchmark: JSON cho response kiểu get_all_predictions (list các row DictCursor)
+
+So sánh provider mặc định của Flask (bản indent, như JSONIFY_PRETTYPRINT_REGULAR
+cũ, và bản compact) với FastJSONProvider (orjson nếu có, stdlib nếu không).
+
+Usage:
+    python benchmarks/bench_json.py                  # 1k, 10k, 100k rows
+    python benchmarks/bench_json.py --rows 50000 --repeat 5 --json out.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from app import json_provider
+from app.json_provider import FastJSONProvider
+
+
+def prediction_rows(n, seed=42):
+    """Rows shaped like SELECT * FROM predictions through a DictCursor"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    return [{
+        'prediction_id': i + 1,
+        'patient_id': rng.randint(1, 5000),
+        'age': rng.randint(25, 85),
+        'sex': rng.randint(0, 1),
+        'cp': rng.randint(0, 3),
+        'trestbps': float(rng.randint(90, 190)),
+        'chol': float(rng.randint(150, 350)),
+        'fbs': rng.randint(0, 1),
+        'restecg': rng.randint(0, 2),
+        'thalach': float(rng.randint(60, 200)),
+        'exang': rng.randint(0, 1),
+        'oldpeak': Decimal(f'{rng.uniform(0, 5):.1f}'),
+        'slope': rng.randint(0, 2),
+        'ca': rng.randint(0, 3),
+        'thal': rng.randint(0, 3),
+        'prediction': rng.randint(0, 1),
+        'prediction_date': start + timedelta(minutes=7 * i),
+        'import_key': None,
+    } for i in range(n)]
+
+
+def _providers():
+    app = Flask(__name__)
+
+    pretty = DefaultJSONProvider(app)
+    pretty.compact = False
+    compact = DefaultJSONProvider(app)
+    compact.compact = True
+    fast = FastJSONProvider(app)
+    fast.compact = True
+    cases = [('flask-default-indent', app, pretty), ('flask-default-compact', app, compact),
+             (f'fast-{"orjson" if json_provider.orjson else "stdlib"}', app, fast)]
+    if json_provider.orjson is not None:
+        # Same provider without orjson, i.e. what a deployment without it gets
+        cases.append(('fast-stdlib', app, fast))
+    return cases
+
+
+def _time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(row_counts, repeat=3):
+    results = []
+    for n in row_counts:
+        rows = prediction_rows(n)
+        for name, app, provider in _providers():
+            saved = json_provider.orjson
+            if name == 'fast-stdlib':
+                json_provider.orjson = None
+            try:
+                with app.app_context():
+                    size = len(provider.response(rows).get_data())
+                    seconds = _time(lambda: provider.response(rows).get_data(), repeat)
+            finally:
+                json_provider.orjson = saved
+            results.append({
+                'rows': n,
+                'provider': name,
+                'seconds': round(seconds, 6),
+                'rows_per_second': round(n / seconds) if seconds else None,
+                'bytes': size,
+            })
+            print(f'{n:>8} rows  {name:<24} {seconds * 1000:10.2f} ms  {size / 1e6:8.2f} MB', flush=True)
+    return results
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark JSON providers on prediction lists')
+    parser.add_argument('--rows', type=int, nargs='*', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3, help='best of N runs')
+    parser.add_argument('--json', dest='json_out', help='also write the results to this file')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = _parse_args(sys.argv[1:])
+    results = run(args.rows, args.repeat)
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,91 @@
+"""Helpers shared by the benchmark scripts: timing, percentiles, result files"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Credentials of the users created by seed.py
+BENCH_PASSWORD = 'bench-password'
+BENCH_ADMIN = 'bench-admin@example.com'
+BENCH_DOCTOR = 'bench-doctor-{}@example.com'
+BENCH_CITIZEN_PREFIX = 'BENCH'
+
+
+def parse_scale(value):
+    """'10k' -> 10000, '1m' -> 1000000, '2500' -> 2500"""
+    value = str(value).strip().lower()
+    factor = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value[:-1] if factor > 1 else value) * factor)
+
+
+def summarize(samples, wall=None):
+    """Latency summary (ms) of per-call durations in seconds; throughput if ``wall`` is given"""
+    ordered = sorted(samples)
+    n = len(ordered)
+    if not n:
+        return {'n': 0}
+
+    def pct(p):
+        # nearest-rank percentile
+        return round(ordered[min(n - 1, max(0, int(round(p / 100.0 * n)) - 1))] * 1000, 3)
+
+    result = {
+        'n': n,
+        'mean_ms': round(sum(ordered) / n * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+    if wall:
+        result['throughput_per_s'] = round(n / wall, 1)
+    return result
+
+
+def sample(fn, n, warmup=3):
+    """Call ``fn`` ``n`` times after ``warmup`` calls; returns the per-call durations"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def save_results(path, suite, results, params=None):
+    """Write ``results`` with enough context (commit, host, params) to compare runs later"""
+    document = {
+        'suite': suite,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': params or {},
+        'results': results,
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2, default=str)
+    print(f'Results written to {path}')
+    return document
@@ -0,0 +1,209 @@
+"""
+Closed-loop HTTP load test against a running server (sync or async)
+
+--concurrency threads each keep one keep-alive connection and send requests
+back to back; a scenario ends after --requests requests in total. Reports
+throughput, p50/p95/p99 latency and errors per scenario. Needs the users and
+patients of benchmarks/seed.py.
+
+Scenarios:
+    login      POST /api/auth/login (password hashing bound)
+    patients   GET /api/patients, keyset paging through nextCursor
+    predict    POST /api/heart-risk/predict (adds predictions)
+    stats      GET /api/heart-risk/stats/province (sync server only; skipped on asgi.py)
+
+Usage:
+    python benchmarks/load_test.py --url http://localhost:5000 --concurrency 32 --requests 5000
+    python benchmarks/load_test.py --scenarios patients stats --json results/load.json
+"""
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from common import BENCH_ADMIN, BENCH_DOCTOR, BENCH_PASSWORD, save_results, summarize
+
+SCENARIOS = ('login', 'patients', 'predict', 'stats')
+
+
+class Client:
+    """One keep-alive connection; reconnects after a connection error"""
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.token = None
+        self._conn = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self._conn = cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None):
+        """(status, parsed JSON or None); raises on network errors"""
+        headers = {'Accept': 'application/json'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if self.token:
+            headers['Authorization'] = 'Bearer ' + self.token
+        if self._conn is None:
+            self._connect()
+        try:
+            self._conn.request(method, self.prefix + path, body=body, headers=headers)
+            response = self._conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if response.getheader('Connection', '').lower() == 'close':
+            self.close()
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+    def login(self, email, password):
+        status, data = self.request('POST', '/api/auth/login', {'email': email, 'password': password})
+        if status != 200:
+            raise RuntimeError(f'Login as {email} failed ({status}), run benchmarks/seed.py first')
+        self.token = data['token']
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _features(rng):
+    return {
+        'age': rng.randint(30, 80), 'sex': rng.randint(0, 1), 'cp': rng.randint(0, 3),
+        'trestbps': rng.randint(100, 160), 'chol': rng.randint(150, 320), 'fbs': rng.randint(0, 1),
+        'restecg': rng.randint(0, 2), 'thalach': rng.randint(90, 190), 'exang': rng.randint(0, 1),
+        'oldpeak': round(rng.uniform(0, 4), 1), 'slope': rng.randint(0, 2), 'ca': rng.randint(0, 3),
+        'thal': rng.randint(0, 3),
+    }
+
+
+def _scenario_step(name, client, rng, state, patient_ids):
+    """Send one request of ``name``; returns the status code"""
+    if name == 'login':
+        email = BENCH_DOCTOR.format(rng.randint(1, state['doctors'])) if state['doctors'] else BENCH_ADMIN
+        status, _ = client.request('POST', '/api/auth/login', {'email': email, 'password': BENCH_PASSWORD})
+        return status
+    if name == 'patients':
+        cursor = state.get('cursor')
+        path = '/api/patients?pageSize=50&count=none' + (f'&cursor={cursor}' if cursor else '')
+        status, data = client.request('GET', path)
+        # Walk the whole list, then start over
+        state['cursor'] = data.get('nextCursor') if status == 200 and data else None
+        return status
+    if name == 'predict':
+        body = dict(_features(rng), patient_id=rng.choice(patient_ids))
+        status, _ = client.request('POST', '/api/heart-risk/predict', body)
+        return status
+    if name == 'stats':
+        status, _ = client.request('GET', '/api/heart-risk/stats/province')
+        return status
+    raise ValueError(f'Unknown scenario: {name}')
+
+
+def run_scenario(name, args, patient_ids, doctors):
+    counter = iter(range(args.requests))
+    counter_lock = threading.Lock()
+    samples, errors, statuses = [], [], {}
+    results_lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        client = Client(args.url, args.timeout)
+        if name != 'login':
+            client.login(BENCH_ADMIN, BENCH_PASSWORD)
+        state = {'doctors': doctors}
+        local_samples, local_errors, local_statuses = [], [], {}
+        while True:
+            with counter_lock:
+                if next(counter, None) is None:
+                    break
+            started = time.perf_counter()
+            try:
+                status = _scenario_step(name, client, rng, state, patient_ids)
+            except (OSError, http.client.HTTPException) as e:
+                local_errors.append(type(e).__name__)
+                continue
+            local_samples.append(time.perf_counter() - started)
+            local_statuses[status] = local_statuses.get(status, 0) + 1
+            if status >= 400:
+                local_errors.append(f'HTTP {status}')
+        client.close()
+        with results_lock:
+            samples.extend(local_samples)
+            errors.extend(local_errors)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    result = summarize(samples, wall)
+    result['errors'] = len(errors)
+    result['error_kinds'] = {kind: errors.count(kind) for kind in sorted(set(errors))}
+    result['statuses'] = {str(k): v for k, v in sorted(statuses.items())}
+    result['wall_s'] = round(wall, 2)
+    return result
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='HTTP load test of a running server')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=16, help='client threads (one connection each)')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario')
+    parser.add_argument('--scenarios', nargs='*', default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument('--doctors', type=int, default=20, help='doctor accounts created by seed.py (login scenario)')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='json_out', help='write the results to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = _parse_args(argv)
+    admin = Client(args.url, args.timeout)
+    admin.login(BENCH_ADMIN, BENCH_PASSWORD)
+    status, page = admin.request('GET', '/api/patients?pageSize=100&count=none')
+    if 'stats' in args.scenarios and admin.request('GET', '/api/heart-risk/stats/province')[0] == 404:
+        print('stats: skipped, the server has no /api/heart-risk/stats (asgi.py)', flush=True)
+        args.scenarios = [name for name in args.scenarios if name != 'stats']
+    admin.close()
+    patient_ids = [p['patient_id'] for p in (page or {}).get('data', [])] if status == 200 else []
+    if 'predict' in args.scenarios and not patient_ids:
+        raise RuntimeError('No patients to predict for, run benchmarks/seed.py first')
+
+    results = {}
+    for name in args.scenarios:
+        print(f'{name}: {args.requests} requests, concurrency {args.concurrency}', flush=True)
+        result = results[name] = run_scenario(name, args, patient_ids, args.doctors)
+        print(f'  {result.get("throughput_per_s", 0):8.1f} req/s  p50 {result.get("p50_ms", 0):8.2f} ms  '
+              f'p95 {result.get("p95_ms", 0):8.2f} ms  p99 {result.get("p99_ms", 0):8.2f} ms  '
+              f'errors {result["errors"]}', flush=True)
+
+    if args.json_out:
+        save_results(args.json_out, 'load', results, vars(args))
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
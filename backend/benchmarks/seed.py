@@ -0,0 +1,154 @@
+"""
+Seed a disposable database with synthetic benchmark data
+
+Creates one admin and --users doctors (password: bench-password), --patients
+patients spread over the doctors and provinces, and SCALE predictions over the
+last --days days, using the HeartRecords generator of scripts/import_data_sql.py.
+Rows carry natural keys: re-running the same command on the same day adds nothing.
+
+Usage:
+    python benchmarks/seed.py --scale 10k
+    python benchmarks/seed.py --scale 1m --patients 50000
+    python benchmarks/seed.py --reset             # remove the benchmark rows
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmarks/seed.py --scale 100k   # no MySQL needed
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from common import BENCH_ADMIN, BENCH_CITIZEN_PREFIX, BENCH_DOCTOR, BENCH_PASSWORD, parse_scale
+
+from werkzeug.security import generate_password_hash
+
+from app.database import CFG, Database, _get_conn, init_schema
+from app.hashing import normalize_method
+from scripts.import_data_sql import _patient_row, _record_row, _user_row, generate_synthetic_records, write_batch
+
+PROVINCES = ('Hà Nội', 'TP Hồ Chí Minh', 'Đà Nẵng', 'Hải Phòng', 'Cần Thơ', 'Huế', 'Nghệ An',
+             'Thanh Hóa', 'Khánh Hòa', 'Quảng Ninh', 'Bình Dương', 'Đồng Nai', 'Lâm Đồng', 'An Giang')
+
+
+def seed_users(conn, doctors):
+    """Admin + doctors sharing one password hash; returns the doctors' user ids"""
+    password_hash = generate_password_hash(BENCH_PASSWORD, normalize_method(CFG.PASSWORD_HASH_METHOD))
+    now = datetime.now()
+    users = [{'email': BENCH_ADMIN, 'password_hash': password_hash, 'full_name': 'Bench Admin', 'role': 'admin'}]
+    users += [{'email': BENCH_DOCTOR.format(i), 'password_hash': password_hash,
+               'full_name': f'Bench Doctor {i}', 'role': 'doctor'} for i in range(1, doctors + 1)]
+    write_batch(conn, 'users', [_user_row(u, now) for u in users])
+    conn.commit()
+    with conn.cursor() as cur:
+        cur.execute('SELECT user_id FROM users WHERE email LIKE %s ORDER BY user_id', ('bench-doctor-%',))
+        return [row['user_id'] for row in cur.fetchall()]
+
+
+def seed_patients(conn, count, doctor_ids, rng, batch_size):
+    """``count`` patients (citizen_id BENCH#########); returns their patient ids"""
+    now = datetime.now()
+    batch = []
+    for i in range(1, count + 1):
+        batch.append(_patient_row({
+            'citizen_id': f'{BENCH_CITIZEN_PREFIX}{i:09d}',
+            'full_name': f'Bệnh nhân {i}',
+            'gender': 'Nam' if rng.random() < 0.55 else 'Nữ',
+            'date_of_birth': date(1940, 1, 1) + timedelta(days=rng.randint(0, 60 * 365)),
+            'phone': f'09{rng.randint(0, 99999999):08d}',
+            'address': f'{rng.randint(1, 500)} Đường số {rng.randint(1, 60)}',
+            'province': rng.choice(PROVINCES),
+            'condition': rng.choice(('', 'Tăng huyết áp', 'Tiểu đường', 'Rối loạn mỡ máu')),
+            'created_by': rng.choice(doctor_ids) if doctor_ids else None,
+        }, now))
+        if len(batch) >= batch_size:
+            write_batch(conn, 'patients', batch)
+            conn.commit()
+            batch = []
+    if batch:
+        write_batch(conn, 'patients', batch)
+        conn.commit()
+    with conn.cursor() as cur:
+        cur.execute('SELECT patient_id FROM patients WHERE citizen_id LIKE %s ORDER BY patient_id',
+                    (BENCH_CITIZEN_PREFIX + '%',))
+        return [row['patient_id'] for row in cur.fetchall()]
+
+
+def seed_predictions(conn, count, patient_ids, rng, batch_size, days):
+    """``count`` synthetic predictions spread evenly over the ``days`` days before today"""
+    now = datetime.now()
+    # Anchored at midnight so a re-run produces the same rows (and import keys)
+    start = datetime.combine(date.today(), datetime.min.time()) - timedelta(days=days)
+    step = timedelta(days=days) / max(count, 1)
+    batch = []
+    written = 0
+    started = time.perf_counter()
+    records = generate_synthetic_records(count, start_date=start, patient_count=len(patient_ids), rng=rng)
+    for i, record in enumerate(records):
+        record['patient_id'] = patient_ids[record['patient_id'] - 1]
+        record['recorded_at'] = start + step * i
+        record['seed'] = i  # keeps import_key unique per position
+        batch.append(_record_row(record, now))
+        if len(batch) >= batch_size:
+            write_batch(conn, 'records', batch)
+            conn.commit()
+            written += len(batch)
+            batch = []
+            rate = written / (time.perf_counter() - started)
+            print(f'  predictions: {written:,}/{count:,} ({rate:,.0f} rows/s)', flush=True)
+    if batch:
+        write_batch(conn, 'records', batch)
+        conn.commit()
+        written += len(batch)
+    return written
+
+
+def reset(conn):
+    """Delete every benchmark row (predictions go with their patients)"""
+    with conn.cursor() as cur:
+        cur.execute('DELETE FROM patients WHERE citizen_id LIKE %s', (BENCH_CITIZEN_PREFIX + '%',))
+        patients = cur.rowcount
+        cur.execute('DELETE FROM users WHERE email LIKE %s', ('bench-%@example.com',))
+        users = cur.rowcount
+    conn.commit()
+    return {'patients': patients, 'users': users}
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Seed synthetic users, patients and predictions for benchmarks')
+    parser.add_argument('--scale', default='10k', help='number of predictions: 10k, 1m or a plain number')
+    parser.add_argument('--patients', type=int, default=None, help='patients (default: scale / 20, at least 50)')
+    parser.add_argument('--users', type=int, default=20, help='doctor accounts')
+    parser.add_argument('--days', type=int, default=730, help='spread the predictions over this many days')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42, help='random seed (same seed, same data)')
+    parser.add_argument('--reset', action='store_true', help='delete the benchmark rows instead of seeding')
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = _parse_args(argv)
+    init_schema()
+    conn = _get_conn()
+    try:
+        if args.reset:
+            print('Deleted:', reset(conn))
+        else:
+            rng = random.Random(args.seed)
+            scale = parse_scale(args.scale)
+            patients = args.patients or max(50, scale // 20)
+            started = time.perf_counter()
+            doctor_ids = seed_users(conn, args.users)
+            print(f'users: admin + {len(doctor_ids)} doctors')
+            patient_ids = seed_patients(conn, patients, doctor_ids, rng, args.batch_size)
+            print(f'patients: {len(patient_ids):,}')
+            written = seed_predictions(conn, scale, patient_ids, rng, args.batch_size, args.days)
+            print(f'predictions: {written:,} in {time.perf_counter() - started:.1f}s')
+    finally:
+        conn.close()
+    if CFG.ROLLUPS_ENABLED:
+        # Rows were written around Database.add_prediction
+        print('Rebuilt rollups:', Database.rebuild_rollups())
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,4 +1,6 @@
 -- Tạo database cho MySQL
+-- Schema khớp với các migration trong app/migrations (nguồn chuẩn).
+-- Có thể chạy `python -m app.migrations upgrade` thay cho script này.
 CREATE DATABASE IF NOT EXISTS HeartCareDB;
 USE HeartCareDB;
 
@@ -16,15 +18,21 @@ CREATE TABLE IF NOT EXISTS users (
 -- Tạo bảng patients
 CREATE TABLE IF NOT EXISTS patients (
     patient_id INT AUTO_INCREMENT PRIMARY KEY,
-    citizen_id VARCHAR(50) NOT NULL,
-    name VARCHAR(255) NOT NULL,
-    email VARCHAR(255),
-    phone VARCHAR(20),
-    date_of_birth DATE,
+    citizen_id VARCHAR(50),
+    full_name VARCHAR(255) NOT NULL,
     gender VARCHAR(10),
-    medical_history TEXT,
+    date_of_birth DATE,
+    phone VARCHAR(20),
+    address VARCHAR(255),
+    province VARCHAR(100),
+    `condition` TEXT,
     created_by INT,
-    created_at DATETIME
+    created_at DATETIME,
+    UNIQUE INDEX uq_patients_citizen_id (citizen_id),
+    INDEX idx_patients_created_by (created_by, patient_id),
+    INDEX idx_patients_province (province, patient_id),
+    CONSTRAINT fk_patients_created_by FOREIGN KEY (created_by)
+        REFERENCES users (user_id) ON DELETE SET NULL
 );
 
 -- Tạo bảng predictions
@@ -45,5 +53,63 @@ CREATE TABLE IF NOT EXISTS predictions (
     ca INT,
     thal INT,
     prediction INT,
-    prediction_date DATETIME
-);
\ No newline at end of file
+    prediction_date DATETIME,
+    import_key CHAR(40) NULL,
+    UNIQUE INDEX uq_predictions_import_key (import_key),
+    INDEX idx_predictions_patient_date (patient_id, prediction_date DESC),
+    INDEX idx_predictions_date (prediction_date),
+    CONSTRAINT fk_predictions_patient FOREIGN KEY (patient_id)
+        REFERENCES patients (patient_id) ON DELETE CASCADE
+);
+
+-- Token đã bị thu hồi (logout), khóa là SHA-256 của JWT
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    token_hash CHAR(64) NOT NULL PRIMARY KEY,
+    user_id INT NULL,
+    expires_at DATETIME NOT NULL,
+    revoked_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_revoked_tokens_expires (expires_at)
+);
+
+-- Rollup theo ngày / tháng của predictions (app/rollups.py), cập nhật cùng transaction với mỗi lần ghi
+CREATE TABLE IF NOT EXISTS prediction_rollup_daily (
+    period DATE NOT NULL,
+    province VARCHAR(100) NOT NULL DEFAULT '',
+    age_band SMALLINT NOT NULL,
+    sex TINYINT NOT NULL,
+    prediction TINYINT NOT NULL,
+    n INT NOT NULL DEFAULT 0,
+    sum_age DOUBLE NOT NULL DEFAULT 0,
+    n_age INT NOT NULL DEFAULT 0,
+    sum_trestbps DOUBLE NOT NULL DEFAULT 0,
+    n_trestbps INT NOT NULL DEFAULT 0,
+    sum_chol DOUBLE NOT NULL DEFAULT 0,
+    n_chol INT NOT NULL DEFAULT 0,
+    sum_thalach DOUBLE NOT NULL DEFAULT 0,
+    n_thalach INT NOT NULL DEFAULT 0,
+    sum_oldpeak DOUBLE NOT NULL DEFAULT 0,
+    n_oldpeak INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, province, age_band, sex, prediction),
+    INDEX idx_prediction_rollup_daily_province (province, period)
+);
+
+CREATE TABLE IF NOT EXISTS prediction_rollup_monthly (
+    period DATE NOT NULL,
+    province VARCHAR(100) NOT NULL DEFAULT '',
+    age_band SMALLINT NOT NULL,
+    sex TINYINT NOT NULL,
+    prediction TINYINT NOT NULL,
+    n INT NOT NULL DEFAULT 0,
+    sum_age DOUBLE NOT NULL DEFAULT 0,
+    n_age INT NOT NULL DEFAULT 0,
+    sum_trestbps DOUBLE NOT NULL DEFAULT 0,
+    n_trestbps INT NOT NULL DEFAULT 0,
+    sum_chol DOUBLE NOT NULL DEFAULT 0,
+    n_chol INT NOT NULL DEFAULT 0,
+    sum_thalach DOUBLE NOT NULL DEFAULT 0,
+    n_thalach INT NOT NULL DEFAULT 0,
+    sum_oldpeak DOUBLE NOT NULL DEFAULT 0,
+    n_oldpeak INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, province, age_band, sex, prediction),
+    INDEX idx_prediction_rollup_monthly_province (province, period)
+);
@@ -1,6 +1,14 @@
 -- Insert 300 synthetic UCI-style heart records (for local dev)
 -- Generated by assistant on 2025-12-07
 
+-- The patients the records below belong to (patient_id 1-5 on a fresh database)
+INSERT INTO Patients (patient_id, citizen_id, full_name, gender, date_of_birth, phone, address, province, `condition`) VALUES
+(1, '001085000001', 'Nguyễn Văn An', 'Nam', '1973-04-12', '0901000001', '12 Lý Thường Kiệt', 'Hà Nội', 'Tăng huyết áp'),
+(2, '079060000002', 'Trần Văn Bình', 'Nam', '1960-09-30', '0901000002', '45 Nguyễn Huệ', 'TP. Hồ Chí Minh', 'Đau thắt ngực'),
+(3, '048080000003', 'Lê Thị Cúc', 'Nữ', '1980-01-25', '0901000003', '8 Bạch Đằng', 'Đà Nẵng', NULL),
+(4, '031067000004', 'Phạm Văn Dũng', 'Nam', '1967-06-18', '0901000004', '21 Lạch Tray', 'Hải Phòng', 'Rối loạn mỡ máu'),
+(5, '092086000005', 'Hoàng Thị Em', 'Nữ', '1986-11-03', '0901000005', '3 Hòa Bình', 'Cần Thơ', NULL);
+
 INSERT INTO HeartRecords (patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, target, recorded_by, recorded_at) VALUES
 (1, 52, 'Nam', 2, 130, 250, 0, 1, 150, 0, 1.0, 1, 0, 2, 1, 2, '2025-11-01 09:00:00'),
 (1, 48, 'Nữ', 1, 120, 220, 0, 0, 177, 0, 0.0, 1, 0, 1, 0, 2, '2025-11-02 10:15:00'),
@@ -1,45 +1,343 @@
 """
-Script để huấn luyện và lưu ML model
-Chạy script này để tạo heart_risk_model.pkl
+Huấn luyện model dự đoán nguy cơ tim mạch từ bảng predictions
+
+Dữ liệu được đọc theo từng khối (--chunk-size) qua server-side cursor dưới dạng
+tuple, không tạo dict cho từng dòng, và ghi thẳng vào một ma trận float32 cấp
+phát một lần theo số dòng đếm trước. Một phần dữ liệu (--holdout) được tách ra
+theo hash của prediction_id để đánh giá. Model được huấn luyện trên mọi core
+(n_jobs=-1); mỗi cây chỉ học trên --max-samples dòng nên hàng triệu dòng vẫn
+vừa bộ nhớ và chạy trong vài phút.
+
+Kết quả là một artifact có version kèm metadata (thứ tự feature, metrics
+holdout, số dòng huấn luyện...):
+
+    models/artifacts/heart_risk_model-<version>.pkl
+    models/artifacts/heart_risk_model-<version>.json
+
+và được cài vào MODEL_PATH (thay file nguyên tử). Server đang chạy nạp model mới
+qua MODEL_RELOAD_INTERVAL, SIGHUP hoặc POST /api/heart-risk/model/reload.
+
+Nhãn là cột ``prediction``. Với dữ liệu import (HeartRecords,
+scripts/import_data_sql.py) đó là chẩn đoán thật. Với dự đoán tạo qua API đó là
+output của chính model, nên mặc định chỉ dùng dữ liệu import (--source imported).
+
+Usage:
+    python models/train_model.py
+    python models/train_model.py --holdout 0.2 --estimators 200 --max-samples 500000
+    python models/train_model.py --source all --since 2025-01-01 --no-install
 """
+import argparse
+import hashlib
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
 
 import joblib
 import numpy as np
+import sklearn
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-import os
+from sklearn.metrics import (accuracy_score, brier_score_loss, confusion_matrix, f1_score, log_loss,
+                             precision_score, recall_score, roc_auc_score)
+
+# Ensure backend root is on sys.path so `app` package is importable
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from config import get_config
+from app.database import _get_conn
+from app.inference import FEATURES
+from app.storage import backend
+from app.write_behind import KEY_PREFIX
+
+MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_DIR = os.path.join(MODELS_DIR, 'artifacts')
+ARTIFACT_NAME = 'heart_risk_model'
+# Leaves per tree targeted by the default --min-samples-leaf
+MAX_LEAVES = 5000
+
+
+def _where(source, since):
+    """WHERE clause and params selecting the labelled rows to train on"""
+    clauses = [f'{column} IS NOT NULL' for column in FEATURES + ('prediction',)]
+    params = []
+    if source == 'imported':
+        # Imported rows carry a digest of their source row; write-behind API rows a wb: key
+        clauses.append('import_key IS NOT NULL AND import_key NOT LIKE %s')
+        params.append(KEY_PREFIX + '%')
+    if since:
+        clauses.append('prediction_date >= %s')
+        params.append(since)
+    return ' AND '.join(clauses), params
+
+
+def count_rows(conn, source, since, limit):
+    """(rows to read, highest prediction_id among them); rows added later are left out"""
+    where, params = _where(source, since)
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT COUNT(*) AS n, MAX(prediction_id) AS max_id FROM predictions WHERE {where}', params)
+        row = cur.fetchone()
+    conn.commit()
+    n = int(row['n'] or 0)
+    return (min(n, limit) if limit else n), row['max_id']
+
+
+def iter_chunks(conn, source, since, max_id, limit, chunk_size):
+    """Yield (prediction_id, X, y) arrays of up to ``chunk_size`` rows, in id order, ``limit`` rows at most"""
+    where, params = _where(source, since)
+    sql = (f'SELECT prediction_id, {", ".join(FEATURES)}, prediction FROM predictions '
+           f'WHERE {where} AND prediction_id <= %s ORDER BY prediction_id LIMIT %s')
+    params += [max_id, limit]
+    cur = backend.server_cursor(conn, dicts=False)
+    try:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            # One C-level conversion per chunk; float64 keeps the ids exact
+            block = np.array(rows, dtype=np.float64)
+            yield block[:, 0].astype(np.int64), block[:, 1:-1], block[:, -1].astype(np.int8)
+    finally:
+        cur.close()
+    conn.commit()
+
+
+def holdout_mask(ids, fraction, seed):
+    """Rows whose hashed prediction_id falls in the holdout: stable across runs and
+    independent of the (time) order of the ids"""
+    if fraction <= 0:
+        return np.zeros(len(ids), dtype=bool)
+    with np.errstate(over='ignore'):
+        h = (ids.astype(np.uint64) + np.uint64(seed)) * np.uint64(0x9E3779B97F4A7C15)
+    return (h >> np.uint64(40)) < np.uint64(int(fraction * (1 << 24)))
+
+
+def load_matrix(conn, args):
+    """Stream the training rows into (X_train, y_train, X_holdout, y_holdout, info)"""
+    total, max_id = count_rows(conn, args.source, args.since, args.limit)
+    if not total:
+        raise SystemExit('No labelled rows to train on: import HeartRecords data first '
+                         '(scripts/import_data_sql.py) or use --source all')
+    # Training rows fill the buffer from the front, holdout rows from the back:
+    # both end up as contiguous views of a single allocation
+    X = np.empty((total, len(FEATURES)), dtype=np.float32)
+    y = np.empty(total, dtype=np.int8)
+    print(f'Loading {total:,} rows ({X.nbytes / 2 ** 20:,.0f} MiB float32)', flush=True)
+    train = 0
+    holdout = 0
+    report = step = max(total // 10, 1)
+    started = time.perf_counter()
+    # The buffer is sized by the COUNT: rows committed after it with an id <= max_id
+    # must not overflow it (LIMIT, and the check below), deleted ones leave it partly unused
+    for ids, X_chunk, y_chunk in iter_chunks(conn, args.source, args.since, max_id, total, args.chunk_size):
+        room = total - train - holdout
+        if len(ids) > room:
+            ids, X_chunk, y_chunk = ids[:room], X_chunk[:room], y_chunk[:room]
+        mask = holdout_mask(ids, args.holdout, args.seed)
+        n_hold = int(mask.sum())
+        n_train = len(ids) - n_hold
+        X[train:train + n_train] = X_chunk[~mask]
+        y[train:train + n_train] = y_chunk[~mask]
+        train += n_train
+        if n_hold:
+            X[total - holdout - n_hold:total - holdout] = X_chunk[mask]
+            y[total - holdout - n_hold:total - holdout] = y_chunk[mask]
+            holdout += n_hold
+        read = train + holdout
+        if read >= report:
+            rate = read / max(time.perf_counter() - started, 1e-9)
+            print(f'  {read:,}/{total:,} rows ({rate:,.0f} rows/s)', flush=True)
+            report += step
+        if read == total:
+            break
+    info = {
+        'rows': train + holdout,
+        'training_rows': train,
+        'holdout_rows': holdout,
+        'max_prediction_id': max_id,
+        'load_s': round(time.perf_counter() - started, 2),
+    }
+    return X[:train], y[:train], X[total - holdout:], y[total - holdout:], info
+
+
+def build_model(args, n_train):
+    max_samples = args.max_samples if args.max_samples and args.max_samples < n_train else None
+    # Each tree sees a bootstrap sample of at most max_samples rows and has at most
+    # about MAX_LEAVES leaves: bounds fit time, memory, artifact size and latency
+    min_samples_leaf = args.min_samples_leaf or max(1, (max_samples or n_train) // MAX_LEAVES)
+    return RandomForestClassifier(
+        n_estimators=args.estimators,
+        max_depth=args.max_depth,
+        min_samples_leaf=min_samples_leaf,
+        max_samples=max_samples,
+        class_weight=args.class_weight,
+        n_jobs=-1,
+        random_state=args.seed,
+    )
+
 
-def train_heart_risk_model():
-    """Train and save heart risk prediction model"""
-    
-    # Sample training data (thay thế bằng data thực tế)
-    # Features: age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal
-    X_train = np.array([
-        [63, 1, 3, 145, 233, 1, 0, 150, 0, 2.3, 0, 0, 1],
-        [37, 1, 2, 130, 250, 0, 1, 187, 0, 3.5, 0, 0, 2],
-        [41, 0, 1, 130, 204, 0, 0, 172, 0, 1.4, 2, 0, 2],
-        [56, 1, 1, 120, 236, 0, 1, 178, 0, 0.8, 2, 0, 2],
-        [57, 0, 0, 120, 354, 0, 1, 163, 1, 0.6, 2, 0, 2],
-        [57, 1, 0, 140, 260, 1, 0, 140, 0, 2.6, 1, 0, 2],
-        [56, 0, 0, 140, 294, 0, 0, 153, 0, 1.3, 1, 0, 2],
-        [44, 1, 1, 120, 263, 0, 1, 173, 0, 0.0, 2, 0, 2],
-        [52, 1, 2, 172, 199, 1, 1, 162, 0, 5.4, 0, 0, 3],
-        [57, 1, 2, 150, 168, 0, 1, 174, 0, 1.6, 2, 0, 2],
-    ])
-    
-    # Labels: 0 = Low risk, 1 = High risk
-    y_train = np.array([1, 1, 0, 1, 1, 1, 1, 0, 1, 1])
-    
-    # Train model
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+def predict_positive(model, X, chunk_size):
+    """P(class 1) for each row, scored in chunks to bound the temporary arrays"""
+    positive = list(model.classes_).index(1)
+    out = np.empty(len(X), dtype=np.float64)
+    for start in range(0, len(X), chunk_size):
+        out[start:start + chunk_size] = model.predict_proba(X[start:start + chunk_size])[:, positive]
+    return out
+
+
+def evaluate(model, X, y, threshold, chunk_size):
+    """Holdout metrics at the serving threshold (MODEL_THRESHOLD)"""
+    if not len(y):
+        return None
+    proba = predict_positive(model, X, chunk_size)
+    predicted = (proba >= threshold).astype(np.int8)
+    tn, fp, fn, tp = confusion_matrix(y, predicted, labels=[0, 1]).ravel()
+    metrics = {
+        'rows': int(len(y)),
+        'positive_rate': round(float(y.mean()), 4),
+        'threshold': threshold,
+        'accuracy': round(float(accuracy_score(y, predicted)), 4),
+        'precision': round(float(precision_score(y, predicted, zero_division=0)), 4),
+        'recall': round(float(recall_score(y, predicted, zero_division=0)), 4),
+        'f1': round(float(f1_score(y, predicted, zero_division=0)), 4),
+        'roc_auc': None,
+        'log_loss': round(float(log_loss(y, proba, labels=[0, 1])), 4),
+        'brier': round(float(brier_score_loss(y, proba)), 4),
+        'confusion_matrix': {'tn': int(tn), 'fp': int(fp), 'fn': int(fn), 'tp': int(tp)},
+    }
+    if 0 < y.sum() < len(y):
+        metrics['roc_auc'] = round(float(roc_auc_score(y, proba)), 4)
+    return metrics
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _json_params(params):
+    return {k: v if v is None or isinstance(v, (bool, int, float, str)) else repr(v) for k, v in params.items()}
+
+
+def save_artifact(model, metadata, directory):
+    """Write <name>-<version>.pkl and its .json metadata; returns both paths"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{ARTIFACT_NAME}-{metadata["version"]}.pkl')
+    # Uncompressed: the server memory-maps the tree arrays (MODEL_MMAP)
+    joblib.dump(model, path)
+    metadata['artifact'] = {
+        'file': os.path.basename(path),
+        'sha256': _sha256(path),
+        'size_bytes': os.path.getsize(path),
+    }
+    metadata_path = os.path.splitext(path)[0] + '.json'
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    return path, metadata_path
+
+
+def _replace(src, dst):
+    tmp = f'{dst}.tmp-{os.getpid()}'
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def install(path, metadata_path, model_path):
+    """Atomically make ``path`` the served model (MODEL_PATH, with its .json next to it)"""
+    os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+    # Metadata first: a reload triggered by the new .pkl then finds the matching one
+    _replace(metadata_path, os.path.splitext(model_path)[0] + '.json')
+    _replace(path, model_path)
+
+
+def train(args):
+    cfg = get_config()
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    conn = _get_conn()
+    try:
+        X_train, y_train, X_holdout, y_holdout, data = load_matrix(conn, args)
+    finally:
+        conn.close()
+    if len(np.unique(y_train)) < 2:
+        raise SystemExit('The training rows have a single label, nothing to learn')
+
+    model = build_model(args, len(y_train))
+    print(f'Training {type(model).__name__} on {len(y_train):,} rows, '
+          f'{args.estimators} trees, max {model.max_samples or len(y_train):,} rows per tree, '
+          f'min {model.min_samples_leaf} rows per leaf', flush=True)
+    started = time.perf_counter()
     model.fit(X_train, y_train)
-    
-    # Save model
-    model_path = os.path.join(os.path.dirname(__file__), 'heart_risk_model.pkl')
-    joblib.dump(model, model_path)
-    print(f"Model saved to {model_path}")
-    
-    return model
+    fit_s = round(time.perf_counter() - started, 2)
+
+    started = time.perf_counter()
+    holdout = evaluate(model, X_holdout, y_holdout, cfg.MODEL_THRESHOLD, args.chunk_size)
+    evaluate_s = round(time.perf_counter() - started, 2)
+    if holdout:
+        print('Holdout: ' + ', '.join(f'{k} {holdout[k]}' for k in ('rows', 'accuracy', 'precision', 'recall', 'f1', 'roc_auc')))
+
+    load_s = data.pop('load_s')
+    metadata = {
+        'version': version,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'model': {'kind': type(model).__name__, 'params': _json_params(model.get_params())},
+        # Column order the model expects; checked by the server when it loads the artifact
+        'features': list(FEATURES),
+        'classes': [int(c) for c in model.classes_],
+        'threshold': cfg.MODEL_THRESHOLD,
+        'data': dict(data, source=args.source, since=args.since, limit=args.limit, backend=backend.name,
+                     holdout_fraction=args.holdout, seed=args.seed,
+                     positive_rate=round(float(y_train.mean()), 4)),
+        'metrics': {'holdout': holdout},
+        'timings_s': {'load': load_s, 'fit': fit_s, 'evaluate': evaluate_s},
+        'versions': {'python': platform.python_version(), 'numpy': np.__version__, 'sklearn': sklearn.__version__},
+    }
+    path, metadata_path = save_artifact(model, metadata, args.output)
+    print(f'Model saved to {path}')
+    if args.install:
+        install(path, metadata_path, args.model_path or cfg.MODEL_PATH)
+        print(f'Installed as {args.model_path or cfg.MODEL_PATH}')
+    return model, metadata
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Train the heart risk model from the predictions table')
+    parser.add_argument('--source', choices=('imported', 'all'), default='imported',
+                        help='imported: HeartRecords rows only (real labels); all: also API predictions')
+    parser.add_argument('--since', help='only rows with prediction_date >= this date (YYYY-MM-DD)')
+    parser.add_argument('--limit', type=int, default=None, help='at most this many rows (oldest first)')
+    parser.add_argument('--holdout', type=float, default=0.2, help='fraction of rows held out for evaluation')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='rows fetched per round trip')
+    parser.add_argument('--estimators', type=int, default=100)
+    parser.add_argument('--max-depth', type=int, default=None)
+    parser.add_argument('--min-samples-leaf', type=int, default=None,
+                        help=f'default: rows per tree / {MAX_LEAVES}, at least 1')
+    parser.add_argument('--max-samples', type=int, default=200000, help='bootstrap rows per tree (0 = all)')
+    parser.add_argument('--class-weight', choices=('balanced', 'balanced_subsample'), default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=ARTIFACT_DIR, help='directory of the versioned artifacts')
+    parser.add_argument('--model-path', help='install location (default: MODEL_PATH)')
+    parser.add_argument('--no-install', dest='install', action='store_false',
+                        help='only write the versioned artifact, keep serving the current model')
+    args = parser.parse_args(argv)
+    if not 0 <= args.holdout < 1:
+        parser.error('--holdout must be in [0, 1)')
+    if args.since:
+        try:
+            datetime.strptime(args.since, '%Y-%m-%d')
+        except ValueError:
+            parser.error('--since must be a date (YYYY-MM-DD)')
+    return args
+
+
+def train_heart_risk_model(argv=None):
+    """Train, evaluate and save the heart risk prediction model"""
+    return train(_parse_args(argv))
+
 
 if __name__ == '__main__':
-    train_heart_risk_model()
+    train_heart_risk_model(sys.argv[1:])
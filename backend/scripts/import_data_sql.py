@@ -1,270 +1,732 @@
-import re
+"""
+Import dữ liệu từ các file .sql (INSERT INTO ... VALUES ...) vào MySQL (hoặc SQLite, theo DATABASE_URL).
+
+File được đọc theo từng khối và parse tuple-by-tuple (không nạp cả file vào
+bộ nhớ); các dòng được ghi theo lô bằng executemany hoặc LOAD DATA LOCAL
+INFILE, commit sau mỗi --commit-every dòng.
+
+Mọi bảng đều được upsert theo khóa tự nhiên (users.email, patients.citizen_id,
+predictions.import_key) nên chạy lại nhiều lần không tạo bản ghi trùng.
+patient_id trong HeartRecords là id của file nguồn: nếu bảng Patients nguồn có
+cột patient_id, bản ghi được trỏ lại tới bệnh nhân tương ứng qua citizen_id.
+
+Usage:
+    python scripts/import_data_sql.py                  # data.sql + backend/data/*.sql
+    python scripts/import_data_sql.py a.sql b.sql --batch-size 10000 --load-data
+    python scripts/import_data_sql.py big/*.sql --parallel --workers 8 --writers 4
+"""
+import argparse
+import codecs
+import hashlib
+import io
+import mmap
 import os
+import queue
+import random
+import re
 import sys
-import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
 # Ensure backend root is on sys.path so `app` package is importable
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app.database import DB_PATH, _get_conn
+import pymysql
+from app.database import CFG, Database, _get_conn
+from app.storage import backend
 
 SQL_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'data.sql'))
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
+
+SYNTHETIC_MARKER = 'Following entries are synthetic to reach 300 rows'
+SYNTHETIC_TARGET = 300
+
+READ_SIZE = 1 << 20
+
 
 def unquote(s):
     s = s.strip()
-    if s.upper() == 'NULL':
-        return None
+    first = s[:1]
     # remove leading N for NVARCHAR literals like N'Name'
-    if s.startswith("N'") or s.startswith("n'"):
-        s = s[2:]
-    if s.startswith("'") and s.endswith("'"):
+    if first in ('N', 'n') and s[1:2] == "'":
+        s = s[1:]
+        first = "'"
+    if first == "'" and len(s) >= 2 and s.endswith("'"):
         # Unescape single quotes
-        inner = s[1:-1].replace("''", "'")
-        return inner
+        inner = s[1:-1]
+        return inner.replace("''", "'") if "''" in inner else inner
+    if s.upper() == 'NULL':
+        return None
     # numeric
     try:
         if '.' in s:
             return float(s)
         return int(s)
-    except Exception:
+    except ValueError:
         return s
 
 
-def parse_insert_values(values_block):
-    # values_block contains e.g. (1, 2, 'a'),(3,4,'b') or with newlines
-    tuples = []
-    # normalize
-    vb = values_block.strip()
-    # Remove starting VALUES if present
-    if vb.upper().startswith('VALUES'):
-        vb = vb[6:]
-    # We need to split by '),(' but keep parentheses balanced for safety
-    parts = []
-    cur = ''
-    depth = 0
-    i=0
-    while i < len(vb):
-        ch = vb[i]
-        cur += ch
-        if ch == '(':
-            depth += 1
-        elif ch == ')':
-            depth -= 1
-            if depth == 0:
-                parts.append(cur.strip())
-                cur = ''
-                # skip comma and spaces after )
-                j = i+1
-                while j < len(vb) and vb[j] in ', \n\r\t':
-                    j += 1
-                i = j-1
-        i += 1
-    for p in parts:
-        # p like '(1, 2, ''text'')'
-        inner = p.strip()[1:-1]
-        # split by commas but ignoring commas inside quotes
-        vals = []
-        cur = ''
-        in_quote = False
-        qchar = ""
-        j=0
-        while j < len(inner):
-            c = inner[j]
-            if c in "\"'":
-                if not in_quote:
-                    in_quote = True
-                    qchar = c
-                    cur += c
-                else:
-                    # may be escaped by doubling
-                    if j+1 < len(inner) and inner[j+1] == c:
-                        cur += c+c
-                        j += 1
-                    elif c == qchar:
-                        in_quote = False
-                        cur += c
-                    else:
-                        cur += c
-            elif c == ',' and not in_quote:
-                vals.append(cur.strip())
-                cur = ''
-            else:
-                cur += c
-            j += 1
-        if cur != '':
-            vals.append(cur.strip())
-        tuples.append([unquote(v) for v in vals])
-    return tuples
+def sex_to_int(sex):
+    # map 'Nam'/'Nữ' to 1/0 or keep as provided; predictions table sex column defined as integer earlier
+    if sex is None:
+        return None
+    s = str(sex).strip().lower()
+    if s in ("nam", "male"):
+        return 1
+    if s in ("nữ", "nu", "female"):
+        return 0
+    try:
+        return int(sex)
+    except Exception:
+        return sex
 
 
-def import_data():
-    conn = _get_conn()
-    cur = conn.cursor()
+# --------------------------------------------------------------------------- #
+# Streaming tokenizer
+# --------------------------------------------------------------------------- #
 
-    inserted = {'users':0,'patients':0,'records':0}
+# A literal: quoted string (with '' escapes, optional N prefix) or a bare token
+_VALUE = r"(?:[Nn]?'[^']*(?:''[^']*)*'|[^,()'\s]+)"
+_VALUE_RE = re.compile(_VALUE)
+_TUPLE_RE = re.compile(r"\(\s*(" + _VALUE + r"(?:\s*,\s*" + _VALUE + r")*)\s*\)")
+_HEADER_RE = re.compile(r"INSERT\s+INTO\s+[`\[]?(\w+)[`\]]?\s*\(([^)]*)\)\s*VALUES\s*", re.IGNORECASE)
+# Whatever may sit between two tuples: whitespace, commas, comments
+_SEPARATOR_RE = re.compile(r"(?:\s+|,|--[^\n]*\n|/\*.*?\*/)+", re.DOTALL)
+_STATEMENT_END_RE = re.compile(r";|GO\b|INSERT\b", re.IGNORECASE)
 
-    # Helper to process SQL content (may contain multiple GO-separated blocks)
-    def process_content(content):
-        blocks = re.split(r"\nGO\s*\n", content, flags=re.IGNORECASE)
-        for blk in blocks:
-            blk = blk.strip()
-            if not blk:
+
+class InsertTokenizer:
+    """Incrementally parse ``INSERT INTO t (cols) VALUES (...), (...);`` statements.
+
+    Reads ``fh`` (a binary file) ``READ_SIZE`` bytes at a time and yields
+    ``(table, columns, values)`` for every tuple, so memory use is bounded by
+    the longest single tuple rather than by the file size. Everything that is
+    not an INSERT (CREATE TABLE, comments, GO, ...) is skipped.
+    """
+
+    def __init__(self, fh, read_size=READ_SIZE):
+        self.fh = fh
+        self.read_size = read_size
+        self.bytes_read = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """Append the next chunk to the buffer; False once the file is exhausted"""
+        if self._eof:
+            return False
+        data = self.fh.read(self.read_size)
+        self.bytes_read += len(data)
+        # Drop the consumed prefix so the buffer never grows with the file
+        self._buf = self._buf[self._pos:] + self._decoder.decode(data, final=not data)
+        self._pos = 0
+        if not data:
+            # Terminate a trailing "-- comment" that has no newline
+            self._buf += '\n'
+            self._eof = True
+        return True
+
+    def __iter__(self):
+        table = None
+        columns = None
+        while True:
+            buf, pos = self._buf, self._pos
+
+            if table is None:
+                m = _HEADER_RE.search(buf, pos)
+                if m:
+                    table = m.group(1)
+                    columns = [c.strip().strip('`[]') for c in m.group(2).split(',')]
+                    self._pos = m.end()
+                    continue
+                # Keep a tail in case a header straddles the chunk boundary
+                self._pos = max(pos, len(buf) - 512)
+                if not self._fill():
+                    return
                 continue
-            m = re.search(r"INSERT\s+INTO\s+(\w+)\s*\(([^)]+)\)\s*VALUES\s*(.+);", blk, flags=re.IGNORECASE | re.DOTALL)
-            if not m:
+
+            m = _SEPARATOR_RE.match(buf, pos)
+            if m:
+                pos = self._pos = m.end()
+            if pos >= len(buf):
+                if not self._fill():
+                    return
                 continue
-            table = m.group(1)
-            cols = [c.strip() for c in m.group(2).split(',')]
-            values_block = m.group(3)
-            tuples = parse_insert_values(values_block)
-            # For each tuple, build insert into sqlite
-            for t in tuples:
-                # map columns to values
-                row = dict(zip(cols, t))
-                if table.lower() == 'users':
-                    # email, password_hash, full_name, role, phone
-                    email = row.get('email')
-                    password = row.get('password_hash')
-                    full_name = row.get('full_name')
-                    role = row.get('role')
-                    phone = row.get('phone')
-                    cur.execute('INSERT OR IGNORE INTO users (email, password_hash, full_name, role, phone, created_at) VALUES (?, ?, ?, ?, ?, ?)',
-                                (email, password, full_name, role, phone, datetime_now()))
-                    inserted['users'] += 1
-                elif table.lower() == 'patients':
-                    # columns include citizen_id, full_name, gender, date_of_birth, phone, address, created_by
-                    citizen_id = row.get('citizen_id')
-                    name = row.get('full_name') or row.get('name')
-                    phone = row.get('phone')
-                    dob = row.get('date_of_birth')
-                    gender = row.get('gender')
-                    address = row.get('address')
-                    province = row.get('province')
-                    condition = row.get('condition')
-                    created_by = row.get('created_by')
-                    # store address in medical_history field
-                    cur.execute('INSERT INTO patients (citizen_id, name, gender, date_of_birth, phone, address, province, condition, created_by, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
-                                (citizen_id, name, gender, dob, phone, address, province, condition, created_by, datetime_now()))
-                    inserted['patients'] += 1
-                elif table.lower() == 'heartrecords':
-                    # two variants: with or without recorded_at
-                    # columns: patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, target, recorded_by [, recorded_at]
-                    patient_id = row.get('patient_id')
-                    age = row.get('age')
-                    sex = row.get('sex')
-                    cp = row.get('cp')
-                    trestbps = row.get('trestbps')
-                    chol = row.get('chol')
-                    fbs = row.get('fbs')
-                    restecg = row.get('restecg')
-                    thalach = row.get('thalach')
-                    exang = row.get('exang')
-                    oldpeak = row.get('oldpeak')
-                    slope = row.get('slope')
-                    ca = row.get('ca')
-                    thal = row.get('thal')
-                    target = row.get('target')
-                    recorded_by = row.get('recorded_by')
-                    recorded_at = row.get('recorded_at') if 'recorded_at' in row else None
-
-                    if recorded_at:
-                        cur.execute('''INSERT INTO predictions (patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction, prediction_date)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                                    (patient_id, age, sex_to_int(sex), cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, target, recorded_at))
-                    else:
-                        cur.execute('''INSERT INTO predictions (patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, prediction, prediction_date)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                                    (patient_id, age, sex_to_int(sex), cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, target, datetime_now()))
-                    inserted['records'] += 1
-
-    # First import main data.sql if present
-    if os.path.exists(SQL_FILE):
-        print('Reading', SQL_FILE)
-        with open(SQL_FILE, 'r', encoding='utf-8') as f:
-            content = f.read()
-        process_content(content)
-
-    # Then import any SQL files under backend/data/
-    data_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
-    if os.path.isdir(data_dir):
-        for fname in os.listdir(data_dir):
-            if not fname.lower().endswith('.sql'):
+
+            if buf[pos] == '(':
+                m = _TUPLE_RE.match(buf, pos)
+                if m is None:
+                    # Tuple continues in the next chunk
+                    if not self._fill():
+                        raise ValueError(f'Unterminated tuple in INSERT INTO {table}')
+                    continue
+                self._pos = m.end()
+                yield table, columns, [unquote(v) for v in _VALUE_RE.findall(m.group(1))]
                 continue
-            path = os.path.join(data_dir, fname)
-            print('Reading', path)
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            # If this is the assistant-generated insert_heart_records.sql with a marker,
-            # generate additional synthetic rows to reach 300 records total.
-            if 'Following entries are synthetic to reach 300 rows' in content:
-                # count existing tuples in the first INSERT in the file
-                m = re.search(r"INSERT\s+INTO\s+HeartRecords\s*\(([^)]+)\)\s*VALUES\s*(.+);", content, flags=re.IGNORECASE | re.DOTALL)
-                existing = 0
-                if m:
-                    vals_block = m.group(2)
-                    parts = parse_insert_values(vals_block)
-                    existing = len(parts)
-                needed = max(0, 300 - existing)
-                if needed > 0:
-                    # generate `needed` synthetic tuples
-                    import random
-                    from datetime import datetime, timedelta
-                    start_date = datetime(2025, 11, 1, 8, 0, 0)
-                    tuples = []
-                    for i in range(needed):
-                        pid = (i % 5) + 1
-                        age = random.randint(30, 80)
-                        sex = "'Nam'" if random.random() < 0.6 else "'Nữ'"
-                        cp = random.randint(0,3)
-                        trestbps = random.randint(100,160)
-                        chol = random.randint(150,320)
-                        fbs = random.choice([0,0,1])
-                        restecg = random.randint(0,2)
-                        thalach = random.randint(90,190)
-                        exang = random.choice([0,1])
-                        oldpeak = round(random.uniform(0,4),1)
-                        slope = random.randint(0,2)
-                        ca = random.randint(0,3)
-                        thal = random.randint(0,3)
-                        target = random.choice([0,0,1])
-                        recorded_by = 2
-                        dt = start_date + timedelta(days=i)
-                        recorded_at = dt.strftime("'%Y-%m-%d %H:%M:%S'")
-                        tup = f"({pid}, {age}, {sex}, {cp}, {trestbps}, {chol}, {fbs}, {restecg}, {thalach}, {exang}, {oldpeak}, {slope}, {ca}, {thal}, {target}, {recorded_by}, {recorded_at})"
-                        tuples.append(tup)
-                    # append generated tuples to the existing INSERT statement before the final semicolon
-                    content = content.rstrip().rstrip(';') + ',\n' + ',\n'.join(tuples) + ';\n'
-
-            process_content(content)
-
-    conn.commit()
-    conn.close()
-    print('Inserted:', inserted)
-
-
-def datetime_now():
-    from datetime import datetime
-    return datetime.now().isoformat()
 
+            end = _STATEMENT_END_RE.match(buf, pos)
+            if end:
+                if end.group(0) == ';':
+                    self._pos = end.end()
+                table = None
+                continue
+            # Possibly a comment or keyword cut by the chunk boundary: read more
+            if len(buf) - pos < max(self.read_size, 65536) and self._fill():
+                continue
+            raise ValueError(f'Unexpected input in INSERT INTO {table}: {buf[pos:pos + 40]!r}')
 
-def sex_to_int(sex):
-    # map 'Nam'/'Nữ' to 1/0 or keep as provided; predictions table sex column defined as integer earlier
-    if sex is None:
+
+# --------------------------------------------------------------------------- #
+# Row mapping: source table -> target table
+# --------------------------------------------------------------------------- #
+
+def _user_row(row, now):
+    return (row.get('email'), row.get('password_hash'), row.get('full_name'),
+            row.get('role'), row.get('phone'), now)
+
+
+def _patient_row(row, now):
+    return (row.get('citizen_id'), row.get('full_name') or row.get('name'), row.get('gender'),
+            row.get('date_of_birth'), row.get('phone'), row.get('address'), row.get('province'),
+            row.get('condition'), row.get('created_by'), now)
+
+
+def _record_row(row, now):
+    # columns: patient_id, age, sex, cp, trestbps, chol, fbs, restecg, thalach, exang, oldpeak, slope, ca, thal, target, recorded_by [, recorded_at]
+    return (row.get('patient_id'), row.get('age'), sex_to_int(row.get('sex')), row.get('cp'),
+            row.get('trestbps'), row.get('chol'), row.get('fbs'), row.get('restecg'), row.get('thalach'),
+            row.get('exang'), row.get('oldpeak'), row.get('slope'), row.get('ca'), row.get('thal'),
+            row.get('target', row.get('prediction')),
+            row.get('recorded_at') or row.get('prediction_date') or now,
+            import_key(row))
+
+
+def import_key(row):
+    """Digest of a source row; re-importing the same row hits the UNIQUE import_key"""
+    return hashlib.sha1(repr(sorted(row.items())).encode('utf-8')).hexdigest()
+
+
+def source_patient_key(row):
+    """(source patient id, citizen_id) of a source Patients row, or None.
+
+    HeartRecords point at the *source* id; patients get their own
+    AUTO_INCREMENT id here, so records are re-pointed through citizen_id.
+    """
+    source_id = row.get('patient_id', row.get('id'))
+    if source_id is None or row.get('citizen_id') is None:
         return None
-    s = str(sex).strip().lower()
-    if s in ("nam", "male", "Male"):
-        return 1
-    if s in ("nữ", "nu", "female", "Female"):
-        return 0
+    return source_id, row['citizen_id']
+
+
+def resolve_patient_ids(conn, source_keys, chunk=1000):
+    """Map ``{source id: citizen_id}`` to ``{source id: patients.patient_id}``"""
+    citizens = list(set(source_keys.values()))
+    by_citizen = {}
+    with conn.cursor() as cur:
+        for i in range(0, len(citizens), chunk):
+            part = citizens[i:i + chunk]
+            cur.execute(f"SELECT citizen_id, patient_id FROM patients WHERE citizen_id IN ({', '.join(['%s'] * len(part))})",
+                        part)
+            by_citizen.update((r['citizen_id'], r['patient_id']) for r in cur.fetchall())
+    return {src: by_citizen[c] for src, c in source_keys.items() if c in by_citizen}
+
+
+def remap_records(rows, patient_ids):
+    """Re-point mapped record rows at the database patient ids; unknown source ids are kept as-is"""
+    if not patient_ids:
+        return rows
+    return [(patient_ids.get(r[0], r[0]),) + tuple(r[1:]) for r in rows]
+
+
+# Parents are written before children so foreign keys always resolve
+TABLE_ORDER = ['users', 'patients', 'records']
+
+# source table (lower case) -> (label, target table, target columns, mapper, columns updated on a natural-key hit)
+# Natural keys: users.email, patients.citizen_id, predictions.import_key (migration 0005)
+TABLES = {
+    'users': ('users', 'users',
+              ['email', 'password_hash', 'full_name', 'role', 'phone', 'created_at'],
+              _user_row, ['password_hash', 'full_name', 'role', 'phone']),
+    'patients': ('patients', 'patients',
+                 ['citizen_id', 'full_name', 'gender', 'date_of_birth', 'phone', 'address',
+                  'province', 'condition', 'created_by', 'created_at'],
+                 _patient_row, ['full_name', 'gender', 'date_of_birth', 'phone', 'address',
+                                'province', 'condition', 'created_by']),
+    'heartrecords': ('records', 'predictions',
+                     ['patient_id', 'age', 'sex', 'cp', 'trestbps', 'chol', 'fbs', 'restecg', 'thalach',
+                      'exang', 'oldpeak', 'slope', 'ca', 'thal', 'prediction', 'prediction_date', 'import_key'],
+                     _record_row, []),
+}
+TABLES['predictions'] = TABLES['heartrecords']
+LABELS = {spec[0]: spec for spec in TABLES.values()}
+NATURAL_KEYS = {'users': ['email'], 'patients': ['citizen_id'], 'predictions': ['import_key']}
+
+
+def _upsert_sql(target, columns, update):
+    cols = ', '.join(f'`{c}`' for c in columns)
+    marks = ', '.join(['%s'] * len(columns))
+    if not update:
+        return f"{backend.insert_ignore} INTO {target} ({cols}) VALUES ({marks})"
+    sets = ', '.join(f'`{c}` = {backend.excluded(f"`{c}`")}' for c in update)
+    return f"INSERT INTO {target} ({cols}) VALUES ({marks}) {backend.on_conflict_update(NATURAL_KEYS[target])} {sets}"
+
+
+def generate_synthetic_records(count, start_date=None, patient_count=5, recorded_by=2, rng=None):
+    """Yield ``count`` random UCI-style HeartRecords rows as dicts"""
+    rng = rng or random
+    start_date = start_date or datetime(2025, 11, 1, 8, 0, 0)
+    for i in range(count):
+        yield {
+            'patient_id': (i % patient_count) + 1,
+            'age': rng.randint(30, 80),
+            'sex': 'Nam' if rng.random() < 0.6 else 'Nữ',
+            'cp': rng.randint(0, 3),
+            'trestbps': rng.randint(100, 160),
+            'chol': rng.randint(150, 320),
+            'fbs': rng.choice([0, 0, 1]),
+            'restecg': rng.randint(0, 2),
+            'thalach': rng.randint(90, 190),
+            'exang': rng.choice([0, 1]),
+            'oldpeak': round(rng.uniform(0, 4), 1),
+            'slope': rng.randint(0, 2),
+            'ca': rng.randint(0, 3),
+            'thal': rng.randint(0, 3),
+            'target': rng.choice([0, 0, 1]),
+            'recorded_by': recorded_by,
+            'recorded_at': (start_date + timedelta(days=i)).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+
+# --------------------------------------------------------------------------- #
+# Bulk writer
+# --------------------------------------------------------------------------- #
+
+def _tsv_field(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        value = value.strftime('%Y-%m-%d %H:%M:%S')
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def write_batch(conn, label, rows, load_data=False):
+    """Upsert mapped ``rows`` of one table (by TABLE_ORDER label); does not commit"""
+    _, target, columns, _, update = LABELS[label]
+    with conn.cursor() as cur:
+        if load_data:
+            _load_data(cur, target, columns, rows)
+        else:
+            cur.executemany(_upsert_sql(target, columns, update), rows)
+
+
+def _load_data(cur, target, columns, rows):
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.tsv', delete=False) as tmp:
+        for row in rows:
+            tmp.write('\t'.join(_tsv_field(v) for v in row))
+            tmp.write('\n')
     try:
-        return int(sex)
+        cols = ', '.join(f'`{c}`' for c in columns)
+        # IGNORE skips rows whose natural key already exists (REPLACE would
+        # delete + re-insert and cascade-delete predictions)
+        cur.execute(
+            f"LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE {target} "
+            f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+            f"LINES TERMINATED BY '\\n' ({cols})",
+            (tmp.name,)
+        )
+    finally:
+        os.unlink(tmp.name)
+
+
+class BulkWriter:
+    """Buffers mapped rows per target table and writes them in batches"""
+
+    def __init__(self, conn, batch_size=5000, commit_every=50000, load_data=False, progress=None):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.commit_every = commit_every
+        self.load_data = load_data
+        self.progress = progress
+        self.inserted = {}
+        self.patient_ids = {}
+        self._pending_patients = {}
+        self._buffers = {}
+        self._uncommitted = 0
+
+    def add(self, source_table, row, now):
+        spec = TABLES.get(source_table.lower())
+        if spec is None:
+            return False
+        if spec[0] == 'patients':
+            key = source_patient_key(row)
+            if key:
+                self._pending_patients[key[0]] = key[1]
+        buf = self._buffers.setdefault(spec[0], [])
+        buf.append(spec[3](row, now))
+        if len(buf) >= self.batch_size:
+            self.flush(spec[0])
+        return True
+
+    def flush(self, label=None):
+        if label:
+            # Buffered parent rows go out first (users -> patients -> records)
+            keys = TABLE_ORDER[:TABLE_ORDER.index(label) + 1]
+        else:
+            keys = TABLE_ORDER
+        for key in keys:
+            rows = self._buffers.get(key)
+            if not rows:
+                continue
+            if key == 'records':
+                rows = self._remap(rows)
+            write_batch(self.conn, key, rows, self.load_data)
+            self.inserted[key] = self.inserted.get(key, 0) + len(rows)
+            self._uncommitted += len(rows)
+            if self.progress:
+                self.progress.add(len(rows))
+            self._buffers[key] = []
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def _remap(self, rows):
+        # Patients buffered so far were written just before (same connection)
+        if self._pending_patients:
+            self.patient_ids.update(resolve_patient_ids(self.conn, self._pending_patients))
+            self._pending_patients = {}
+        return remap_records(rows, self.patient_ids)
+
+    def commit(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.flush()
+        self.commit()
+
+
+class Progress:
+    """Prints rows written and throughput at most every ``interval`` seconds"""
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self.rows = 0
+        self.started = time.monotonic()
+        self._last = self.started
+        self._lock = threading.Lock()
+        self.bytes_done = 0
+        self.bytes_total = 0
+
+    def add(self, n):
+        with self._lock:
+            self.rows += n
+            now = time.monotonic()
+            if now - self._last < self.interval:
+                return
+            self._last = now
+        self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        pct = f' ({self.bytes_done * 100 / self.bytes_total:.1f}% of input)' if self.bytes_total else ''
+        print(f"{'Done' if final else 'Progress'}: {self.rows} rows in {elapsed:.1f}s, "
+              f"{self.rows / elapsed:,.0f} rows/s{pct}", flush=True)
+
+
+# --------------------------------------------------------------------------- #
+# Driver
+# --------------------------------------------------------------------------- #
+
+def _has_synthetic_marker(path):
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return SYNTHETIC_MARKER in f.read(READ_SIZE)
+
+
+def _synthetic_for(path, records):
+    # Seeded per file so a re-run generates the same rows (same import_key)
+    return generate_synthetic_records(max(0, SYNTHETIC_TARGET - records), rng=random.Random(os.path.basename(path)))
+
+
+def import_file(path, writer, progress=None, synthetic=True):
+    """Stream one .sql file into ``writer``; returns the number of tuples read"""
+    now = datetime.now()
+    tuples = 0
+    records = 0
+    done_before = progress.bytes_done if progress else 0
+    with open(path, 'rb') as fh:
+        tokenizer = InsertTokenizer(fh)
+        for table, columns, values in tokenizer:
+            if writer.add(table, dict(zip(columns, values)), now):
+                tuples += 1
+                if table.lower() == 'heartrecords':
+                    records += 1
+            if progress:
+                progress.bytes_done = done_before + tokenizer.bytes_read
+
+    # Dev data file ends with a marker asking for synthetic rows up to 300 records
+    if synthetic and records and _has_synthetic_marker(path):
+        for row in _synthetic_for(path, records):
+            writer.add('HeartRecords', row, now)
+            tuples += 1
+    return tuples
+
+
+def default_sources():
+    sources = []
+    if os.path.exists(SQL_FILE):
+        sources.append(SQL_FILE)
+    if os.path.isdir(DATA_DIR):
+        sources.extend(os.path.join(DATA_DIR, f) for f in sorted(os.listdir(DATA_DIR))
+                       if f.lower().endswith('.sql'))
+    return sources
+
+
+def import_data(paths=None, batch_size=5000, commit_every=50000, load_data=False, synthetic=True):
+    paths = paths or default_sources()
+    conn = _get_conn(local_infile=True) if load_data else _get_conn()
+    progress = Progress()
+    progress.bytes_total = sum(os.path.getsize(p) for p in paths)
+    writer = BulkWriter(conn, batch_size=batch_size, commit_every=commit_every,
+                        load_data=load_data, progress=progress)
+    try:
+        for path in paths:
+            print('Reading', path, flush=True)
+            import_file(path, writer, progress, synthetic=synthetic)
+        writer.close()
     except Exception:
-        return sex
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    progress.report(final=True)
+    print('Inserted:', writer.inserted)
+    return writer.inserted
+
+# --------------------------------------------------------------------------- #
+# Parallel import: parse in a process pool, write with N connections
+# --------------------------------------------------------------------------- #
+
+_HEADER_BYTES_RE = re.compile(rb"INSERT\s+INTO\s+[`\[]?(\w+)[`\]]?\s*\(([^)]*)\)\s*VALUES\s*", re.IGNORECASE)
+# Where a long VALUES list may be cut: before a tuple that starts on a new line
+_TUPLE_BREAK_RE = re.compile(rb"\)\s*,\s*\r?\n\s*\(")
+# MySQL deadlock / lock wait timeout: safe to retry the batch
+_RETRYABLE = (1213, 1205)
+
+
+def plan_chunks(path, chunk_bytes=8 << 20):
+    """Cut a .sql file into byte ranges of whole tuples belonging to one INSERT.
+
+    Returns ``[(path, start, end, table, columns)]`` for known tables. Files
+    with many INSERT statements split at statement boundaries; a single huge
+    statement is split before tuples that begin on their own line (dumps
+    that put every tuple on one line are only split per statement).
+    """
+    if os.path.getsize(path) == 0:
+        return []
+    chunks = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        headers = list(_HEADER_BYTES_RE.finditer(mm))
+        for i, m in enumerate(headers):
+            table = m.group(1).decode('utf-8')
+            if table.lower() not in TABLES:
+                continue
+            columns = [c.strip().strip('`[]') for c in m.group(2).decode('utf-8').split(',')]
+            start = m.end()
+            stmt_end = headers[i + 1].start() if i + 1 < len(headers) else len(mm)
+            while stmt_end - start > chunk_bytes:
+                cut = _TUPLE_BREAK_RE.search(mm, start + chunk_bytes, stmt_end)
+                if cut is None:
+                    break
+                chunks.append((path, start, cut.start() + 1, table, columns))
+                start = cut.start() + 1
+            chunks.append((path, start, stmt_end, table, columns))
+    return chunks
+
+
+def _parse_chunk(task):
+    """Process-pool worker: parse and map one byte range; returns (label, path, rows, patient keys)"""
+    path, start, end, table, columns = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    header = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ".encode('utf-8')
+    label, _, _, mapper, _ = TABLES[table.lower()]
+    now = datetime.now()
+    rows = []
+    keys = {}
+    for _, _, values in InsertTokenizer(io.BytesIO(header + data)):
+        row = dict(zip(columns, values))
+        rows.append(mapper(row, now))
+        if label == 'patients':
+            key = source_patient_key(row)
+            if key:
+                keys[key[0]] = key[1]
+    return label, path, rows, keys
+
+
+def _bounded_map(pool, fn, items, limit):
+    """Like pool.map, but with at most ``limit`` tasks in flight and results in completion order"""
+    items = iter(items)
+    pending = set()
+    while True:
+        while len(pending) < limit:
+            item = next(items, None)
+            if item is None:
+                break
+            pending.add(pool.submit(fn, item))
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def _writer_loop(work, load_data, progress, inserted, errors, lock):
+    conn = _get_conn(local_infile=True) if load_data else _get_conn()
+    try:
+        while True:
+            item = work.get()
+            try:
+                if item is None:
+                    return
+                if errors:
+                    continue  # keep draining so producers never block
+                label, rows = item
+                for attempt in range(5):
+                    try:
+                        write_batch(conn, label, rows, load_data)
+                        conn.commit()
+                        break
+                    except pymysql.err.OperationalError as e:
+                        conn.rollback()
+                        if e.args[0] not in _RETRYABLE or attempt == 4:
+                            raise
+                        time.sleep(0.05 * (attempt + 1))
+                with lock:
+                    inserted[label] += len(rows)
+                progress.add(len(rows))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                work.task_done()
+    finally:
+        conn.close()
+
+
+def import_data_parallel(paths=None, workers=None, writers=4, batch_size=5000,
+                         load_data=False, synthetic=True, chunk_bytes=8 << 20):
+    """Parse chunks in ``workers`` processes and upsert with ``writers`` connections.
+
+    Tables are loaded in TABLE_ORDER phases (users, then patients, then
+    records) with a barrier between phases, so foreign keys always resolve.
+    Patients land in any order, so records are re-pointed from their source
+    patient id to the database one through citizen_id after the patients
+    barrier. Natural-key upserts make a re-run safe.
+    """
+    paths = paths or default_sources()
+    workers = workers or os.cpu_count() or 1
+    tasks = [t for p in paths for t in plan_chunks(p, chunk_bytes)]
+    progress = Progress()
+    progress.bytes_total = sum(t[2] - t[1] for t in tasks)
+
+    work = queue.Queue(maxsize=writers * 4)
+    inserted = Counter()
+    errors = []
+    lock = threading.Lock()
+    threads = [threading.Thread(target=_writer_loop, args=(work, load_data, progress, inserted, errors, lock),
+                                daemon=True) for _ in range(writers)]
+    for t in threads:
+        t.start()
+
+    patient_keys = {}
+    patient_ids = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for phase in TABLE_ORDER:
+                phase_tasks = [t for t in tasks if TABLES[t[3].lower()][0] == phase]
+                records = Counter()
+                sizes = {t[:3]: t[2] - t[1] for t in phase_tasks}
+                print(f'[{phase}] {len(phase_tasks)} chunks', flush=True)
+                if phase == 'records' and patient_keys:
+                    conn = _get_conn()
+                    try:
+                        patient_ids = resolve_patient_ids(conn, patient_keys)
+                    finally:
+                        conn.close()
+                for label, path, rows, keys in _bounded_map(pool, _parse_chunk, phase_tasks, workers * 2):
+                    records[path] += len(rows)
+                    patient_keys.update(keys)
+                    if label == 'records':
+                        rows = remap_records(rows, patient_ids)
+                    for i in range(0, len(rows), batch_size):
+                        work.put((label, rows[i:i + batch_size]))
+                    if errors:
+                        break
+                progress.bytes_done += sum(sizes.values())
+
+                if phase == 'records' and synthetic:
+                    now = datetime.now()
+                    for path, count in records.items():
+                        if _has_synthetic_marker(path):
+                            rows = remap_records([_record_row(r, now) for r in _synthetic_for(path, count)],
+                                                 patient_ids)
+                            if rows:
+                                work.put((phase, rows))
+
+                # Barrier: every row of this table is committed before children load
+                work.join()
+                if errors:
+                    raise errors[0]
+    finally:
+        for _ in threads:
+            work.put(None)
+        for t in threads:
+            t.join()
+
+    progress.report(final=True)
+    print('Inserted:', dict(inserted))
+    return dict(inserted)
+
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description='Import INSERT statements from .sql files into MySQL')
+    parser.add_argument('files', nargs='*', help='.sql files (default: data.sql and backend/data/*.sql)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per executemany / LOAD DATA chunk')
+    parser.add_argument('--commit-every', type=int, default=50000, help='rows per transaction')
+    parser.add_argument('--load-data', action='store_true',
+                        help='use LOAD DATA LOCAL INFILE (server needs local_infile=ON)')
+    parser.add_argument('--no-synthetic', action='store_true', help='do not generate synthetic HeartRecords')
+    parser.add_argument('--parallel', action='store_true', help='parse in a process pool and write with several connections')
+    parser.add_argument('--workers', type=int, default=None, help='parser processes for --parallel (default: CPU count)')
+    parser.add_argument('--writers', type=int, default=4, help='DB writer connections for --parallel')
+    parser.add_argument('--chunk-mb', type=int, default=8, help='size of the byte ranges handed to each parser')
+    parser.add_argument('--skip-rollups', action='store_true',
+                        help='do not rebuild the prediction rollups afterwards (run `flask rebuild-rollups` later)')
+    return parser.parse_args(argv)
+
 
 if __name__ == '__main__':
-    import sys
+    args = _parse_args(sys.argv[1:])
+    if args.load_data and backend.name != 'mysql':
+        print('--load-data needs MySQL (DATABASE_URL is', backend.name + ')')
+        sys.exit(2)
     try:
-        import_data()
+        if args.parallel:
+            import_data_parallel(args.files, workers=args.workers, writers=args.writers,
+                                 batch_size=args.batch_size, load_data=args.load_data,
+                                 synthetic=not args.no_synthetic, chunk_bytes=args.chunk_mb << 20)
+        else:
+            import_data(args.files, batch_size=args.batch_size, commit_every=args.commit_every,
+                        load_data=args.load_data, synthetic=not args.no_synthetic)
     except Exception as e:
         print('Error importing data.sql:', e)
         sys.exit(1)
+    if CFG.ROLLUPS_ENABLED and not args.skip_rollups:
+        # Rows were written around Database.add_prediction, so its rollup upkeep did not run
+        print('Rebuilt rollups:', Database.rebuild_rollups())
     print('Done')
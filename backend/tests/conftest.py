@@ -0,0 +1,114 @@
+"""Shared fixtures: the Flask app on an in-memory SQLite database (TestingConfig).
+
+Run from backend/:  python -m pytest -q
+Set TEST_DATABASE_URL to run the same tests against another database.
+"""
+import os
+import sys
+
+# Before any app import: config and the storage backend are read at import time
+os.environ['FLASK_ENV'] = 'testing'
+os.environ.setdefault('PREDICTION_WRITE_BEHIND', 'false')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+
+from app import create_app, database
+from app.database import Database, get_connection
+
+FEATURES = {
+    'age': 55, 'sex': 1, 'cp': 2, 'trestbps': 130, 'chol': 250, 'fbs': 0, 'restecg': 1,
+    'thalach': 150, 'exang': 0, 'oldpeak': 1.2, 'slope': 1, 'ca': 0, 'thal': 2,
+}
+
+
+@pytest.fixture(scope='session')
+def app():
+    database.init_schema()
+    return create_app()
+
+
+@pytest.fixture(scope='session')
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def auth_headers(client):
+    """Bearer header of an admin created once for the session"""
+    user = {'email': 'admin@test.local', 'password': 'secret123', 'full_name': 'Admin', 'role': 'admin'}
+    # 409: left by an earlier run on a persistent TEST_DATABASE_URL
+    assert client.post('/api/auth/register', json=user).status_code in (201, 409)
+    response = client.post('/api/auth/login', json={'email': user['email'], 'password': user['password']})
+    assert response.status_code == 200
+    return {'Authorization': 'Bearer ' + response.get_json()['token']}
+
+
+@pytest.fixture(autouse=True)
+def clean_tables(app):
+    """Every test starts without patients and predictions (users are kept)"""
+    yield
+    with get_connection() as conn, conn.cursor() as cur:
+        for table in ('prediction_rollup_daily', 'prediction_rollup_monthly', 'predictions', 'patients'):
+            cur.execute(f'DELETE FROM {table}')
+        conn.commit()
+    database._invalidate_patient_counts()
+
+
+@pytest.fixture
+def make_patient(client, auth_headers):
+    """Create a patient through the API; returns its patient_id"""
+    counter = iter(range(1, 1 << 30))
+
+    def make(**fields):
+        n = next(counter)
+        body = {
+            'citizen_id': f'0010850{n:05d}', 'full_name': f'Patient {n}', 'gender': 'Nam',
+            'date_of_birth': '1970-01-01', 'phone': '0900000000', 'address': '1 Test', 'province': 'Hà Nội',
+            'condition': '',
+        }
+        body.update(fields)
+        response = client.post('/api/patients', json=body, headers=auth_headers)
+        assert response.status_code == 201, response.get_json()
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute('SELECT patient_id FROM patients WHERE citizen_id = %s', (body['citizen_id'],))
+            return cur.fetchone()['patient_id']
+    return make
+
+
+@pytest.fixture
+def history(client, auth_headers, make_patient):
+    """Write, move and delete predictions through the API (plus one without a patient);
+    ``history(step)`` calls ``step()`` after each write"""
+    def run(step=lambda: None):
+        _history(client, auth_headers, make_patient, step)
+    return run
+
+
+def _history(client, auth_headers, make_patient, step):
+    hanoi, hue, blank = make_patient(), make_patient(province='Huế'), make_patient(province='')
+
+    def predict(patient_id, **features):
+        body = dict(FEATURES, patient_id=patient_id, **features)
+        response = client.post('/api/heart-risk/predict', json=body, headers=auth_headers)
+        assert response.status_code == 200, response.get_json()
+        step()
+
+    predict(hanoi, age=54.5)  # stored as 55 by the INT column
+    predict(hanoi, age=64.5, sex=0)
+    predict(hue, age=39.5, chol=320)
+    predict(blank, age=71)
+    records = [dict(FEATURES, patient_id=hue, age=age, trestbps=120 + age) for age in (30.5, 45, 49.5)]
+    response = client.post('/api/heart-risk/predict/batch', json=records, headers=auth_headers)
+    assert response.status_code == 200, response.get_json()
+    step()
+    # Bulk import path: no patient
+    Database.add_predictions_bulk([dict(FEATURES, patient_id=None, age=60.5, prediction=1)])
+    step()
+
+    assert client.put(f'/api/patients/{hue}', json={'province': 'Đà Nẵng'},
+                      headers=auth_headers).status_code == 200
+    step()
+    predict(hanoi, age=44.5)
+    assert client.delete(f'/api/patients/{blank}', headers=auth_headers).status_code == 200
+    step()
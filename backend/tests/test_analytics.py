@@ -0,0 +1,18 @@
+from app.analytics import PredictionStore, store
+
+
+def _answers(s):
+    return [s.summary(), s.summary(sex=1), s.group_by('sex'), s.group_by('prediction'),
+            s.time_series('day'), s.histogram('age', bins=5)]
+
+
+def test_store_refreshed_along_api_writes_matches_a_fresh_load(history, monkeypatch):
+    monkeypatch.setattr(store, 'refresh_interval', 0)
+    store.refresh(full=True)
+
+    history(step=store.ensure_fresh)
+
+    fresh = PredictionStore(rescan_ids=store.rescan_ids)
+    fresh.refresh(full=True)
+    assert store.stats()['rows'] == fresh.stats()['rows'] == 8
+    assert _answers(store) == _answers(fresh)
@@ -0,0 +1,72 @@
+import datetime
+import time
+import uuid
+
+import jwt
+import pytest
+
+from config import Config
+from app.database import Database
+from app.utils import revoked_tokens, token_digest
+
+
+def _decode(token):
+    return jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[Config.JWT_ALGORITHM])
+
+
+def _token(payload):
+    return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm=Config.JWT_ALGORITHM)
+
+
+@pytest.fixture
+def token(auth_headers):
+    """A token of the session admin that no other test uses, safe to revoke"""
+    # A second login within the same second would return the very same JWT
+    payload = _decode(auth_headers['Authorization'].split(' ')[1])
+    return _token(dict(payload, jti=uuid.uuid4().hex))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Moves time.monotonic (revocation sync, token cache) forward by ``clock.advance(seconds)``"""
+    offset = [0.0]
+    monotonic = time.monotonic
+    monkeypatch.setattr(time, 'monotonic', lambda: monotonic() + offset[0])
+
+    class Clock:
+        @staticmethod
+        def advance(seconds):
+            offset[0] += seconds
+    return Clock
+
+
+def _verify(client, token):
+    return client.get('/api/auth/verify', headers={'Authorization': 'Bearer ' + token}).status_code
+
+
+def test_logout_rejects_the_token_at_once(client, token):
+    assert _verify(client, token) == 200
+    assert client.post('/api/auth/logout', headers={'Authorization': 'Bearer ' + token}).status_code == 200
+    assert _verify(client, token) == 401
+
+
+def test_token_revoked_by_another_worker_is_rejected_within_the_sync_interval(client, token, clock):
+    assert _verify(client, token) == 200  # payload now cached, revocation list synced
+    payload = _decode(token)
+    # What a logout handled by another process leaves behind: the DB row only
+    Database.revoke_token(token_digest(token), payload['user_id'],
+                          datetime.datetime.fromtimestamp(payload['exp']))
+
+    clock.advance(revoked_tokens.sync_interval + 0.01)
+
+    assert _verify(client, token) == 401
+
+
+def test_cached_payload_is_not_served_after_exp(client, auth_headers):
+    exp = int(time.time()) + 1
+    token = _token(dict(_decode(auth_headers['Authorization'].split(' ')[1]), exp=exp))
+    assert _verify(client, token) == 200
+
+    time.sleep(max(0.0, exp - time.time()) + 0.05)
+
+    assert _verify(client, token) == 401
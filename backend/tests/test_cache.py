@@ -0,0 +1,113 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.models import cache as cache_module
+from app.models.cache import LocalBackend, ModelCache
+from app.models.heart_risk import HeartRisk
+
+from conftest import FEATURES
+
+
+def _config(**overrides):
+    config = dict(CACHE_BACKEND='local', CACHE_TTL=60, CACHE_MAX_ENTRIES=100, CACHE_REDIS_URL='')
+    config.update(overrides)
+    return SimpleNamespace(**config)
+
+
+@pytest.fixture
+def model_cache(monkeypatch):
+    """An enabled local cache in place of the (disabled by default) app one"""
+    enabled = ModelCache(_config())
+    monkeypatch.setattr(cache_module, 'cache', enabled)
+    monkeypatch.setattr('app.models.heart_risk.cache', enabled)
+    monkeypatch.setattr('app.models.patient.cache', enabled)
+    return enabled
+
+
+def test_local_cache_is_off_unless_a_ttl_is_set():
+    assert not ModelCache(_config(CACHE_TTL=0)).enabled
+    assert ModelCache(_config()).enabled
+
+
+def test_invalidate_drops_every_role():
+    cache = ModelCache(_config())
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {'n': len(loads)}
+
+    assert cache.get_or_load('patient', 1, 'admin', loader)[0] == {'n': 1}
+    assert cache.get_or_load('patient', 1, 'admin', loader)[0] == {'n': 1}
+    assert cache.get_or_load('patient', 1, 'doctor', loader)[0] == {'n': 2}
+
+    cache.invalidate('patient', 1)
+
+    assert cache.get_or_load('patient', 1, 'admin', loader)[0] == {'n': 3}
+    assert cache.get_or_load('patient', 1, 'doctor', loader)[0] == {'n': 4}
+
+
+def test_versions_are_pruned_after_a_ttl():
+    backend = LocalBackend(maxsize=10, ttl=0.05)
+    for i in range(50):
+        backend.bump(f'v:patient:{i}')
+    version = backend.version('v:patient:7')
+
+    time.sleep(0.06)
+    backend.bump('v:patient:last')
+
+    assert len(backend._versions) == 1
+    assert backend.version('v:patient:7') == 0
+    # A pruned key never gets one of its old numbers back
+    backend.bump('v:patient:7')
+    assert backend.version('v:patient:7') > version
+
+
+def test_prediction_invalidates_history_and_etag(client, auth_headers, make_patient, model_cache):
+    patient_id = make_patient()
+    url = f'/api/heart-risk/patient/{patient_id}'
+    client.post('/api/heart-risk/predict', json=dict(FEATURES, patient_id=patient_id), headers=auth_headers)
+
+    first = client.get(url, headers=auth_headers)
+    etag = first.headers['ETag']
+    assert len(first.get_json()) == 1
+    assert client.get(url, headers=dict(auth_headers, **{'If-None-Match': etag})).status_code == 304
+
+    client.post('/api/heart-risk/predict', json=dict(FEATURES, patient_id=patient_id), headers=auth_headers)
+
+    second = client.get(url, headers=dict(auth_headers, **{'If-None-Match': etag}))
+    assert second.status_code == 200
+    assert len(second.get_json()) == 2
+    assert second.headers['ETag'] != etag
+
+
+def test_patient_update_invalidates_the_cached_patient(client, auth_headers, make_patient, model_cache):
+    patient_id = make_patient(full_name='Before')
+    url = f'/api/patients/{patient_id}'
+    assert client.get(url, headers=auth_headers).get_json()['full_name'] == 'Before'
+
+    response = client.put(url, json={'full_name': 'After'}, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert client.get(url, headers=auth_headers).get_json()['full_name'] == 'After'
+
+
+def test_journaled_prediction_invalidates_at_append(make_patient, model_cache, monkeypatch, tmp_path):
+    from app.write_behind import PredictionJournal
+
+    patient_id = make_patient()
+    calls = []
+    journal = PredictionJournal()
+    journal.enabled = True
+    # The record only has to reach the journal: nothing is flushed in this test
+    monkeypatch.setattr(journal, 'append', lambda record: calls.append(record))
+    monkeypatch.setattr('app.models.heart_risk.journal', journal)
+    HeartRisk.get_by_patient_cached(patient_id)
+    version = model_cache.backend.version(f'v:predictions:{patient_id}')
+
+    assert HeartRisk.create(patient_id=patient_id, prediction=1, **FEATURES)
+
+    assert len(calls) == 1
+    assert model_cache.backend.version(f'v:predictions:{patient_id}') != version
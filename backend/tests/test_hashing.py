@@ -0,0 +1,73 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from app.batching import Overloaded
+from app.database import Database
+from app.hashing import hasher
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """The app's hasher on one hashing process with room for one waiting call"""
+    monkeypatch.setattr(hasher, 'workers', 1)
+    monkeypatch.setattr(hasher, 'max_queue', 1)
+    monkeypatch.setattr(hasher, 'method', 'pbkdf2:sha256:1000')
+    monkeypatch.setattr(hasher, '_executor', None)
+    yield hasher
+    if hasher._executor is not None:
+        hasher._executor.shutdown()
+
+
+def _busy(hasher, seconds):
+    """Threads keeping the process and the queue slot taken for ``seconds``"""
+    threads = [threading.Thread(target=hasher._run, args=(time.sleep, seconds)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while hasher.stats()['in_flight'] < 2:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    return threads
+
+
+def test_full_pool_rejects_instead_of_queueing(pool, client, auth_headers):
+    pool.hash('warm-up')  # start the process outside the timed part
+    rejected = pool.stats()['rejected']
+    threads = _busy(pool, 1.0)
+
+    assert pool.stats()['queue_depth'] == 1
+    with pytest.raises(Overloaded):
+        pool.hash('secret123')
+    response = client.post('/api/auth/login', json={'email': 'admin@test.local', 'password': 'secret123'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+    for thread in threads:
+        thread.join()
+    assert pool.stats()['rejected'] == rejected + 2
+    assert pool.verify('secret123', pool.hash('secret123'))
+
+
+def test_login_rehashes_a_password_stored_with_old_parameters(pool, client):
+    user = {'email': f'rehash-{uuid.uuid4().hex[:8]}@test.local', 'password': 'secret123', 'full_name': 'Rehash'}
+    assert client.post('/api/auth/register', json=user).status_code == 201
+    old = Database.get_user_by_email(user['email'])['password_hash']
+    assert old.startswith('pbkdf2:sha256:1000$')
+    assert not pool.needs_rehash(old)
+
+    pool.method = 'pbkdf2:sha256:2000'
+    assert pool.needs_rehash(old)
+    rehashed = pool.stats()['rehashed']
+    login = {'email': user['email'], 'password': user['password']}
+    assert client.post('/api/auth/login', json=login).status_code == 200
+
+    new = Database.get_user_by_email(user['email'])['password_hash']
+    assert new.startswith('pbkdf2:sha256:2000$')
+    assert pool.stats()['rehashed'] == rehashed + 1
+    # Up to date now: the next login only verifies
+    assert client.post('/api/auth/login', json=login).status_code == 200
+    assert Database.get_user_by_email(user['email'])['password_hash'] == new
+    assert pool.stats()['rehashed'] == rehashed + 1
@@ -0,0 +1,53 @@
+from app.database import Database
+
+from conftest import FEATURES
+
+
+def test_batch_reports_bad_rows_and_saves_the_rest(client, auth_headers, make_patient):
+    patient_id = make_patient()
+    body = [
+        dict(FEATURES, patient_id=patient_id),
+        dict(FEATURES, patient_id=999999),
+        dict(FEATURES, patient_id='x'),
+        {'patient_id': patient_id, 'age': 50},
+        dict(FEATURES, patient_id=patient_id, chol='high'),
+        dict(FEATURES, patient_id=patient_id),
+    ]
+    response = client.post('/api/heart-risk/predict/batch', json=body, headers=auth_headers)
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['saved'] == 2
+    assert [r['index'] for r in data['results']] == [0, 5]
+    assert data['errors'] == [
+        {'index': 1, 'error': 'Patient 999999 not found'},
+        {'index': 2, 'error': 'Invalid patient_id'},
+        {'index': 3, 'error': 'Missing required fields'},
+        {'index': 4, 'error': 'Non-numeric feature value'},
+    ]
+    assert len(Database.get_predictions_by_patient(patient_id)) == 2
+
+
+def test_batch_of_unknown_patients_saves_nothing(client, auth_headers):
+    body = [dict(FEATURES, patient_id=999998), dict(FEATURES, patient_id=999999)]
+    response = client.post('/api/heart-risk/predict/batch', json=body, headers=auth_headers)
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['saved'] == 0
+    assert [e['index'] for e in data['errors']] == [0, 1]
+
+
+def test_create_many_falls_back_to_row_by_row(make_patient):
+    from app.models.heart_risk import HeartRisk
+
+    patient_id = make_patient()
+    errors = HeartRisk.create_many([
+        dict(FEATURES, patient_id=patient_id, prediction=1),
+        dict(FEATURES, patient_id=999999, prediction=0),
+        dict(FEATURES, patient_id=patient_id, prediction=0),
+    ])
+
+    assert errors[0] is None and errors[2] is None
+    assert errors[1] is not None
+    assert len(Database.get_predictions_by_patient(patient_id)) == 2
@@ -0,0 +1,28 @@
+from types import SimpleNamespace
+
+import joblib
+import numpy as np
+from sklearn.tree import DecisionTreeClassifier
+
+from app.inference import FEATURES, InferenceEngine
+
+
+def _engine(path):
+    engine = InferenceEngine()
+    engine.init_app(SimpleNamespace(config={'MODEL_PATH': str(path)}, extensions={}))
+    return engine
+
+
+def test_a_model_that_failed_to_load_is_picked_up_once_replaced(tmp_path):
+    path = tmp_path / 'heart_risk_model.pkl'
+    path.write_bytes(b'not a pickle')
+
+    engine = _engine(path)
+
+    assert engine.info()['path'] == str(path)
+
+    X = np.random.default_rng(0).normal(size=(20, len(FEATURES)))
+    joblib.dump(DecisionTreeClassifier().fit(X, np.arange(20) % 2), path)
+
+    assert engine.reload_if_changed()
+    assert engine._model is not None
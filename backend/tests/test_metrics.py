@@ -0,0 +1,41 @@
+import multiprocessing
+
+import pytest
+
+from app import metrics
+from app.metrics import Registry
+
+pytestmark = pytest.mark.skipif(metrics.fcntl is None, reason='shared metrics need fcntl')
+
+
+def _worker(registry, hits, latency, n):
+    registry.after_fork()
+    for _ in range(n):
+        hits.inc('/a')
+        latency.observe(0.2)
+    registry.flush()
+
+
+def test_scrape_sums_the_series_of_every_worker(tmp_path):
+    registry = Registry()
+    hits = registry.counter('hits_total', 'Hits', ('route',))
+    latency = registry.histogram('latency_seconds', 'Latency', (0.1, 1.0))
+    registry.share(str(tmp_path), flush_interval=60)
+    hits.inc('/a')
+
+    fork = multiprocessing.get_context('fork')
+    workers = [fork.Process(target=_worker, args=(registry, hits, latency, n)) for n in (2, 3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    # The master's own count, and the workers' folded into the archive once they exited
+    for _ in range(2):
+        text = registry.render()
+        assert 'hits_total{route="/a"} 6' in text
+        assert 'latency_seconds_bucket{le="0.1"} 0' in text
+        assert 'latency_seconds_bucket{le="1.0"} 5' in text
+        assert 'latency_seconds_count 5' in text
+    assert {p.name for p in tmp_path.iterdir() if p.suffix == '.json'} == {'archive.json', f'{registry._pid}.json'}
@@ -0,0 +1,41 @@
+import pytest
+
+from app import migrations
+from app.migrations import sqlite_schema
+from app.storage import backend
+
+
+def test_upgrade_applies_every_migration(app):
+    latest = migrations.discover()[-1][0]
+
+    assert migrations.current_version() == latest
+    assert all(applied for _, _, applied in migrations.status())
+    # Already up to date: nothing left to apply
+    assert migrations.upgrade() == []
+
+
+def test_every_migration_can_be_reverted():
+    for version, name, module in migrations.discover():
+        assert callable(module.up), name
+        assert callable(module.down), name
+
+
+def test_sqlite_schema_mirrors_the_latest_migration():
+    assert sqlite_schema.SCHEMA_VERSION == migrations.discover()[-1][0]
+
+
+@pytest.mark.skipif(backend.name != 'sqlite', reason='SQLite refuses downgrades')
+def test_downgrade_is_refused_on_sqlite(app):
+    with pytest.raises(RuntimeError, match='MySQL only'):
+        migrations.downgrade(0)
+    assert migrations.current_version() == migrations.discover()[-1][0]
+
+
+@pytest.mark.skipif(backend.name != 'mysql', reason='downgrades run on MySQL only')
+def test_downgrade_then_upgrade_round_trips(app):
+    latest = migrations.discover()[-1][0]
+
+    assert migrations.downgrade(latest - 1) == [latest]
+    assert migrations.current_version() == latest - 1
+    assert migrations.upgrade() == [latest]
+    assert migrations.current_version() == latest
@@ -0,0 +1,57 @@
+def _walk(client, headers, query):
+    """patient_ids of every page reached by following nextCursor"""
+    seen = []
+    cursor = None
+    while True:
+        url = f'/api/patients?{query}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        page = response.get_json()
+        seen.append([p['patient_id'] for p in page['data']])
+        cursor = page['nextCursor']
+        if cursor is None:
+            return seen
+
+
+def test_keyset_paging_visits_every_patient_once(client, auth_headers, make_patient):
+    ids = [make_patient() for _ in range(7)]
+
+    pages = _walk(client, auth_headers, 'pageSize=3&count=none')
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [i for page in pages for i in page] == sorted(ids)
+
+
+def test_keyset_paging_with_a_filter(client, auth_headers, make_patient):
+    north = [make_patient(province='Hà Nội') for _ in range(2)]
+    make_patient(province='Huế')
+    north += [make_patient(province='Hà Nội') for _ in range(2)]
+
+    pages = _walk(client, auth_headers, 'pageSize=2&province=Hà Nội')
+
+    assert [i for page in pages for i in page] == north
+
+
+def test_last_full_page_ends_with_an_empty_one(client, auth_headers, make_patient):
+    ids = [make_patient() for _ in range(4)]
+
+    pages = _walk(client, auth_headers, 'pageSize=2&count=none')
+
+    assert pages == [ids[:2], ids[2:], []]
+
+
+def test_cursor_and_count(client, auth_headers, make_patient):
+    ids = [make_patient() for _ in range(5)]
+
+    response = client.get(f'/api/patients?pageSize=2&cursor={ids[1]}', headers=auth_headers)
+
+    page = response.get_json()
+    assert [p['patient_id'] for p in page['data']] == ids[2:4]
+    assert page['total'] == 5
+    assert page['nextCursor'] == ids[3]
+
+
+def test_bad_cursor_is_rejected(client, auth_headers):
+    response = client.get('/api/patients?cursor=abc', headers=auth_headers)
+
+    assert response.status_code == 400
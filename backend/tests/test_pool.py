@@ -0,0 +1,28 @@
+from app.pool import ConnectionPool
+
+
+class FakeConnection:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+    def ping(self, reconnect=False):
+        pass
+
+
+def test_connections_checked_out_during_close_all_close_on_release():
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=2)
+    idle, busy = pool.acquire(), pool.acquire()
+    pool.release(idle)
+
+    pool.close_all()
+
+    assert idle.closed and not busy.closed
+    pool.release(busy)
+    assert busy.closed
+    assert pool.stats()['size'] == 0
+    fresh = pool.acquire()
+    assert fresh is not busy
+    pool.release(fresh)
+    assert not fresh.closed and pool.stats()['idle'] == 1
@@ -0,0 +1,22 @@
+import pytest
+
+from app import database
+from app.database import Database
+
+GROUPS = [(None, None), ('province', None), ('age', None), ('age', 20), ('sex', None),
+          ('prediction', None), ('day', None), ('week', None), ('month', None)]
+
+
+def _stats(monkeypatch, rollups):
+    monkeypatch.setattr(database.CFG, 'ROLLUPS_ENABLED', rollups)
+    return [Database.prediction_stats(group, width) for group, width in GROUPS] + \
+        [Database.prediction_stats('sex', province='Đà Nẵng')]
+
+
+def test_rollups_answer_like_the_predictions_table(history, monkeypatch):
+    history()
+    raw = _stats(monkeypatch, False)
+
+    assert _stats(monkeypatch, True) == raw
+    Database.rebuild_rollups()
+    assert _stats(monkeypatch, True) == raw
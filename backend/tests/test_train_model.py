@@ -0,0 +1,98 @@
+import importlib.util
+import os
+from datetime import datetime
+
+import pytest
+
+from app.database import get_connection
+from app.inference import FEATURES as FEATURE_ORDER
+
+from conftest import FEATURES
+
+_PATH = os.path.join(os.path.dirname(__file__), '..', 'models', 'train_model.py')
+_spec = importlib.util.spec_from_file_location('train_model', _PATH)
+train_model = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(train_model)
+
+
+def _insert(patient_id, ids):
+    columns = ('prediction_id', 'patient_id') + FEATURE_ORDER + ('prediction', 'prediction_date', 'import_key')
+    rows = [(i, patient_id) + tuple(FEATURES[name] for name in FEATURE_ORDER)
+            + (i % 2, datetime(2025, 1, 1), f'test-{i}') for i in ids]
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.executemany(f'INSERT INTO predictions ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))})',
+                        rows)
+        conn.commit()
+
+
+def _delete(ids):
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.executemany('DELETE FROM predictions WHERE prediction_id = %s', [(i,) for i in ids])
+        conn.commit()
+
+
+@pytest.fixture
+def load(monkeypatch):
+    """load_matrix() running ``between(total, max_id)`` right after its COUNT"""
+    def run(between, *argv):
+        count_rows = train_model.count_rows
+
+        def counted(*args):
+            total, max_id = count_rows(*args)
+            between(total, max_id)
+            return total, max_id
+        monkeypatch.setattr(train_model, 'count_rows', counted)
+        args = train_model._parse_args(['--no-install', '--holdout', '0.3', '--chunk-size', '4'] + list(argv))
+        conn = train_model._get_conn()
+        try:
+            return train_model.load_matrix(conn, args)
+        finally:
+            conn.close()
+    return run
+
+
+def _check(result, rows):
+    X_train, y_train, X_holdout, y_holdout, info = result
+    assert X_train.shape == (info['training_rows'], len(FEATURE_ORDER))
+    assert X_holdout.shape == (info['holdout_rows'], len(FEATURE_ORDER))
+    assert y_train.shape == (info['training_rows'],)
+    assert y_holdout.shape == (info['holdout_rows'],)
+    assert info['rows'] == info['training_rows'] + info['holdout_rows'] == rows
+
+
+def test_rows_committed_after_the_count_do_not_overflow_the_buffer(load, make_patient):
+    patient_id = make_patient()
+    _insert(patient_id, range(2, 42, 2))
+
+    # Late commits with ids below the counted max_id
+    result = load(lambda total, max_id: _insert(patient_id, range(1, 30, 2)))
+
+    _check(result, 20)
+    assert result[4]['max_prediction_id'] == 40
+
+
+def test_rows_deleted_after_the_count_leave_the_buffer_short(load, make_patient):
+    patient_id = make_patient()
+    _insert(patient_id, range(1, 21))
+
+    result = load(lambda total, max_id: _delete(range(1, 6)))
+
+    _check(result, 15)
+
+
+def test_limit_reads_the_oldest_rows(load, make_patient):
+    patient_id = make_patient()
+    _insert(patient_id, range(1, 21))
+
+    result = load(lambda total, max_id: _insert(patient_id, range(21, 30)), '--limit', '7')
+
+    _check(result, 7)
+
+
+def test_api_predictions_are_left_out_by_default(load, make_patient, client, auth_headers):
+    patient_id = make_patient()
+    _insert(patient_id, range(1, 11))
+    client.post('/api/heart-risk/predict', json=dict(FEATURES, patient_id=patient_id), headers=auth_headers)
+
+    _check(load(lambda total, max_id: None), 10)
+    _check(load(lambda total, max_id: None, '--source', 'all'), 11)
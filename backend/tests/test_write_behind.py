@@ -0,0 +1,119 @@
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.database import Database
+from app.write_behind import KEY_PREFIX, REJECTED, SUFFIX, PredictionJournal
+
+from conftest import FEATURES
+
+
+def _journal(directory, **settings):
+    config = {
+        'PREDICTION_WRITE_BEHIND': True,
+        'PREDICTION_JOURNAL_DIR': str(directory),
+        'PREDICTION_JOURNAL_SYNC_MS': 0,
+        'PREDICTION_FLUSH_INTERVAL_MS': 10,
+        'PREDICTION_FLUSH_RETRY_MAX_S': 0.05,
+    }
+    config.update(settings)
+    journal = PredictionJournal()
+    journal.init_app(SimpleNamespace(config=config, extensions={}))
+    return journal
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail('timed out waiting for the journal')
+        time.sleep(0.01)
+
+
+def _record(patient_id, prediction=1):
+    return dict(FEATURES, patient_id=patient_id, prediction=prediction)
+
+
+def _database_down(records):
+    raise ConnectionError('database is down')
+
+
+def _segments(directory):
+    return [name for name in os.listdir(directory) if name.endswith(SUFFIX)]
+
+
+@pytest.fixture
+def journals():
+    opened = []
+    yield opened
+    for journal in opened:
+        journal.close(timeout=1)
+
+
+def test_appended_predictions_are_flushed(tmp_path, journals, make_patient):
+    patient_id = make_patient()
+    journal = _journal(tmp_path)
+    journals.append(journal)
+
+    keys = [journal.append(_record(patient_id)) for _ in range(3)]
+
+    assert all(key.startswith(KEY_PREFIX) for key in keys)
+    _wait_for(lambda: journal.stats()['flushed'] == 3)
+    saved = Database.get_predictions_by_patient(patient_id)
+    assert sorted(p['import_key'] for p in saved) == sorted(keys)
+
+
+def test_unflushed_predictions_are_replayed_by_the_next_journal(tmp_path, journals, make_patient, monkeypatch):
+    patient_id = make_patient()
+    down = _journal(tmp_path)
+    monkeypatch.setattr(down, '_write', _database_down)
+    for _ in range(4):
+        down.append(_record(patient_id))
+    _wait_for(lambda: down.stats()['retries'] > 0)
+    down.close(timeout=0)
+    assert Database.get_predictions_by_patient(patient_id) == []
+    assert _segments(tmp_path)
+
+    journal = _journal(tmp_path)
+    journals.append(journal)
+
+    _wait_for(lambda: journal.stats()['flushed'] == 4)
+    assert journal.stats()['replayed'] == 4
+    assert len(Database.get_predictions_by_patient(patient_id)) == 4
+    # Replayed files are deleted once their records are in the database
+    _wait_for(lambda: len(_segments(tmp_path)) == 1)
+
+
+def test_replay_skips_rows_already_inserted(tmp_path, journals, make_patient, monkeypatch):
+    patient_id = make_patient()
+    down = _journal(tmp_path)
+    monkeypatch.setattr(down, '_write', _database_down)
+    records = [_record(patient_id) for _ in range(3)]
+    for record in records:
+        down.append(record)
+    _wait_for(lambda: down.stats()['retries'] > 0)
+    down.close(timeout=0)
+    # The previous process got the first row in before it died
+    Database.add_predictions_bulk(records[:1], skip_existing=True)
+
+    journal = _journal(tmp_path)
+    journals.append(journal)
+
+    _wait_for(lambda: journal.stats()['flushed'] == 3)
+    assert len(Database.get_predictions_by_patient(patient_id)) == 3
+
+
+def test_rows_the_database_refuses_go_to_the_rejected_file(tmp_path, journals, make_patient):
+    patient_id = make_patient()
+    journal = _journal(tmp_path)
+    journals.append(journal)
+
+    journal.append(_record(patient_id))
+    journal.append(_record(999999))
+
+    _wait_for(lambda: journal.stats()['rejected'] == 1 and journal.stats()['backlog'] == 0)
+    assert len(Database.get_predictions_by_patient(patient_id)) == 1
+    with open(os.path.join(tmp_path, REJECTED), encoding='utf-8') as f:
+        assert '"patient_id":999999' in f.read().replace(' ', '')